@@ -0,0 +1,142 @@
+import bisect
+import itertools
+from datetime import date
+from typing import Dict, Optional
+
+
+class DateCounter:
+    """
+    日付ごとの件数を保持し、期間件数を返す
+    - 日付の種類が少ない・まばらな間は、昇順の日付と累積件数の配列
+      (件数 O(log k)、追加 O(k)。k は日付の種類数)
+    - 日付の種類が DENSE_MIN_DAYS 以上で期間に対して十分に密になったら Fenwick 木(BIT)
+      (件数・追加とも O(log n)。n は期間の日数)
+      添字は date.toordinal() を base からのオフセットにしたもの
+      範囲外の日付が来たら2倍の余裕を持たせて作り直す(償却 O(1))
+    メモリは注文の少ない顧客では日付の種類数、密な顧客では期間の日数に比例する
+    - ロックは持たないので、呼び出し側のロック内で使うこと
+    """
+
+    _MIN_SIZE = 64
+    DENSE_MIN_DAYS = 128
+    # 日付の種類数 × DENSE_RATIO が期間の日数以上なら木にする
+    DENSE_RATIO = 4
+
+    __slots__ = ("_ords", "_cum", "_base", "_size", "_tree", "total")
+
+    def __init__(self):
+        # 配列: _cum[i] は _ords[0..i] の件数の合計
+        self._ords: list[int] = []
+        self._cum: list[int] = []
+        # 木(_size == 0 なら配列を使う)
+        self._base = 0
+        self._size = 0
+        self._tree: list[int] = []
+        self.total = 0
+
+    @classmethod
+    def from_days(cls, days: Dict[int, int]) -> "DateCounter":
+        """日別件数(ordinal -> 件数)から作る"""
+        c = cls()
+        c.total = sum(days.values())
+        if days:
+            c._load(days, min(days), max(days), backward=False)
+        return c
+
+    def add(self, d: date, delta: int = 1) -> None:
+        o = d.toordinal()
+        self.total += delta
+        if self._size and not (self._base <= o < self._base + self._size):
+            # 範囲外: 作り直す(広がった期間に対してまばらなら配列に戻る)
+            lo = min(o, self._base)
+            hi = max(o, self._base + self._size - 1)
+            self._load(self.days(), lo, hi, backward=o < self._base)
+        if self._size:
+            i = o - self._base + 1
+            while i <= self._size:
+                self._tree[i] += delta
+                i += i & -i
+            return
+
+        ords, cum = self._ords, self._cum
+        i = bisect.bisect_left(ords, o)
+        if i == len(ords) or ords[i] != o:
+            ords.insert(i, o)
+            cum.insert(i, cum[i - 1] if i else 0)
+        for j in range(i, len(cum)):
+            cum[j] += delta
+        n = len(ords)
+        if n >= self.DENSE_MIN_DAYS and n * self.DENSE_RATIO >= ords[-1] - ords[0] + 1:
+            self._load(self.days(), ords[0], ords[-1], backward=False)
+
+    def days(self) -> Dict[int, int]:
+        """日別件数(ordinal -> 件数。0件の日は含まない)"""
+        if not self._size:
+            out: Dict[int, int] = {}
+            prev = 0
+            for o, c in zip(self._ords, self._cum):
+                if c != prev:
+                    out[o] = c - prev
+                prev = c
+            return out
+        # 線形時間の構築を逆にたどって日別の値に戻す
+        size = self._size
+        vals = self._tree[:]
+        for i in range(size, 0, -1):
+            j = i + (i & -i)
+            if j <= size:
+                vals[j] -= vals[i]
+        return {self._base + i - 1: n for i, n in enumerate(vals) if i and n}
+
+    def count(self, frm: Optional[date] = None, to: Optional[date] = None) -> int:
+        """frm <= 日付 <= to の件数(None は無制限)"""
+        if frm is None and to is None:
+            return self.total
+        hi = self.total if to is None else self._prefix(to.toordinal())
+        lo = 0 if frm is None else self._prefix(frm.toordinal() - 1)
+        return max(hi - lo, 0)
+
+    def _prefix(self, o: int) -> int:
+        """日付(ordinal) o 以下の件数"""
+        if not self._size:
+            i = bisect.bisect_right(self._ords, o)
+            return self._cum[i - 1] if i else 0
+        if o < self._base:
+            return 0
+        i = min(o - self._base + 1, self._size)
+        s = 0
+        while i > 0:
+            s += self._tree[i]
+            i -= i & -i
+        return s
+
+    def _load(self, days: Dict[int, int], lo: int, hi: int, backward: bool) -> None:
+        """日別件数から、期間 [lo, hi] の密度に合う形で作り直す"""
+        if len(days) >= self.DENSE_MIN_DAYS and len(days) * self.DENSE_RATIO >= (
+            hi - lo + 1
+        ):
+            self._build(days, lo, hi, backward)
+            self._ords, self._cum = [], []
+            return
+        self._base = self._size = 0
+        self._tree = []
+        self._ords = sorted(days)
+        self._cum = list(itertools.accumulate(days[o] for o in self._ords))
+
+    def _build(self, days: Dict[int, int], lo: int, hi: int, backward: bool) -> None:
+        size = self._MIN_SIZE
+        while size < (hi - lo + 1) * 2:
+            size *= 2
+        # 過去方向に伸びたときは余裕を過去側に取る
+        base = hi - size + 1 if backward else lo
+        self._base = base
+        self._size = size
+        # 線形時間で木を構築
+        tree = [0] * (size + 1)
+        for day, n in days.items():
+            tree[day - base + 1] += n
+        for i in range(1, size + 1):
+            j = i + (i & -i)
+            if j <= size:
+                tree[j] += tree[i]
+        self._tree = tree
@@ -0,0 +1,173 @@
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# レコード = 長さ(4byte) + CRC32(4byte) + ペイロード
+_HEADER = struct.Struct("<II")
+
+DURABILITY_MODES = ("group", "per_commit", "none")
+
+
+class JournalFailed(OSError):
+    """
+    fsync に失敗したジャーナル。どこまでが永続化されたか分からないので、
+    以後の追記・待機はすべて失敗させる(再起動して再生し直す)
+    """
+
+
+class Journal:
+    """
+    追記専用のジャーナル(先行書き込みログ)
+    - append() はバッファに書くだけで、位置(LSN=書き込み後のファイル末尾)を返す
+    - wait_durable(lsn) はその位置までが fsync されるのを待つ
+    - durability:
+        "group"      … 最初に待った1件がリーダーとなり、window 秒だけ待ってから
+                       まとめて1回 fsync する(グループコミット)
+        "per_commit" … コミットごとに wait_durable の中で1回 fsync する(相乗りしない)
+        "none"       … fsync しない(OSに任せる)
+    - fsync に1回でも失敗したら、待っていたコミットと以後の append は JournalFailed
+      (失敗後の fsync は成功を返しても書き込みを保証しないため、やり直さない)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        durability: str = "group",
+        group_window_seconds: float = 0.002,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode: {durability}")
+        self.path = path
+        self.durability = durability
+        self.group_window_seconds = group_window_seconds
+        self._f = open(path, "ab")
+        self._lock = threading.Lock()  # 追記用
+        self._cond = threading.Condition()  # fsync 待ち用
+        self._written = self._f.tell()
+        self._synced = self._written
+        self._syncing = False
+        self._failed: BaseException | None = None
+        self.appends = 0
+        self.fsyncs = 0
+
+    @property
+    def offset(self) -> int:
+        with self._lock:
+            return self._written
+
+    def append(self, payload: bytes) -> int:
+        frame = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._check()
+            self._f.write(frame)
+            self._written += len(frame)
+            self.appends += 1
+            return self._written
+
+    def _check(self) -> None:
+        if self._failed is not None:
+            raise JournalFailed("journal is unusable after a failed fsync") from (
+                self._failed
+            )
+
+    def wait_durable(self, lsn: int) -> None:
+        """
+        lsn までが永続化されるのを待つ(どのモードでも fsync はここで行うので、
+        呼び出し側はストアのロックを外してから呼ぶこと)
+        """
+        if self.durability == "none":
+            with self._lock:
+                self._f.flush()
+            return
+        if self.durability == "per_commit":
+            self._sync_own()
+            return
+        with self._cond:
+            while self._synced < lsn:
+                self._check()
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                self._cond.wait()
+            else:
+                return
+        # リーダー: 他のコミットが追記するのを少し待ってからまとめて fsync
+        target = self._synced
+        try:
+            if self.group_window_seconds > 0:
+                time.sleep(self.group_window_seconds)
+            with self._lock:
+                target = self._written
+                self._f.flush()
+            os.fsync(self._f.fileno())
+            self.fsyncs += 1
+        except OSError as e:
+            target = self._synced
+            self._failed = e
+            raise JournalFailed("journal fsync failed") from e
+        finally:
+            with self._cond:
+                self._synced = max(self._synced, target)
+                self._syncing = False
+                self._cond.notify_all()
+
+    def _sync_own(self) -> None:
+        """per_commit: 他のコミットを待たずに、このコミットのために1回 fsync する"""
+        with self._lock:
+            self._check()
+            target = self._written
+            self._f.flush()
+        try:
+            os.fsync(self._f.fileno())
+        except OSError as e:
+            self._failed = e
+            raise JournalFailed("journal fsync failed") from e
+        with self._cond:
+            self.fsyncs += 1
+            self._synced = max(self._synced, target)
+            self._cond.notify_all()
+
+    def records(self, start: int = 0) -> Iterator[bytes]:
+        """起動時の再生用。読み終えたら(切り詰め後の)末尾から追記を再開する"""
+        yield from self.read(self.path, start)
+        with self._lock:
+            self._written = self._synced = self._f.seek(0, os.SEEK_END)
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.flush()
+            self._f.close()
+
+    @staticmethod
+    def read(path: str, start: int = 0) -> Iterator[bytes]:
+        """
+        start 以降のレコードのペイロードを順に返す
+        末尾の書きかけ(長さ不足・CRC不一致)はそこで読み終えて切り詰める
+        """
+        if not os.path.exists(path):
+            return
+        good = start
+        with open(path, "rb") as f:
+            f.seek(start)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                good += _HEADER.size + length
+                yield payload
+            size = f.seek(0, os.SEEK_END)
+        if size > good:
+            logger.warning("truncating torn journal tail at %d (size %d)", good, size)
+            with open(path, "r+b") as f:
+                f.truncate(good)
@@ -1,126 +1,1024 @@
-import threading
+import bisect
+import json
+import logging
+import os
 from collections import defaultdict
 from datetime import date
-from typing import Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
 
-from ..ports import CustomersRepo, OrdersRepo, ProductsRepo, UoW
+from ..core.locks import make_lock
+from ..core.memsize import estimate, head, shallow_items
+from ..core.timing import phase
+from ..ports import (
+    CommitConflict,
+    CustomersRepo,
+    InsertConflict,
+    OrdersRepo,
+    OrderSummaryRow,
+    ProductsRepo,
+    UoW,
+)
 from ..schemas import CustomerWithId, OrderCreateResponse, ProductWithId
+from .date_counter import DateCounter
+from .journal import Journal
+from .order_archive import ArchivedPartition, Segment, segment_path, write_segment
+from .order_partition import OrderPartition, month_key
+from .order_planner import PlanStep, QueryPlan, plan_search, read_step
+from .snapshot import (
+    Snapshot,
+    SnapshotPartition,
+    SnapshotState,
+    encode_days,
+    merge_table,
+    month_groups,
+    write_snapshot,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class _CustomersMem(CustomersRepo):
     def __init__(self):
         self._by_id: Dict[str, CustomerWithId] = {}
         self._by_email: Dict[str, str] = {}
-        self._lock = threading.RLock()
+        self._lock = make_lock("customers")
+        # 起動時に読み込んだスナップショット(未展開の顧客はここから引く)
+        self._snapshot: Snapshot | None = None
+
+    def load_snapshot(self, snapshot: Snapshot) -> None:
+        with self._lock:
+            self._snapshot = snapshot
 
     def by_id(self, cust_id: str) -> CustomerWithId | None:
         with self._lock:
-            return self._by_id.get(cust_id)
+            c = self._by_id.get(cust_id)
+            if c is None and self._snapshot is not None:
+                c = self._snapshot.customer(cust_id)
+                if c is not None:
+                    self._by_id[cust_id] = c
+            return c
 
     def exists_id(self, cust_id: str) -> bool:
         with self._lock:
-            return cust_id in self._by_id
+            return cust_id in self._by_id or (
+                self._snapshot is not None and cust_id in self._snapshot.customers
+            )
 
     def exists_email(self, email: str) -> bool:
         with self._lock:
-            return email.lower() in self._by_email
+            return email.lower() in self._by_email or (
+                self._snapshot is not None and email.lower() in self._snapshot.emails
+            )
 
     def save(self, c: CustomerWithId) -> None:
         with self._lock:
             self._by_id[c.cust_id] = c
             self._by_email[c.email.lower()] = c.cust_id
 
+    def insert_if_absent(self, c: CustomerWithId) -> InsertConflict | None:
+        """ID・email の一意チェックと挿入を1回のロックで行う"""
+        with self._lock:
+            conflict = self.find_conflict(c)
+            if conflict is None:
+                self.save(c)
+            return conflict
+
+    def find_conflict(self, c: CustomerWithId) -> InsertConflict | None:
+        with self._lock:
+            if self.exists_id(c.cust_id):
+                return InsertConflict.ID
+            if self.exists_email(c.email):
+                return InsertConflict.EMAIL
+            return None
+
+    def count(self) -> int:
+        with self._lock:
+            snapshot = len(self._snapshot.emails) if self._snapshot is not None else 0
+            return len(self._by_email) + snapshot
+
+    def memory(self, sample: int) -> Dict[str, Dict[str, int]]:
+        """メモリ上の顧客・email索引の見積もり(スナップショット上の未展開分は除く)"""
+        with self._lock:
+            by_id = (self._by_id, len(self._by_id), head(self._by_id.items(), sample))
+            by_email = (
+                self._by_email,
+                len(self._by_email),
+                head(self._by_email.items(), sample),
+            )
+        return {
+            "customers.by_id": estimate(*by_id),
+            "customers.by_email": estimate(*by_email),
+        }
+
+    def dump(self) -> Tuple[Iterator[Tuple[str, bytes]], Iterator[Tuple[str, bytes]]]:
+        """スナップショット用の (顧客, email索引)。ロック内ではコピーだけ取る"""
+        with self._lock:
+            by_id, by_email = dict(self._by_id), dict(self._by_email)
+            snapshot = self._snapshot
+        return (
+            merge_table(by_id, snapshot and snapshot.customers, _encode_entity),
+            merge_table(by_email, snapshot and snapshot.emails, str.encode),
+        )
+
 
 class _ProductsMem(ProductsRepo):
     def __init__(self):
         self._by_id: Dict[str, ProductWithId] = {}
         self._by_name: Dict[str, str] = {}
-        self._lock = threading.RLock()
+        self._lock = make_lock("products")
+        self._snapshot: Snapshot | None = None
+
+    def load_snapshot(self, snapshot: Snapshot) -> None:
+        with self._lock:
+            self._snapshot = snapshot
 
     def by_id(self, prod_id: str) -> ProductWithId | None:
         with self._lock:
-            return self._by_id.get(prod_id)
+            p = self._by_id.get(prod_id)
+            if p is None and self._snapshot is not None:
+                p = self._snapshot.product(prod_id)
+                if p is not None:
+                    self._by_id[prod_id] = p
+            return p
 
     def by_name_norm_exists(self, name_norm: str) -> bool:
         with self._lock:
-            return name_norm in self._by_name
+            return name_norm in self._by_name or (
+                self._snapshot is not None and name_norm in self._snapshot.names
+            )
 
     def save(self, p: ProductWithId) -> None:
         with self._lock:
             self._by_id[p.prod_id] = p
             self._by_name[p.name.strip().lower()] = p.prod_id
 
+    def insert_if_absent(self, p: ProductWithId) -> InsertConflict | None:
+        """ID・正規化名の一意チェックと挿入を1回のロックで行う"""
+        with self._lock:
+            conflict = self.find_conflict(p)
+            if conflict is None:
+                self.save(p)
+            return conflict
+
+    def find_conflict(self, p: ProductWithId) -> InsertConflict | None:
+        with self._lock:
+            if self.exists_id(p.prod_id):
+                return InsertConflict.ID
+            if self.by_name_norm_exists(p.name.strip().lower()):
+                return InsertConflict.NAME
+            return None
+
     def exists_id(self, prod_id: str) -> bool:
         with self._lock:
-            return prod_id in self._by_id
+            return prod_id in self._by_id or (
+                self._snapshot is not None and prod_id in self._snapshot.products
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            snapshot = len(self._snapshot.names) if self._snapshot is not None else 0
+            return len(self._by_name) + snapshot
+
+    def memory(self, sample: int) -> Dict[str, Dict[str, int]]:
+        """メモリ上の商品・商品名索引の見積もり(スナップショット上の未展開分は除く)"""
+        with self._lock:
+            by_id = (self._by_id, len(self._by_id), head(self._by_id.items(), sample))
+            by_name = (
+                self._by_name,
+                len(self._by_name),
+                head(self._by_name.items(), sample),
+            )
+        return {
+            "products.by_id": estimate(*by_id),
+            "products.by_name": estimate(*by_name),
+        }
+
+    def dump(self) -> Tuple[Iterator[Tuple[str, bytes]], Iterator[Tuple[str, bytes]]]:
+        """スナップショット用の (商品, 正規化名索引)。ロック内ではコピーだけ取る"""
+        with self._lock:
+            by_id, by_name = dict(self._by_id), dict(self._by_name)
+            snapshot = self._snapshot
+        return (
+            merge_table(by_id, snapshot and snapshot.products, _encode_entity),
+            merge_table(by_name, snapshot and snapshot.names, str.encode),
+        )
 
 
 class _OrdersMem(OrdersRepo):
-    def __init__(self):
+    def __init__(self, hot_months: int = 3, archive_dir: str | None = None):
+        # 書き込みモデル: 注文全体(明細つき)。ID で引くだけなので dict に追記する
         self._by_id: Dict[str, OrderCreateResponse] = {}
-        self._by_custid: Dict[str, List[OrderCreateResponse]] = defaultdict(list)
-        self._lock = threading.RLock()
+        # 読み取りモデル: 一覧の行(シリアライズ済みJSONつき)を月単位に分け、
+        # 各パーティションが顧客別インデックスを持つ。save と同じロック内で更新する
+        self._partitions: Dict[
+            int, OrderPartition | ArchivedPartition | SnapshotPartition
+        ] = {}
+        self._months: List[int] = []  # パーティションキー(昇順)
+        self._hot_months = max(hot_months, 1)
+        # 退避先(退避した注文は ArchivedPartition のセグメントから引く)
+        self._archive_dir = archive_dir
+        self._lock = make_lock("orders")
         self._line_no = 1
+        # 検索結果キャッシュの無効化用。save のたびに顧客別・全体の版を進める
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._version_all = 0
+        # totalCount 用の日付別件数(顧客別・全体)
+        self._counts: Dict[str, DateCounter] = {}
+        self._counts_all = DateCounter()
+        # 起動時に読み込んだスナップショット(未展開の注文・件数はここから引く)
+        self._snapshot: Snapshot | None = None
+
+    def load_snapshot(self, snapshot: Snapshot) -> None:
+        """スナップショットを土台にする。各月・各顧客は読まれたときに展開する"""
+        with self._lock:
+            self._snapshot = snapshot
+            for m in snapshot.month_sizes:
+                self._partitions[m] = SnapshotPartition(snapshot, m)
+            self._months = sorted(snapshot.month_sizes)
+            self._line_no = snapshot.line_no
+            self._counts_all = DateCounter.from_days(snapshot.counts_all)
 
     def by_id(self, order_id: str) -> OrderCreateResponse | None:
         with self._lock:
-            return self._by_id.get(order_id)
+            o = self._by_id.get(order_id)
+            if o is not None:
+                return o
+            segments = self._acquire_segments(order_id)
+            snapshot = self._snapshot
+        # セグメント・スナップショットは読み取り専用なのでロック外で展開する
+        try:
+            for segment in segments:
+                o = segment.get(order_id)
+                if o is not None:
+                    return o
+        finally:
+            for segment in segments:
+                segment.release()
+        return snapshot.order(order_id) if snapshot is not None else None
+
+    def _acquire_segments(self, order_id: str) -> List[Segment]:
+        """
+        注文IDの範囲に order_id が入る退避済みの月のセグメント(読み取り開始済み)
+        呼び出し側のロック内で使い、ロック外で読み終えたら release すること
+        """
+        segments = []
+        for m in self._months:
+            part = self._partitions[m]
+            if part.archived and part.segment.may_contain(order_id):
+                part.segment.acquire()
+                segments.append(part.segment)
+        return segments
 
     def save(self, o: OrderCreateResponse, cust_id: str) -> None:
         with self._lock:
             self._by_id[o.order_id] = o
-            self._by_custid[cust_id].append(o)
+            self._partition_for(month_key(o.order_date)).add(
+                OrderSummaryRow.of(o), cust_id
+            )
+            self._versions[cust_id] += 1
+            self._version_all += 1
+            counter = self._counter(cust_id)
+            if counter is None:
+                counter = self._counts[cust_id] = DateCounter()
+            counter.add(o.order_date)
+            self._counts_all.add(o.order_date)
+
+    def _counter(self, cust_id: str) -> DateCounter | None:
+        counter = self._counts.get(cust_id)
+        if counter is None and self._snapshot is not None:
+            counter = self._snapshot.counter(cust_id)
+            if counter is not None:
+                self._counts[cust_id] = counter
+        return counter
+
+    def _partition_for(self, month: int) -> OrderPartition | SnapshotPartition:
+        # スナップショットの月は展開せず、SnapshotPartition の差分に足す
+        part = self._partitions.get(month)
+        if part is not None and part.archived:
+            part = self._restore(part)
+        if part is None:
+            part = self._partitions[month] = OrderPartition(month)
+            bisect.insort(self._months, month)
+            if month == self._months[-1]:
+                # 新しい月に入ったら、古い月を読み取り専用に凍結する
+                self.freeze_before(month - self._hot_months + 1)
+        return part
+
+    def freeze_before(self, month: int) -> int:
+        """パーティションキーが month より前のパーティションを凍結し、その数を返す"""
+        frozen = 0
+        with self._lock:
+            for m in self._months[: bisect.bisect_left(self._months, month)]:
+                part = self._partitions[m]
+                if not part.frozen:
+                    part.freeze()
+                    frozen += 1
+        return frozen
+
+    def archive_before(self, month: int) -> int:
+        """
+        パーティションキーが month より前の月をセグメントファイルへ退避し、
+        その数を返す(archive_dir 未設定なら何もしない)
+        ファイル書き込み中はロックを持たず、書き込み中に更新された月は退避しない
+        (凍結状態ではなく書き込み回数で判定する。書き込み中に解凍・書き込み・
+        再凍結が起きても取りこぼさない)
+        """
+        if not self._archive_dir:
+            return 0
+        os.makedirs(self._archive_dir, exist_ok=True)
+        archived = 0
+        with self._lock:
+            months = self._months[: bisect.bisect_left(self._months, month)]
+        for m in months:
+            with self._lock:
+                part = self._partitions[m]
+                if part.archived:
+                    continue
+                part.freeze()
+                writes = part.writes
+                # セグメントには注文全体を書く(一覧の行は読むときに作り直す)
+                if isinstance(part, SnapshotPartition):
+                    delta = [
+                        (c, self._order(r.order_id)) for c, r in part.delta_items()
+                    ]
+                else:
+                    items = [(c, self._order(r.order_id)) for c, r in part.items()]
+            if isinstance(part, SnapshotPartition):
+                # スナップショット側の月全体はロック外で展開する
+                items = part.orders(delta)
+            path = segment_path(self._archive_dir, m)
+            write_segment(path, m, items)
+            segment = Segment(path)
+            with self._lock:
+                if self._partitions.get(m) is not part or part.writes != writes:
+                    segment.close()  # 退避中に書き込みがあった
+                    os.remove(path)
+                    continue
+                self._partitions[m] = ArchivedPartition(segment)
+                for _, o in items:
+                    self._by_id.pop(o.order_id, None)
+            archived += 1
+        return archived
+
+    def _order(self, order_id: str) -> OrderCreateResponse:
+        """ホット側の注文全体(スナップショットから読み込んだ月ならそこから展開)"""
+        o = self._by_id.get(order_id)
+        return o if o is not None else self._snapshot.order(order_id)
+
+    def _restore(self, part: ArchivedPartition) -> OrderPartition:
+        """退避済みの月に書き込みが来たら、メモリ上のパーティションへ戻す"""
+        restored = OrderPartition(part.month)
+        for cust_id, o in part.segment.items():
+            restored.add(OrderSummaryRow.of(o), cust_id)
+            self._by_id[o.order_id] = o
+        self._partitions[part.month] = restored
+        # ロック外で読んでいる検索があれば、読み終えるまで mmap は閉じない
+        part.segment.close()
+        try:
+            os.remove(part.segment.path)
+        except OSError:
+            logger.warning("failed to remove segment %s", part.segment.path)
+        return restored
+
+    def version(self, cust_id: str | None) -> int:
+        with self._lock:
+            if cust_id is None:
+                return self._version_all
+            return self._versions.get(cust_id, 0)
 
     def exists_id(self, order_id: str) -> bool:
         with self._lock:
-            return order_id in self._by_id
+            if order_id in self._by_id or (
+                self._snapshot is not None and order_id in self._snapshot.orders
+            ):
+                return True
+            segments = self._acquire_segments(order_id)
+        try:
+            return any(segment.get(order_id) is not None for segment in segments)
+        finally:
+            for segment in segments:
+                segment.release()
 
-    def search(
+    def _plan(
+        self,
+        cust_id: str | None,
+        frm: date | None,
+        to: date | None,
+        page: int,
+        size: int,
+    ) -> Tuple[QueryPlan, DateCounter | None]:
+        """検索の実行計画を立てる。呼び出し側のロック内で使うこと"""
+        counter = self._counts_all if cust_id is None else self._counter(cust_id)
+        # from/to の範囲外のパーティションは見ない
+        lo = bisect.bisect_left(self._months, month_key(frm)) if frm else 0
+        hi = (
+            bisect.bisect_right(self._months, month_key(to))
+            if to
+            else len(self._months)
+        )
+        start = page * size
+        plan = plan_search(
+            self._months[lo:hi],
+            self._partitions,
+            counter,
+            cust_id,
+            frm,
+            to,
+            start,
+            start + size,
+        )
+        return plan, counter
+
+    def explain(
         self,
         cust_id: str | None,
         frm: date | None,
         to: date | None,
         page: int,
         size: int,
-    ) -> tuple[list[OrderCreateResponse], int]:
+    ) -> Dict[str, Any]:
         with self._lock:
-            if cust_id:
-                values = list(self._by_custid[cust_id])
-            else:
-                values = []
-                for value in self._by_custid.values():
-                    values.extend(value)
+            plan, _ = self._plan(cust_id, frm, to, page, size)
+        return plan.explain()
 
-        if frm:
-            values = [o for o in values if o.order_date >= frm]
-        if to:
-            values = [o for o in values if o.order_date <= to]
+    def search(
+        self,
+        cust_id: str | None,
+        frm: date | None,
+        to: date | None,
+        page: int,
+        size: int,
+        with_total: bool = True,
+    ) -> tuple[list[OrderSummaryRow], int | None]:
+        with self._lock:
+            plan, counter = self._plan(cust_id, frm, to, page, size)
+            total = None
+            if with_total:
+                total = counter.count(frm, to) if counter else 0
 
-        values.sort(key=lambda o: o.order_date, reverse=True)
+        # 計画の月だけを新しい順に読む(件数が0の月・ページより前の月は触れない)
+        collected: list[OrderSummaryRow] = []
+        for step in plan.reads():
+            collected.extend(self._read(step, cust_id))
+        return collected, total
 
-        total = len(values)
+    def _read(self, step: PlanStep, cust_id: str | None) -> List[OrderSummaryRow]:
+        """
+        計画の1か月分を読む。メモリ上の行はロック内で読み、展開はロック外で行う
+        - 退避済みの月は、索引により対象ブロックだけ展開する
+        - スナップショットの月は、未展開ならスナップショット側を展開してから
+          ロックを取り直し、差分と合わせて読む(その間に退避されたら読み直す)
+        """
+        while True:
+            with self._lock:
+                part = self._partitions[step.month]
+                if part.archived:
+                    part.segment.acquire()
+                elif not isinstance(part, SnapshotPartition) or part.loaded(cust_id):
+                    return read_step(part, step, cust_id)
+            if not part.archived:
+                part.load(cust_id)
+                continue
+            try:
+                return read_step(part, step, cust_id)
+            finally:
+                part.segment.release()
 
-        start = page * size
-        end = start + size
-        page_items = values[start:end]
+    def sizes(self) -> Dict[str, int]:
+        """注文数と、メモリ上の注文・月パーティション・退避済みの月の数"""
+        with self._lock:
+            return {
+                "orders": self._counts_all.total,
+                "orders_in_memory": len(self._by_id),
+                "partitions": len(self._months),
+                "archived_partitions": sum(
+                    1 for m in self._months if self._partitions[m].archived
+                ),
+            }
 
-        return page_items, total
+    def memory(self, sample: int) -> Dict[str, Dict[str, int]]:
+        """
+        書き込みモデル・月パーティション・退避済みの月の索引・件数カウンタ・
+        検索結果キャッシュ用の版の見積もり
+        ロック内では見本を取るだけで、サイズの計算はロック外で行う
+        顧客別索引の行は一覧の行と共有なので、索引は入れ物だけを数える
+        """
+        with self._lock:
+            by_id = (self._by_id, len(self._by_id), head(self._by_id.items(), sample))
+            counts = (
+                self._counts,
+                len(self._counts),
+                head(self._counts.items(), sample),
+            )
+            versions = (
+                self._versions,
+                len(self._versions),
+                head(self._versions.items(), sample),
+            )
+            parts = []
+            segments = []
+            for m in self._months:
+                part = self._partitions[m]
+                if part.archived:
+                    segments.append(part.segment.memory_sample(sample))
+                else:
+                    parts.append(part.memory_sample(sample))
+        rows = {"entries": 0, "bytes": 0}
+        index = {"entries": 0, "bytes": 0}
+        for part_rows, part_index in parts:
+            for total, est in (
+                (rows, estimate(*part_rows)),
+                (index, estimate(*part_index, sizeof=shallow_items)),
+            ):
+                total["entries"] += est["entries"]
+                total["bytes"] += est["bytes"]
+        blocks = {"entries": 0, "bytes": 0}
+        customers = {"entries": 0, "bytes": 0}
+        for seg_blocks, seg_customers in segments:
+            for total, est in (
+                (blocks, estimate(*seg_blocks)),
+                (customers, estimate(*seg_customers)),
+            ):
+                total["entries"] += est["entries"]
+                total["bytes"] += est["bytes"]
+        return {
+            "orders.by_id": estimate(*by_id),
+            "orders.partitions.rows": rows,
+            "orders.partitions.by_custid": index,
+            "orders.segments.blocks": blocks,
+            "orders.segments.customers": customers,
+            "orders.counts": estimate(*counts),
+            "orders.versions": estimate(*versions),
+        }
 
     def pop_line_no(self):
+        return self.reserve_line_nos(1)[0]
+
+    def dump(self) -> Tuple[int, Iterator, Iterator[Tuple[str, bytes]], Dict[int, int]]:
+        """
+        スナップショット用の (次の行番号, 月ごとの行, 顧客別件数, 全体件数)
+        ロック内では凍結済みコピー・参照だけを取り、展開とエンコードは呼び出し側で
+        """
         with self._lock:
-            value = self._line_no
-            self._line_no += 1
-            return value
+            parts = []
+            for m in self._months:
+                part = self._partitions[m]
+                if part.archived:
+                    # 退避済みの月は、書き出し中に戻されても読めるよう開き直す
+                    part = Segment(part.segment.path)
+                else:
+                    part = part.frozen_copy()
+                parts.append((m, part))
+            counts = {c: counter.days() for c, counter in self._counts.items()}
+            counts_all = self._counts_all.days()
+            orders = dict(self._by_id)
+            snapshot = self._snapshot
+            line_no = self._line_no
+        months = ((m, month_groups(part, orders, snapshot)) for m, part in parts)
+        return (
+            line_no,
+            months,
+            merge_table(counts, snapshot and snapshot.counts, encode_days),
+            counts_all,
+        )
 
+    def advance_line_no(self, o: OrderCreateResponse) -> None:
+        """再生した注文の行番号より後から払い出すようにする"""
+        with self._lock:
+            for it in o.items:
+                self._line_no = max(self._line_no, it.line_no + 1)
 
-class MemoryUoW(UoW):
-    def __init__(self):
+    def reserve_line_nos(self, n: int) -> range:
+        """連続した n 個の行番号を1回のロックで予約する"""
+        with self._lock:
+            start = self._line_no
+            self._line_no += n
+            return range(start, start + n)
+
+
+class _Change(NamedTuple):
+    """変更セットの1件"""
+
+    kind: str  # "customer" | "product" | "order"
+    entity: CustomerWithId | ProductWithId | OrderCreateResponse
+    cust_id: str | None = None  # order のみ
+    if_absent: bool = False  # insert_if_absent で積まれたもの(commit 時に再検証)
+
+
+_ENTITY_TYPES = {
+    "customer": CustomerWithId,
+    "product": ProductWithId,
+    "order": OrderCreateResponse,
+}
+
+
+def _encode_entity(e: CustomerWithId | ProductWithId) -> bytes:
+    return e.model_dump_json().encode()
+
+
+def encode_changes(changes: List[_Change]) -> bytes:
+    """ジャーナル用に変更セットをコンパクトなJSONへ"""
+    return json.dumps(
+        [[ch.kind, ch.entity.model_dump(mode="json"), ch.cust_id] for ch in changes],
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def decode_changes(payload: bytes) -> List[_Change]:
+    return [
+        _Change(kind, _ENTITY_TYPES[kind].model_validate(entity), cust_id)
+        for kind, entity, cust_id in json.loads(payload)
+    ]
+
+
+class MemoryStore:
+    """
+    コミット済みの状態(全リクエストで共有する)
+    version はコミットのたびに進み、楽観的検証に使う
+    journal を渡すと、起動時に再生し、以後のコミットを先行書き込みする
+    snapshot_path にスナップショットがあれば mmap で開いて土台にし、
+    ジャーナルはスナップショット以降の分だけを再生する
+    """
+
+    def __init__(
+        self,
+        *,
+        hot_months: int = 3,
+        archive_dir: str | None = None,
+        journal: Journal | None = None,
+        snapshot_path: str | None = None,
+    ):
         self.customers = _CustomersMem()
         self.products = _ProductsMem()
-        self.orders = _OrdersMem()
+        self.orders = _OrdersMem(hot_months=hot_months, archive_dir=archive_dir)
+        self.version = 0
+        self.journal = journal
+        # 永続化を待っているコミットが予約した一意キー -> 予約数
+        self._pending: Dict[Tuple[str, InsertConflict, str], int] = {}
+        # 追記済みでまだメモリに反映していないコミット(LSN -> 変更セット・予約キー)
+        # 追記と同じロック内で足すので、LSN の昇順に並ぶ
+        self._unapplied: Dict[
+            int, Tuple[List[_Change], List[Tuple[str, InsertConflict, str]]]
+        ] = {}
+        # メモリに反映済みのジャーナルの位置(これより前のレコードはすべて反映済み)
+        self._applied_lsn = 0
+        journal_offset = 0
+        if snapshot_path and os.path.exists(snapshot_path):
+            journal_offset = self.load_snapshot(Snapshot(snapshot_path))
+        if journal is not None:
+            self.replay(journal.records(journal_offset))
+            self._applied_lsn = journal.offset
+
+    @property
+    def commit_waits_for_fsync(self) -> bool:
+        """コミットが fsync を待つか(待つならイベントループ上でコミットしない)"""
+        return self.journal is not None and self.journal.durability != "none"
+
+    def load_snapshot(self, snapshot: Snapshot) -> int:
+        """スナップショットを土台にし、続きを再生するジャーナルの位置を返す"""
+        self.customers.load_snapshot(snapshot)
+        self.products.load_snapshot(snapshot)
+        self.orders.load_snapshot(snapshot)
+        self.version = snapshot.version
+        return snapshot.journal_offset
+
+    def save_snapshot(self, path: str) -> None:
+        """
+        コミット済みの状態をスナップショットに書き出す
+        全ロックを持つのは参照・凍結済みコピーを取る間だけで、
+        エンコードと書き込みはロック外で行う(未展開の分は元のファイルから書き写す)
+        ジャーナルの位置は、追記の末尾ではなくメモリに反映済みの位置を記録する
+        (fsync 待ちのコミットは状態に含まれないので、再起動時に再生させる)
+        """
+        with self.customers._lock, self.products._lock, self.orders._lock:
+            customers, emails = self.customers.dump()
+            products, names = self.products.dump()
+            line_no, months, counts, counts_all = self.orders.dump()
+            version = self.version
+            journal_offset = self._applied_lsn
+        write_snapshot(
+            path,
+            SnapshotState(
+                version=version,
+                line_no=line_no,
+                journal_offset=journal_offset,
+                customers=customers,
+                emails=emails,
+                products=products,
+                names=names,
+                months=months,
+                counts=counts,
+                counts_all=counts_all,
+            ),
+        )
+
+    def sizes(self) -> Dict[str, int]:
+        """メトリクス用の件数(顧客・商品・注文など)"""
+        return {
+            "customers": self.customers.count(),
+            "products": self.products.count(),
+            **self.orders.sizes(),
+        }
+
+    def memory(self, sample: int) -> Dict[str, Dict[str, int]]:
+        """構造ごとの {件数, 見積もりバイト数}(各構造の先頭 sample 件から見積もる)"""
+        return {
+            **self.customers.memory(sample),
+            **self.products.memory(sample),
+            **self.orders.memory(sample),
+        }
+
+    def replay(self, payloads: Iterable[bytes]) -> int:
+        """ジャーナルのレコードを順に反映し、その件数を返す(ジャーナルには書かない)"""
+        n = 0
+        for payload in payloads:
+            changes = decode_changes(payload)
+            self._apply_in_memory(changes)
+            for ch in changes:
+                if ch.kind == "order":
+                    self.orders.advance_line_no(ch.entity)
+            n += 1
+        return n
+
+    def apply(self, changes: List[_Change], read_version: int) -> None:
+        """
+        変更セットを1つのクリティカルセクションでまとめて反映する
+        read_version 以降に他のコミットがあれば、一意制約を検証し直す
+        違反があれば何も反映せず CommitConflict を送出する
+
+        ジャーナルがあれば、検証と追記をロック内で行い、fsync の完了はロックを
+        外してから待つ(待っている間に他のコミットが同じ fsync に相乗りできる)
+        共有状態への反映は永続化の後なので、他のリクエストから見えるのは
+        永続化された変更だけ。待つ間は一意キーを予約し、後から来たコミットとの
+        重複を防ぐ。fsync に失敗したら何も反映せず JournalFailed を送出する
+        反映はジャーナルの順に行う(先に永続化を確認したコミットが、それより前の
+        永続化済みのコミットもまとめて反映する)ので、メモリ上の状態は常に
+        ジャーナルの先頭から _applied_lsn までと一致する
+        """
+        # ロック順は常に customers -> products -> orders
+        with self.customers._lock, self.products._lock, self.orders._lock:
+            if self.version != read_version or self._pending:
+                self._validate(changes)
+            if self.journal is None:
+                self._apply_in_memory(changes)
+                return
+            lsn = self.journal.append(encode_changes(changes))
+            keys = _unique_keys(changes)
+            for key in keys:
+                self._pending[key] = self._pending.get(key, 0) + 1
+            self._unapplied[lsn] = (changes, keys)
+        try:
+            self.journal.wait_durable(lsn)
+        except BaseException:
+            with self.customers._lock, self.products._lock, self.orders._lock:
+                if self._unapplied.pop(lsn, None) is not None:
+                    self._release(keys)
+            raise
+        with self.customers._lock, self.products._lock, self.orders._lock:
+            self._apply_through(lsn)
+
+    def _apply_through(self, lsn: int) -> None:
+        """LSN が lsn 以下の未反映のコミットを順に反映する。全ロック内で使うこと"""
+        for pending_lsn in list(self._unapplied):
+            if pending_lsn > lsn:
+                break
+            changes, keys = self._unapplied.pop(pending_lsn)
+            self._release(keys)
+            self._apply_in_memory(changes)
+            self._applied_lsn = pending_lsn
+
+    def _release(self, keys: List[Tuple[str, InsertConflict, str]]) -> None:
+        for key in keys:
+            n = self._pending[key] - 1
+            if n:
+                self._pending[key] = n
+            else:
+                del self._pending[key]
+
+    def _apply_in_memory(self, changes: List[_Change]) -> None:
+        with self.customers._lock, self.products._lock, self.orders._lock:
+            for ch in changes:
+                if ch.kind == "customer":
+                    self.customers.save(ch.entity)
+                elif ch.kind == "product":
+                    self.products.save(ch.entity)
+                else:
+                    self.orders.save(ch.entity, ch.cust_id)
+            self.version += 1
+
+    def _validate(self, changes: List[_Change]) -> None:
+        for ch in changes:
+            if not ch.if_absent:
+                continue
+            if ch.kind == "customer":
+                conflict, key = self.customers.find_conflict(ch.entity), ch.entity.email
+            else:
+                conflict, key = self.products.find_conflict(ch.entity), ch.entity.name
+            if conflict is None:
+                # 永続化待ちのコミットが予約したキーとも重ならないこと
+                for pending in _unique_keys([ch]):
+                    if pending in self._pending:
+                        conflict = pending[1]
+                        break
+            if conflict is not None:
+                raise CommitConflict(conflict, key)
+
+
+def _unique_keys(changes: List[_Change]) -> List[Tuple[str, InsertConflict, str]]:
+    """変更セットが一意制約の対象として予約するキー (種類, 制約, 値)"""
+    keys: List[Tuple[str, InsertConflict, str]] = []
+    for ch in changes:
+        if ch.kind == "customer":
+            keys.append(("customer", InsertConflict.ID, ch.entity.cust_id))
+            keys.append(("customer", InsertConflict.EMAIL, ch.entity.email.lower()))
+        elif ch.kind == "product":
+            keys.append(("product", InsertConflict.ID, ch.entity.prod_id))
+            keys.append(
+                ("product", InsertConflict.NAME, ch.entity.name.strip().lower())
+            )
+    return keys
+
+
+class _CustomersTx(CustomersRepo):
+    """変更セットに積むだけの顧客リポジトリ(読み取りは変更セット→共有状態の順)"""
+
+    def __init__(self, store: _CustomersMem, changes: List[_Change]):
+        self._store = store
+        self._changes = changes
+        self._staged: Dict[str, CustomerWithId] = {}
+        self._staged_emails: Dict[str, str] = {}
+
+    def by_id(self, cust_id: str) -> CustomerWithId | None:
+        c = self._staged.get(cust_id)
+        return c if c is not None else self._store.by_id(cust_id)
+
+    def exists_id(self, cust_id: str) -> bool:
+        return cust_id in self._staged or self._store.exists_id(cust_id)
+
+    def exists_email(self, email: str) -> bool:
+        return email.lower() in self._staged_emails or self._store.exists_email(email)
+
+    def save(self, c: CustomerWithId) -> None:
+        self._stage(c, if_absent=False)
+
+    def insert_if_absent(self, c: CustomerWithId) -> InsertConflict | None:
+        if c.cust_id in self._staged:
+            return InsertConflict.ID
+        if c.email.lower() in self._staged_emails:
+            return InsertConflict.EMAIL
+        conflict = self._store.find_conflict(c)
+        if conflict is None:
+            self._stage(c, if_absent=True)
+        return conflict
+
+    def _stage(self, c: CustomerWithId, if_absent: bool) -> None:
+        self._staged[c.cust_id] = c
+        self._staged_emails[c.email.lower()] = c.cust_id
+        self._changes.append(_Change("customer", c, if_absent=if_absent))
+
+    def _clear(self) -> None:
+        self._staged.clear()
+        self._staged_emails.clear()
+
+
+class _ProductsTx(ProductsRepo):
+    """変更セットに積むだけの商品リポジトリ(読み取りは変更セット→共有状態の順)"""
+
+    def __init__(self, store: _ProductsMem, changes: List[_Change]):
+        self._store = store
+        self._changes = changes
+        self._staged: Dict[str, ProductWithId] = {}
+        self._staged_names: Dict[str, str] = {}
+
+    def by_id(self, prod_id: str) -> ProductWithId | None:
+        p = self._staged.get(prod_id)
+        return p if p is not None else self._store.by_id(prod_id)
+
+    def by_name_norm_exists(self, name_norm: str) -> bool:
+        return name_norm in self._staged_names or self._store.by_name_norm_exists(
+            name_norm
+        )
+
+    def exists_id(self, prod_id: str) -> bool:
+        return prod_id in self._staged or self._store.exists_id(prod_id)
+
+    def save(self, p: ProductWithId) -> None:
+        self._stage(p, if_absent=False)
+
+    def insert_if_absent(self, p: ProductWithId) -> InsertConflict | None:
+        if p.prod_id in self._staged:
+            return InsertConflict.ID
+        if p.name.strip().lower() in self._staged_names:
+            return InsertConflict.NAME
+        conflict = self._store.find_conflict(p)
+        if conflict is None:
+            self._stage(p, if_absent=True)
+        return conflict
+
+    def _stage(self, p: ProductWithId, if_absent: bool) -> None:
+        self._staged[p.prod_id] = p
+        self._staged_names[p.name.strip().lower()] = p.prod_id
+        self._changes.append(_Change("product", p, if_absent=if_absent))
+
+    def _clear(self) -> None:
+        self._staged.clear()
+        self._staged_names.clear()
+
+
+class _OrdersTx(OrdersRepo):
+    """
+    注文の save だけを変更セットに積む
+    検索・版・行番号はコミット済みの共有状態に委譲する
+    (行番号は DB のシーケンス同様、ロールバックしても戻さない)
+    """
+
+    def __init__(self, store: _OrdersMem, changes: List[_Change]):
+        self._store = store
+        self._changes = changes
+        self._staged: Dict[str, OrderCreateResponse] = {}
+
+    def by_id(self, order_id: str) -> OrderCreateResponse | None:
+        o = self._staged.get(order_id)
+        return o if o is not None else self._store.by_id(order_id)
+
+    def exists_id(self, order_id: str) -> bool:
+        return order_id in self._staged or self._store.exists_id(order_id)
+
+    def save(self, o: OrderCreateResponse, cust_id: str) -> None:
+        self._staged[o.order_id] = o
+        self._changes.append(_Change("order", o, cust_id=cust_id))
+
+    def search(
+        self,
+        cust_id: str | None,
+        frm: date | None,
+        to: date | None,
+        page: int,
+        size: int,
+        with_total: bool = True,
+    ) -> tuple[list[OrderSummaryRow], int | None]:
+        return self._store.search(cust_id, frm, to, page, size, with_total)
+
+    def explain(
+        self,
+        cust_id: str | None,
+        frm: date | None,
+        to: date | None,
+        page: int,
+        size: int,
+    ) -> Dict[str, Any]:
+        return self._store.explain(cust_id, frm, to, page, size)
+
+    def version(self, cust_id: str | None) -> int:
+        return self._store.version(cust_id)
+
+    def pop_line_no(self) -> int:
+        return self._store.pop_line_no()
+
+    def reserve_line_nos(self, n: int) -> range:
+        return self._store.reserve_line_nos(n)
+
+    def _clear(self) -> None:
+        self._staged.clear()
+
+
+class MemoryUoW(UoW):
+    """
+    リクエスト単位のトランザクション
+    - save / insert_if_absent は変更セットに積むだけで、共有状態には書かない
+    - commit で変更セットを1つのクリティカルセクションでまとめて反映する
+      (開始後に他のコミットがあれば一意制約を検証し直す＝楽観的検証)
+    - rollback、または commit せずに破棄すれば変更セットは捨てられる
+    - 検索はコミット済みの状態だけを見る
+    """
+
+    def __init__(
+        self,
+        store: MemoryStore | None = None,
+        *,
+        hot_months: int = 3,
+        archive_dir: str | None = None,
+    ):
+        if store is None:
+            store = MemoryStore(hot_months=hot_months, archive_dir=archive_dir)
+        self.store = store
+        self._changes: List[_Change] = []
+        self._read_version = store.version
+        self.customers = _CustomersTx(store.customers, self._changes)
+        self.products = _ProductsTx(store.products, self._changes)
+        self.orders = _OrdersTx(store.orders, self._changes)
 
     def commit(self) -> None:
-        pass
+        try:
+            if self._changes:
+                with phase("commit"):
+                    self.store.apply(self._changes, self._read_version)
+        finally:
+            self.rollback()
+            self._read_version = self.store.version
 
     def rollback(self) -> None:
-        pass
+        self._changes.clear()
+        self.customers._clear()
+        self.products._clear()
+        self.orders._clear()
@@ -0,0 +1,290 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from ..core.memsize import head
+from ..ports import OrderSummaryRow
+from ..schemas import OrderCreateResponse
+from .order_partition import month_key
+
+logger = logging.getLogger(__name__)
+
+# ファイル末尾: 索引の位置(8byte) + 索引の長さ(4byte) + マジック(8byte)
+_FOOTER = struct.Struct("<QI8s")
+_MAGIC = b"ORDSEG02"
+# 索引に注文ID→ブロックの表を持つ旧形式(読み込み時に範囲へ直す)
+_MAGIC_V1 = b"ORDSEG01"
+BLOCK_ROWS = 256
+
+
+def segment_path(directory: str, month: int) -> str:
+    year, m = divmod(month, 12)
+    return os.path.join(directory, f"orders-{year:04d}-{m + 1:02d}.seg")
+
+
+def write_segment(
+    path: str, month: int, rows: Sequence[Tuple[str, OrderCreateResponse]]
+) -> None:
+    """
+    1か月分の注文(日付降順の (cust_id, order))をセグメントファイルに書き出す
+    - BLOCK_ROWS 件ずつ zlib 圧縮したブロックを並べる
+    - 末尾に疎な索引(ブロックごとの日付範囲・注文IDの範囲と、顧客→ブロック)
+      注文IDは採番時刻順なので、ID の範囲だけで by_id の対象ブロックを絞れる
+    - 一時ファイルに書いてから置き換えるので、途中で落ちても壊れない
+    """
+    blocks: List[List[int]] = []
+    customers: Dict[str, List[int]] = {}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        for no, i in enumerate(range(0, len(rows), BLOCK_ROWS)):
+            chunk = rows[i : i + BLOCK_ROWS]
+            payload = json.dumps(
+                [[cust_id, o.model_dump(mode="json")] for cust_id, o in chunk],
+                separators=(",", ":"),
+            ).encode("utf-8")
+            data = zlib.compress(payload)
+            # [offset, length, 最大日付, 最小日付, 件数, 最小ID, 最大ID]
+            # (日付は ordinal)
+            blocks.append(
+                [
+                    f.tell(),
+                    len(data),
+                    chunk[0][1].order_date.toordinal(),
+                    chunk[-1][1].order_date.toordinal(),
+                    len(chunk),
+                    min(o.order_id for _, o in chunk),
+                    max(o.order_id for _, o in chunk),
+                ]
+            )
+            f.write(data)
+            for cust_id, o in chunk:
+                nos = customers.setdefault(cust_id, [])
+                if not nos or nos[-1] != no:
+                    nos.append(no)
+        index = zlib.compress(
+            json.dumps(
+                {"month": month, "blocks": blocks, "customers": customers},
+                separators=(",", ":"),
+            ).encode("utf-8")
+        )
+        index_offset = f.tell()
+        f.write(index)
+        f.write(_FOOTER.pack(index_offset, len(index), _MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """
+    セグメントファイルを mmap で開いた読み取り専用ビュー
+    メモリに載せるのは索引だけで、注文はアクセスのたびにブロック単位で展開する
+    ロック外で読む側は acquire / release で囲む。close は読み取り中なら
+    最後の release まで mmap を閉じるのを遅らせる
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, index_len, magic = _FOOTER.unpack(self._mm[-_FOOTER.size :])
+        if magic not in (_MAGIC, _MAGIC_V1):
+            raise ValueError(f"not an order segment: {path}")
+        index = json.loads(
+            zlib.decompress(self._mm[index_offset : index_offset + index_len])
+        )
+        self.month: int = index["month"]
+        self._blocks: List[list] = index["blocks"]
+        self._customers: Dict[str, List[int]] = index["customers"]
+        if magic == _MAGIC_V1:
+            _add_id_ranges(self._blocks, index["ids"])
+        self._len = sum(b[4] for b in self._blocks)
+        self.min_id = min((b[5] for b in self._blocks), default="")
+        self.max_id = max((b[6] for b in self._blocks), default="")
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._closing = False
+
+    def __len__(self) -> int:
+        return self._len
+
+    def acquire(self) -> None:
+        """ロック外での読み取りを始める(終わったら release)"""
+        with self._lock:
+            if self._closing:
+                raise ValueError(f"segment is closed: {self.path}")
+            self._readers += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._readers -= 1
+            if self._closing and not self._readers:
+                self._mm.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closing = True
+            if not self._readers:
+                self._mm.close()
+
+    def _read_raw(self, no: int) -> List[list]:
+        offset, length = self._blocks[no][0], self._blocks[no][1]
+        return json.loads(zlib.decompress(self._mm[offset : offset + length]))
+
+    def _read_block(self, no: int) -> List[Tuple[str, OrderCreateResponse]]:
+        return [
+            (cust_id, OrderCreateResponse.model_validate(o))
+            for cust_id, o in self._read_raw(no)
+        ]
+
+    def may_contain(self, order_id: str) -> bool:
+        return self.min_id <= order_id <= self.max_id
+
+    def get(self, order_id: str) -> OrderCreateResponse | None:
+        """ID の範囲に入るブロックだけを展開して探す(該当する1件だけ検証する)"""
+        if not self.may_contain(order_id):
+            return None
+        for no, block in enumerate(self._blocks):
+            if not block[5] <= order_id <= block[6]:
+                continue
+            for _, o in self._read_raw(no):
+                if o["order_id"] == order_id:
+                    return OrderCreateResponse.model_validate(o)
+        return None
+
+    def rows(
+        self,
+        cust_id: str | None,
+        frm: date | None = None,
+        to: date | None = None,
+    ) -> Tuple[OrderCreateResponse, ...]:
+        """日付降順で返す。索引で対象外のブロックは展開しない"""
+        nos = (
+            range(len(self._blocks))
+            if cust_id is None
+            else self._customers.get(cust_id, ())
+        )
+        lo = frm.toordinal() if frm else None
+        hi = to.toordinal() if to else None
+        out: List[OrderCreateResponse] = []
+        for no in nos:
+            max_ord, min_ord = self._blocks[no][2:4]
+            if (lo is not None and max_ord < lo) or (hi is not None and min_ord > hi):
+                continue
+            out.extend(
+                o for c, o in self._read_block(no) if cust_id is None or c == cust_id
+            )
+        return tuple(out)
+
+    def items(self) -> List[Tuple[str, OrderCreateResponse]]:
+        out: List[Tuple[str, OrderCreateResponse]] = []
+        for no in range(len(self._blocks)):
+            out.extend(self._read_block(no))
+        return out
+
+    def memory_sample(self, sample: int) -> Tuple[Tuple, Tuple]:
+        """
+        メモリに載せている索引の (ブロック表, 顧客別ブロック番号) それぞれの
+        (入れ物, 件数, 見本)。索引は読み取り専用なのでロックは要らない
+        """
+        return (
+            (self._blocks, len(self._blocks), head(self._blocks, sample)),
+            (
+                self._customers,
+                len(self._customers),
+                head(self._customers.items(), sample),
+            ),
+        )
+
+
+def _add_id_ranges(blocks: List[list], ids: Dict[str, int]) -> None:
+    """旧形式の 注文ID→ブロック の表を、ブロックごとの [最小ID, 最大ID] に直す"""
+    ranges: Dict[int, List[str]] = {}
+    for order_id, no in ids.items():
+        r = ranges.get(no)
+        if r is None:
+            ranges[no] = [order_id, order_id]
+        elif order_id < r[0]:
+            r[0] = order_id
+        elif order_id > r[1]:
+            r[1] = order_id
+    for no, block in enumerate(blocks):
+        block.extend(ranges.get(no, ["", ""]))
+
+
+class ArchivedPartition:
+    """
+    セグメントファイルに退避済みの月パーティション(読み取り専用)
+    セグメントは注文全体を持つので、一覧の行は読むたびに作る
+    """
+
+    archived = True
+    frozen = True
+
+    def __init__(self, segment: Segment):
+        self.segment = segment
+        self.month = segment.month
+
+    def __len__(self) -> int:
+        return len(self.segment)
+
+    def rows(
+        self,
+        cust_id: str | None,
+        frm: date | None = None,
+        to: date | None = None,
+    ) -> Tuple[OrderSummaryRow, ...]:
+        return tuple(OrderSummaryRow.of(o) for o in self.segment.rows(cust_id, frm, to))
+
+
+class OrderArchiver:
+    """
+    一定間隔で、after_days より古い月パーティションをセグメントへ退避する
+    バックグラウンドスレッド
+    """
+
+    def __init__(
+        self,
+        orders,
+        *,
+        after_days: int,
+        interval_seconds: float,
+        today_provider: Callable[[], date] = date.today,
+    ):
+        self._orders = orders
+        self._after_days = after_days
+        self._interval = interval_seconds
+        self._today = today_provider
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_once(self) -> int:
+        cutoff = self._today() - timedelta(days=self._after_days)
+        # cutoff を含む月より前の月は、全件が cutoff より古い
+        return self._orders.archive_before(month_key(cutoff))
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("order archiving failed")
+            if self._stop.wait(self._interval):
+                return
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="order-archiver", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+from ..core.memsize import head
+from ..ports import OrderSummaryRow
+
+
+def month_key(d: date) -> int:
+    """パーティションキー(西暦年*12 + 月-1)。大小関係が時系列と一致する"""
+    return d.year * 12 + d.month - 1
+
+
+def month_bounds(month: int) -> Tuple[date, date]:
+    """パーティションキーの月の初日と末日"""
+    year, m = divmod(month, 12)
+    first = date(year, m + 1, 1)
+    year, m = divmod(month + 1, 12)
+    return first, date(year, m + 1, 1) - timedelta(days=1)
+
+
+def sort_desc(rows: Sequence[OrderSummaryRow]) -> List[OrderSummaryRow]:
+    # タプルの大小が (注文日, 注文ID) の順。注文IDは採番時刻順なので、
+    # 同日内の並びのタイブレークに使える
+    return sorted(rows, reverse=True)
+
+
+class OrderPartition:
+    """
+    1か月分の注文一覧の行(読み取りモデル)と、その月の顧客別インデックス
+    - 書き込み可能な間は登録順のリストで保持する
+    - freeze() で日付降順に並べたタプルへ変換し、以後は読み取り専用
+      (ソート不要・コピー不要で走査できる)
+    - 凍結後に書き込みが来たら thaw してリストへ戻す
+    - writes は書き込み回数(ロック外の処理の間に変更があったかの判定用)
+    """
+
+    __slots__ = ("month", "frozen", "writes", "_all", "_by_custid")
+
+    archived = False
+
+    def __init__(self, month: int):
+        self.month = month
+        self.frozen = False
+        self.writes = 0
+        self._all: Sequence[OrderSummaryRow] = []
+        self._by_custid: Dict[str, Sequence[OrderSummaryRow]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def add(self, row: OrderSummaryRow, cust_id: str) -> None:
+        if self.frozen:
+            self.thaw()
+        self.writes += 1
+        self._all.append(row)
+        self._by_custid[cust_id].append(row)
+
+    def rows(self, cust_id: str | None) -> Sequence[OrderSummaryRow]:
+        """
+        対象行を返す(凍結済みなら日付降順のタプル、未凍結なら登録順のコピー)
+        呼び出し側のロック内で使うこと
+        """
+        rows = self._all if cust_id is None else self._by_custid.get(cust_id, ())
+        return rows if self.frozen else list(rows)
+
+    def freeze(self) -> None:
+        if self.frozen:
+            return
+        self._all = tuple(sort_desc(self._all))
+        self._by_custid = {
+            cust_id: tuple(sort_desc(rows)) for cust_id, rows in self._by_custid.items()
+        }
+        self.frozen = True
+
+    def thaw(self) -> None:
+        if not self.frozen:
+            return
+        self._all = list(self._all)
+        self._by_custid = defaultdict(
+            list, {cust_id: list(rows) for cust_id, rows in self._by_custid.items()}
+        )
+        self.frozen = False
+
+    def frozen_copy(self) -> "OrderPartition":
+        """
+        現時点の内容の凍結済みコピー(呼び出し側のロック内で使うこと)
+        凍結済みならタプルを共有するので、コピーは顧客数ぶんだけ
+        """
+        copy = OrderPartition(self.month)
+        if self.frozen:
+            copy._all = self._all
+            copy._by_custid = dict(self._by_custid)
+        else:
+            copy._all = tuple(sort_desc(self._all))
+            copy._by_custid = {
+                cust_id: tuple(sort_desc(rows))
+                for cust_id, rows in self._by_custid.items()
+            }
+        copy.frozen = True
+        return copy
+
+    def memory_sample(self, sample: int) -> Tuple[Tuple, Tuple]:
+        """
+        メモリ見積もり用の (一覧の行, 顧客別索引) それぞれの (入れ物, 件数, 見本)
+        呼び出し側のロック内で使うこと
+        """
+        return (
+            (self._all, len(self._all), head(self._all, sample)),
+            (
+                self._by_custid,
+                len(self._by_custid),
+                head(self._by_custid.items(), sample),
+            ),
+        )
+
+    def by_customer(self) -> List[Tuple[str, Sequence[OrderSummaryRow]]]:
+        """(cust_id, 日付降順の行) の組。凍結済みのパーティションで使うこと"""
+        return list(self._by_custid.items())
+
+    def items(self) -> List[Tuple[str, OrderSummaryRow]]:
+        """(cust_id, order) を日付降順で返す。呼び出し側のロック内で使うこと"""
+        owner = {id(o): c for c, rows in self._by_custid.items() for o in rows}
+        rows = self._all if self.frozen else sort_desc(self._all)
+        return [(owner[id(o)], o) for o in rows]
@@ -0,0 +1,166 @@
+import bisect
+import math
+from datetime import date
+from typing import Any, Dict, List, Mapping, NamedTuple, Sequence
+
+from ..ports import OrderSummaryRow
+from .date_counter import DateCounter
+from .order_partition import month_bounds, sort_desc
+
+# アクセスパス
+SKIP_EMPTY = "skip_empty"  # 範囲内に行がない月(パーティションに触れない)
+SKIP_OFFSET = "skip_offset"  # ページより前に収まる月(件数だけ進める)
+CUSTOMER_INDEX = "customer_index"  # 顧客別の行(日付降順)を二分探索で切り出す
+CUSTOMER_SCAN = "customer_scan"  # 顧客別の行を走査して絞り込む
+DATE_INDEX = "date_index"  # 月の全行(日付降順)を二分探索で切り出す
+FULL_SCAN = "full_scan"  # 月の全行を走査して絞り込む
+SEGMENT_INDEX = "segment_index"  # 退避済みセグメントのブロック索引
+
+_INDEX_PATHS = (CUSTOMER_INDEX, DATE_INDEX)
+
+
+class PlanStep(NamedTuple):
+    """1か月分の読み方"""
+
+    month: int
+    path: str
+    frm: date  # この月で読む日付の範囲
+    to: date
+    rows: int  # 範囲内の件数(統計から)
+    offset: int  # この月の中で読み飛ばす件数
+    limit: int  # この月から取る件数
+    cost: float
+    alternatives: Dict[str, float]  # 比べたアクセスパスとコスト
+
+
+class QueryPlan(NamedTuple):
+    cust_id: str | None
+    start: int
+    end: int
+    steps: List[PlanStep]
+
+    def reads(self) -> List[PlanStep]:
+        """実際にパーティションを読むステップ(新しい月から順)"""
+        return [s for s in self.steps if s.limit > 0]
+
+    def explain(self) -> Dict[str, Any]:
+        return {
+            "custId": self.cust_id,
+            "offset": self.start,
+            "limit": self.end - self.start,
+            "estimatedCost": round(sum(s.cost for s in self.steps), 1),
+            "steps": [
+                {
+                    "month": _month_label(s.month),
+                    "path": s.path,
+                    "from": s.frm.isoformat(),
+                    "to": s.to.isoformat(),
+                    "rows": s.rows,
+                    "offset": s.offset,
+                    "limit": s.limit,
+                    "cost": round(s.cost, 1),
+                    "alternatives": {k: round(v, 1) for k, v in s.alternatives.items()},
+                }
+                for s in self.steps
+            ],
+        }
+
+
+def _month_label(month: int) -> str:
+    year, m = divmod(month, 12)
+    return f"{year:04d}-{m + 1:02d}"
+
+
+def _costs(part: Any, cust_id: str | None, n: int, k: int, need: int, bounded: bool):
+    """
+    アクセスパスごとのコスト(触れる行数の見積もり)
+    n: この月の対象行数、k: 日付範囲内の行数、need: 先頭から必要な行数
+    """
+    if part.archived:
+        # 索引で対象ブロックだけ展開する。展開した行は範囲内の行とほぼ同数
+        return {SEGMENT_INDEX: float(k)}
+    index, scan = (
+        (CUSTOMER_INDEX, CUSTOMER_SCAN)
+        if cust_id is not None
+        else (DATE_INDEX, FULL_SCAN)
+    )
+    if not part.frozen:
+        # 登録順のリスト: 走査して絞り込み、範囲内の行を並べ替える
+        return {scan: n + k * math.log2(k + 1)}
+    probe = 2 * math.log2(n + 1) if bounded else 0.0
+    return {index: probe + need, scan: (n if bounded else 0) + need}
+
+
+def plan_search(
+    months: Sequence[int],
+    parts: Mapping[int, Any],
+    counter: DateCounter | None,
+    cust_id: str | None,
+    frm: date | None,
+    to: date | None,
+    start: int,
+    end: int,
+) -> QueryPlan:
+    """
+    日付別件数(統計)から各月の範囲内の件数を求め、読む月と読み方を決める
+    - 範囲内に行がない月、ページより前に収まる月はパーティションに触れない
+    - 読む月はアクセスパスのコストを比べて安いものを選ぶ
+    呼び出し側のロック内で使うこと
+    """
+    steps: List[PlanStep] = []
+    seen = 0
+    for month in reversed(months):
+        if seen >= end:
+            break
+        first, last = month_bounds(month)
+        lo = max(first, frm) if frm else first
+        hi = min(last, to) if to else last
+        k = counter.count(lo, hi) if counter else 0
+        if k == 0:
+            steps.append(PlanStep(month, SKIP_EMPTY, lo, hi, 0, 0, 0, 0.0, {}))
+            continue
+        if seen + k <= start:
+            steps.append(PlanStep(month, SKIP_OFFSET, lo, hi, k, k, 0, 0.0, {}))
+            seen += k
+            continue
+        offset = max(start - seen, 0)
+        limit = min(k - offset, end - seen - offset)
+        bounded = (lo, hi) != (first, last)
+        n = counter.count(first, last) if bounded else k
+        costs = _costs(parts[month], cust_id, n, k, offset + limit, bounded)
+        # 同じコストなら索引を使う
+        path = min(costs, key=lambda p: (costs[p], p not in _INDEX_PATHS))
+        steps.append(
+            PlanStep(month, path, lo, hi, k, offset, limit, costs[path], costs)
+        )
+        seen += k
+    return QueryPlan(cust_id, start, end, steps)
+
+
+def _desc_key(row: OrderSummaryRow) -> int:
+    return -row.order_date.toordinal()
+
+
+def date_slice(
+    rows: Sequence[OrderSummaryRow], frm: date, to: date
+) -> Sequence[OrderSummaryRow]:
+    """日付降順の行から frm <= 日付 <= to の範囲を二分探索で切り出す"""
+    lo = bisect.bisect_left(rows, -to.toordinal(), key=_desc_key)
+    hi = bisect.bisect_right(rows, -frm.toordinal(), lo=lo, key=_desc_key)
+    return rows[lo:hi]
+
+
+def read_step(part: Any, step: PlanStep, cust_id: str | None) -> List[OrderSummaryRow]:
+    """
+    ステップに従って1か月分の行を読む(日付降順)
+    メモリ上のパーティションは呼び出し側のロック内で、退避済みはロック外で使うこと
+    """
+    if step.path == SEGMENT_INDEX:
+        rows = date_slice(part.rows(cust_id, step.frm, step.to), step.frm, step.to)
+    elif step.path in _INDEX_PATHS:
+        rows = date_slice(part.rows(cust_id), step.frm, step.to)
+    else:
+        rows = [r for r in part.rows(cust_id) if step.frm <= r.order_date <= step.to]
+        if not part.frozen:
+            rows = sort_desc(rows)
+    return list(rows[step.offset : step.offset + step.limit])
@@ -0,0 +1,526 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from datetime import date
+from operator import itemgetter
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from ..core.memsize import head
+from ..ports import OrderSummaryRow
+from ..schemas import CustomerWithId, OrderCreateResponse, ProductWithId
+from .date_counter import DateCounter
+from .order_archive import Segment
+from .order_partition import OrderPartition, sort_desc
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+# ファイル末尾: メタ情報の位置(8byte) + メタ情報の長さ(4byte) + マジック(8byte)
+_FOOTER = struct.Struct("<QI8s")
+_MAGIC = b"MEMSNP01"
+# 索引の1エントリ: キーの位置・長さ + 値の位置・長さ
+_ENTRY = struct.Struct("<QIQI")
+
+TABLES = (
+    "customers",  # cust_id -> 顧客JSON
+    "emails",  # email(小文字) -> cust_id
+    "products",  # prod_id -> 商品JSON
+    "names",  # 正規化名 -> prod_id
+    "orders",  # order_id -> 注文の行
+    "months",  # 月キー -> その月の全行
+    "month_customers",  # 月キー:cust_id -> その月・その顧客の行
+    "counts",  # cust_id -> 日別件数JSON
+)
+
+
+def _month_key(month: int) -> str:
+    return f"{month:06d}"
+
+
+def encode_row(order_id: str, cust_id: str, body: bytes) -> bytes:
+    """注文の行 = order_id \\t cust_id \\t 注文JSON \\n"""
+    return b"%s\t%s\t%s\n" % (order_id.encode(), cust_id.encode(), body)
+
+
+def decode_row(line: bytes) -> Tuple[str, OrderCreateResponse]:
+    _, cust_id, body = line.split(b"\t", 2)
+    return cust_id.decode(), OrderCreateResponse.model_validate_json(body)
+
+
+def decode_summary(line: bytes) -> Tuple[str, OrderSummaryRow]:
+    """一覧の行だけが要るときは、モデルを検証せずに必要な項目だけ取り出す"""
+    _, cust_id, body = line.split(b"\t", 2)
+    o = json.loads(body)
+    return cust_id.decode(), OrderSummaryRow.build(
+        o["order_id"], date.fromisoformat(o["order_date"]), o["total_amount"]
+    )
+
+
+def encode_order(cust_id: str, o: OrderCreateResponse) -> bytes:
+    return encode_row(o.order_id, cust_id, o.model_dump_json().encode())
+
+
+def encode_days(days: Dict[int, int]) -> bytes:
+    return json.dumps(sorted(days.items()), separators=(",", ":")).encode()
+
+
+def merge_table(
+    current: Dict[str, V],
+    base: "SnapshotTable | None",
+    encode: Callable[[V], bytes],
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    書き出し用に、メモリ上の値(エンコードする)と、元のスナップショットにしかない値
+    (展開せずにそのまま書き写す)を合わせて返す
+    """
+    for key, value in current.items():
+        yield key, encode(value)
+    if base is not None:
+        for key, data in base.items():
+            if key not in current:
+                yield key, data
+
+
+def month_groups(
+    part,
+    orders: Dict[str, OrderCreateResponse],
+    base: "Snapshot | None",
+) -> Iterator[Tuple[str, List[bytes]]]:
+    """
+    書き出し用に、月の行を顧客ごとに (cust_id, [行, ...]) で返す
+    part はロック内で取った凍結済みコピー(SnapshotPartition か OrderPartition)か、
+    開き直した Segment
+    凍結済みコピーは一覧の行しか持たないので、注文全体は orders(ロック内で
+    取った書き込みモデルのコピー)か、元のスナップショットの行から取る
+    """
+    if isinstance(part, SnapshotPartition):
+        # スナップショット側の行はそのまま書き写し、差分のある顧客だけ日付順に混ぜる
+        delta = part.delta_by_customer()
+        for cust_id, lines in part.snapshot.month_lines(part.month):
+            rows = delta.pop(cust_id, None)
+            if rows:
+                keyed = [(decode_summary(line)[1], line) for line in lines]
+                keyed += [(r, encode_order(cust_id, orders[r.order_id])) for r in rows]
+                lines = [
+                    line for _, line in sorted(keyed, key=itemgetter(0), reverse=True)
+                ]
+            yield cust_id, lines
+        for cust_id, rows in delta.items():
+            yield cust_id, [encode_order(cust_id, orders[r.order_id]) for r in rows]
+        return
+    if isinstance(part, Segment):
+        try:
+            groups: Dict[str, List[OrderCreateResponse]] = {}
+            for cust_id, o in part.items():
+                groups.setdefault(cust_id, []).append(o)
+        finally:
+            part.close()
+        for cust_id, full in groups.items():
+            yield cust_id, [encode_order(cust_id, o) for o in full]
+        return
+    for cust_id, rows in part.by_customer():
+        lines = []
+        for row in rows:
+            o = orders.get(row.order_id)
+            if o is not None:
+                lines.append(encode_order(cust_id, o))
+            else:
+                lines.append(base.orders.get(row.order_id))
+        yield cust_id, lines
+
+
+class SnapshotState(NamedTuple):
+    """
+    スナップショットに書く内容(値はエンコード済みのバイト列)
+    months は (月, [(cust_id, [行, ...]), ...]) で、各顧客の行は日付降順
+    """
+
+    version: int
+    line_no: int
+    journal_offset: int
+    customers: Iterable[Tuple[str, bytes]]
+    emails: Iterable[Tuple[str, bytes]]
+    products: Iterable[Tuple[str, bytes]]
+    names: Iterable[Tuple[str, bytes]]
+    months: Iterable[Tuple[int, Iterable[Tuple[str, Iterable[bytes]]]]]
+    counts: Iterable[Tuple[str, bytes]]
+    counts_all: Dict[int, int]
+
+
+def write_snapshot(path: str, state: SnapshotState) -> None:
+    """
+    状態をスナップショットファイルに書き出す
+    - データ領域の後ろに、キーでソートした固定長エントリの索引を並べる
+      (読み込み時は mmap 上で二分探索するだけで、全体を展開しない)
+    - 月の行は顧客ごとにまとめて並べ、(月, 顧客) 単位で切り出せるようにする
+    - 一時ファイルに書いてから置き換えるので、途中で落ちても壊れない
+    """
+    entries: Dict[str, List[Tuple[bytes, int, int, int]]] = {t: [] for t in TABLES}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_MAGIC)
+
+        def put_key(table: str, key: str, val_off: int, val_len: int) -> None:
+            k = key.encode()
+            entries[table].append((k, f.tell(), val_off, val_len))
+            f.write(k)
+
+        def put(table: str, key: str, value: bytes) -> None:
+            val_off = f.tell()
+            f.write(value)
+            put_key(table, key, val_off, len(value))
+
+        months: List[List[int]] = []
+        for month, groups in state.months:
+            month_start = f.tell()
+            n = 0
+            spans: List[Tuple[str, int, int]] = []
+            for cust_id, lines in groups:
+                group_start = f.tell()
+                for line in lines:
+                    off = f.tell()
+                    f.write(line)
+                    # キーは行頭の order_id をそのまま指す
+                    oid = line[: line.index(b"\t")]
+                    entries["orders"].append((oid, off, off, len(line)))
+                    n += 1
+                if f.tell() > group_start:
+                    spans.append((cust_id, group_start, f.tell() - group_start))
+            month_len = f.tell() - month_start
+            # 月の行が連続するよう、キーは月の行の後ろにまとめて書く
+            for cust_id, start, length in spans:
+                put_key(
+                    "month_customers", f"{_month_key(month)}:{cust_id}", start, length
+                )
+            put_key("months", _month_key(month), month_start, month_len)
+            months.append([month, n])
+
+        for table in ("customers", "emails", "products", "names", "counts"):
+            for key, value in getattr(state, table):
+                put(table, key, value)
+
+        tables: Dict[str, List[int]] = {}
+        for table, rows in entries.items():
+            rows.sort()
+            tables[table] = [f.tell(), len(rows)]
+            f.write(b"".join(_ENTRY.pack(ko, len(k), vo, vl) for k, ko, vo, vl in rows))
+        meta = json.dumps(
+            {
+                "version": state.version,
+                "line_no": state.line_no,
+                "journal_offset": state.journal_offset,
+                "months": months,
+                "counts_all": sorted(state.counts_all.items()),
+                "tables": tables,
+            },
+            separators=(",", ":"),
+        ).encode()
+        meta_offset = f.tell()
+        f.write(meta)
+        f.write(_FOOTER.pack(meta_offset, len(meta), _MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class SnapshotTable:
+    """mmap 上のソート済み索引。キー → 値のバイト列を二分探索で引く"""
+
+    def __init__(self, mm: mmap.mmap, offset: int, count: int):
+        self._mm = mm
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._mm, self._offset + i * _ENTRY.size)
+
+    def _key(self, i: int) -> bytes:
+        ko, kl, _, _ = self._entry(i)
+        return self._mm[ko : ko + kl]
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, key: str) -> bytes | None:
+        k = key.encode()
+        i = self._lower_bound(k)
+        if i < self._count:
+            ko, kl, vo, vl = self._entry(i)
+            if self._mm[ko : ko + kl] == k:
+                return self._mm[vo : vo + vl]
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def items(self, prefix: str = "") -> Iterator[Tuple[str, bytes]]:
+        """キー順に (キー, 値) を返す。prefix を渡すとそのキーで始まるものだけ"""
+        p = prefix.encode()
+        for i in range(self._lower_bound(p), self._count):
+            ko, kl, vo, vl = self._entry(i)
+            k = self._mm[ko : ko + kl]
+            if not k.startswith(p):
+                return
+            yield k.decode(), self._mm[vo : vo + vl]
+
+
+class Snapshot:
+    """
+    スナップショットファイルを mmap で開いた読み取り専用ビュー
+    開くときに読むのはメタ情報だけで、エンティティはアクセスのたびに展開する
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        meta_offset, meta_len, magic = _FOOTER.unpack(self._mm[-_FOOTER.size :])
+        if magic != _MAGIC or self._mm[: len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"not a snapshot: {path}")
+        meta = json.loads(self._mm[meta_offset : meta_offset + meta_len])
+        self.version: int = meta["version"]
+        self.line_no: int = meta["line_no"]
+        self.journal_offset: int = meta["journal_offset"]
+        self.month_sizes: Dict[int, int] = {m: n for m, n in meta["months"]}
+        self.counts_all: Dict[int, int] = {o: n for o, n in meta["counts_all"]}
+        tables = meta["tables"]
+
+        def table(name: str) -> SnapshotTable:
+            offset, count = tables[name]
+            return SnapshotTable(self._mm, offset, count)
+
+        self.customers = table("customers")
+        self.emails = table("emails")
+        self.products = table("products")
+        self.names = table("names")
+        self.orders = table("orders")
+        self.months = table("months")
+        self.month_customers = table("month_customers")
+        self.counts = table("counts")
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def customer(self, cust_id: str) -> CustomerWithId | None:
+        data = self.customers.get(cust_id)
+        return None if data is None else CustomerWithId.model_validate_json(data)
+
+    def product(self, prod_id: str) -> ProductWithId | None:
+        data = self.products.get(prod_id)
+        return None if data is None else ProductWithId.model_validate_json(data)
+
+    def order(self, order_id: str) -> OrderCreateResponse | None:
+        line = self.orders.get(order_id)
+        return None if line is None else decode_row(line)[1]
+
+    def counter(self, cust_id: str) -> DateCounter | None:
+        data = self.counts.get(cust_id)
+        if data is None:
+            return None
+        return DateCounter.from_days({o: n for o, n in json.loads(data)})
+
+    def month_lines(self, month: int) -> Iterator[Tuple[str, List[bytes]]]:
+        """月の行を (cust_id, 行) の組で返す(展開せずにそのまま書き写す用)"""
+        prefix = _month_key(month) + ":"
+        for key, blob in self.month_customers.items(prefix):
+            yield key[len(prefix) :], blob.splitlines(keepends=True)
+
+    def _month_blob(self, month: int, cust_id: str | None) -> bytes | None:
+        if cust_id is None:
+            return self.months.get(_month_key(month))
+        return self.month_customers.get(f"{_month_key(month)}:{cust_id}")
+
+    def month_rows(
+        self, month: int, cust_id: str | None
+    ) -> List[Tuple[str, OrderCreateResponse]]:
+        """月の注文を展開する。cust_id を渡すとその顧客の注文だけ(日付降順)"""
+        blob = self._month_blob(month, cust_id)
+        return [decode_row(line) for line in blob.splitlines()] if blob else []
+
+    def month_summaries(
+        self, month: int, cust_id: str | None
+    ) -> List[Tuple[str, OrderSummaryRow]]:
+        """month_rows の一覧の行版"""
+        blob = self._month_blob(month, cust_id)
+        return [decode_summary(line) for line in blob.splitlines()] if blob else []
+
+
+class SnapshotPartition:
+    """
+    スナップショット上の月パーティションと、読み込み後に来た書き込み(差分)
+    - スナップショット側は顧客ごと・全体ごとに、初めて読まれたときに展開して
+      キャッシュする。読み取り専用の mmap から読むだけなので load() はロック外で
+      呼んでよい
+    - 書き込みは差分の OrderPartition に足すだけで、月全体は展開しない
+    - rows() は両方を日付降順に合わせた行を返す(差分が変わるまでキャッシュする)
+    """
+
+    archived = False
+    frozen = True
+
+    def __init__(self, snapshot: Snapshot, month: int):
+        self.snapshot = snapshot
+        self.month = month
+        self.writes = 0
+        self._delta = OrderPartition(month)
+        self._base_all: Tuple[OrderSummaryRow, ...] | None = None
+        self._base_by_custid: Dict[str, Tuple[OrderSummaryRow, ...]] = {}
+        self._all: Tuple[OrderSummaryRow, ...] | None = None
+        self._by_custid: Dict[str, Tuple[OrderSummaryRow, ...]] = {}
+
+    def __len__(self) -> int:
+        return self.snapshot.month_sizes.get(self.month, 0) + len(self._delta)
+
+    def add(self, row: OrderSummaryRow, cust_id: str) -> None:
+        self.writes += 1
+        self._delta.add(row, cust_id)
+        self._all = None
+        self._by_custid.pop(cust_id, None)
+
+    def loaded(self, cust_id: str | None) -> bool:
+        """スナップショット側の行(cust_id が None なら全体)を展開済みか"""
+        if cust_id is None:
+            return self._base_all is not None
+        return cust_id in self._base_by_custid
+
+    def load(self, cust_id: str | None) -> Tuple[OrderSummaryRow, ...]:
+        """スナップショット側の行を日付降順で展開する(ロック外で呼んでよい)"""
+        if cust_id is None:
+            rows = self._base_all
+            if rows is None:
+                summaries = self.snapshot.month_summaries(self.month, None)
+                rows = self._base_all = tuple(sort_desc([r for _, r in summaries]))
+            return rows
+        rows = self._base_by_custid.get(cust_id)
+        if rows is None:
+            rows = self._base_by_custid[cust_id] = tuple(
+                r for _, r in self.snapshot.month_summaries(self.month, cust_id)
+            )
+        return rows
+
+    def rows(self, cust_id: str | None) -> Tuple[OrderSummaryRow, ...]:
+        """一覧の行を日付降順で返す。呼び出し側のロック内で使うこと"""
+        rows = self._all if cust_id is None else self._by_custid.get(cust_id)
+        if rows is None:
+            rows = self.load(cust_id)
+            delta = self._delta.rows(cust_id)
+            if delta:
+                # どちらも日付降順なので、並べ替えは2つの列の併合で済む
+                rows = tuple(sort_desc([*rows, *delta]))
+            if cust_id is None:
+                self._all = rows
+            else:
+                self._by_custid[cust_id] = rows
+        return rows
+
+    def freeze(self) -> None:
+        self._delta.freeze()
+
+    def frozen_copy(self) -> "SnapshotPartition":
+        """
+        現時点の差分を凍結したコピー(呼び出し側のロック内で使うこと)
+        スナップショット側の展開済みの行は共有する
+        """
+        copy = SnapshotPartition(self.snapshot, self.month)
+        copy.writes = self.writes
+        copy._delta = self._delta.frozen_copy()
+        copy._base_all = self._base_all
+        copy._base_by_custid = self._base_by_custid
+        return copy
+
+    def memory_sample(self, sample: int) -> Tuple[Tuple, Tuple]:
+        """展開済みの分と差分の、OrderPartition.memory_sample と同じ形の見本"""
+        delta_rows, delta_index = self._delta.memory_sample(sample)
+        if self._all is None and self._base_all is None:
+            return delta_rows, delta_index
+        # 合わせた行があれば差分を含む。スナップショット側だけなら差分を足す
+        rows = self._all if self._all is not None else self._base_all
+        n = len(rows) if self._all is not None else len(rows) + delta_rows[1]
+        index = self._by_custid or self._base_by_custid
+        return (
+            (rows, n, head(rows, sample)),
+            (index, len(index), head(index.items(), sample)),
+        )
+
+    def delta_items(self) -> List[Tuple[str, OrderSummaryRow]]:
+        """差分の (cust_id, 一覧の行) を日付降順で返す。呼び出し側のロック内で使うこと"""
+        return self._delta.items()
+
+    def delta_by_customer(self) -> Dict[str, Sequence[OrderSummaryRow]]:
+        """差分の顧客別の行(日付降順)。凍結済みコピーで使うこと"""
+        return dict(self._delta.by_customer())
+
+    def orders(
+        self, delta: List[Tuple[str, OrderCreateResponse]]
+    ) -> List[Tuple[str, OrderCreateResponse]]:
+        """
+        (cust_id, 注文全体) を日付降順で返す(セグメントへの退避用)
+        スナップショット側は mmap から展開するのでロック外で呼んでよい
+        delta はロック内で取った差分の注文全体
+        """
+        return sorted(
+            [*self.snapshot.month_rows(self.month, None), *delta],
+            key=lambda r: (r[1].order_date, r[1].order_id),
+            reverse=True,
+        )
+
+
+class Snapshotter:
+    """一定間隔でストアのスナップショットを書き出すバックグラウンドスレッド"""
+
+    def __init__(self, store, path: str, *, interval_seconds: float):
+        self._store = store
+        self._path = path
+        self._interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_once(self) -> None:
+        self._store.save_snapshot(self._path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("snapshot failed")
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="snapshotter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """止めるときに最後のスナップショットを書き、次回の起動を速くする"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.run_once()
+        except Exception:
+            logger.exception("snapshot failed")
@@ -0,0 +1,50 @@
+"""
+リポジトリ呼び出しをスパンとして記録する UoW のラッパ
+
+記録するリクエストでだけ get_uow が包む(記録しないリクエストは素の UoW の
+ままなので、呼び出しごとの手間は増えない)。スパン名は "orders.search" のように
+リポジトリ名.メソッド名
+"""
+
+from typing import Any, Callable
+
+from ..core.tracing import span
+from ..ports import UoW
+
+
+def _traced_call(name: str, fn: Callable) -> Callable:
+    def call(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+
+    return call
+
+
+class _TracedRepo:
+    __slots__ = ("_repo", "_name")
+
+    def __init__(self, repo: Any, name: str):
+        self._repo = repo
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._repo, attr)
+        if attr.startswith("_") or not callable(value):
+            return value
+        return _traced_call(f"{self._name}.{attr}", value)
+
+
+class TracedUoW:
+    def __init__(self, uow: UoW):
+        self.inner = uow
+        self.customers = _TracedRepo(uow.customers, "customers")
+        self.products = _TracedRepo(uow.products, "products")
+        self.orders = _TracedRepo(uow.orders, "orders")
+
+    def commit(self) -> None:
+        with span("uow.commit"):
+            self.inner.commit()
+
+    def rollback(self) -> None:
+        with span("uow.rollback"):
+            self.inner.rollback()
@@ -4,13 +4,18 @@ import hmac
 import logging
 import os
 import secrets
-import threading
 from datetime import datetime, timedelta, timezone
 from functools import lru_cache
 from typing import Dict, Optional, Set, Tuple
 
 from fastapi import Header, HTTPException, Request, status
 
+from .locks import make_lock
+from .memsize import estimate, head
+from .metrics import AUTH_FAILURES, IP_BLOCKS
+from .timing import timed
+from .tracing import traced
+
 API_KEY_ENV = "API_KEY"
 API_KEYS_ENV = "API_KEYS"  # カンマ区切りで複数キーをサポート
 HASH_KEY_ENV = "API_KEY_HASH_SECRET"
@@ -33,7 +38,7 @@ BLOCK_DURATION_MINUTES = 15  # 15分間ブロック
 FAILED_ATTEMPTS_WINDOW_MINUTES = 5  # 5分以内の失敗をカウントする
 
 # APIキーと顧客IDのマッピング(動的に更新される)
-_lock_auth = threading.RLock()
+_lock_auth = make_lock("auth")
 _api_key_to_customer: Dict[str, Optional[str]] = {}
 _admin_api_keys = {"admin-api-key", "test-secret"}  # 管理者キーのセット
 
@@ -163,6 +168,32 @@ def _compute_key_hash(key: str) -> str:
     return base64.b64encode(mac.digest()).decode("utf-8")[:16]
 
 
+def memory_usage(sample: int) -> Dict[str, Dict[str, int]]:
+    """認証まわりのテーブルの {件数, 見積もりバイト数}"""
+    with _lock_auth:
+        keys = head(_api_key_to_customer.items(), sample)
+        n_keys = len(_api_key_to_customer)
+    return {
+        "auth.api_key_to_customer": estimate(_api_key_to_customer, n_keys, keys),
+        "auth.failed_attempts": estimate(
+            _failed_attempts,
+            len(_failed_attempts),
+            head(_failed_attempts.items(), sample),
+        ),
+        "auth.blocked_ips": estimate(
+            _blocked_ips, len(_blocked_ips), head(_blocked_ips.items(), sample)
+        ),
+    }
+
+
+def api_key_hash(key: str) -> Optional[str]:
+    """ログ・診断用のキー識別子(ハッシュ用の秘密がまだ読み込まれていなければ None)"""
+    try:
+        return _compute_key_hash(key)
+    except RuntimeError:
+        return None
+
+
 def is_ip_blocked(client_ip: str) -> bool:
     """IPアドレスがブロックされているか確認"""
     if client_ip in _blocked_ips:
@@ -198,6 +229,7 @@ def record_failed_attempt(client_ip: str):
     if count >= MAX_FAILED_ATTEMPTS:
         block_until = now + timedelta(minutes=BLOCK_DURATION_MINUTES)
         _blocked_ips[client_ip] = block_until
+        IP_BLOCKS.inc()
         logger.warning(
             "IP blocked due to excessive failed attempts",
             extra={
@@ -214,6 +246,8 @@ def reset_failed_attempts(client_ip: str):
         del _failed_attempts[client_ip]
 
 
+@traced("require_api_key")
+@timed("auth")
 async def require_api_key(
     request: Request,
     x_api_key: str | None = Header(default=None, alias="X-API-KEY"),
@@ -226,6 +260,7 @@ async def require_api_key(
 
     # IPブロックチェック
     if is_ip_blocked(client_ip):
+        AUTH_FAILURES.inc(("ip_blocked",))
         logger.warning(
             "Blocked IP attempted access",
             extra={
@@ -240,6 +275,7 @@ async def require_api_key(
         )
 
     if not x_api_key:
+        AUTH_FAILURES.inc(("missing_header",))
         record_failed_attempt(client_ip)
         logger.warning(
             "Authentication failed - missing API key",
@@ -260,6 +296,7 @@ async def require_api_key(
     if not any(
         secrets.compare_digest(x_api_key, valid_key) for valid_key in _VALID_API_KEYS
     ):
+        AUTH_FAILURES.inc(("invalid_key",))
         record_failed_attempt(client_ip)
         logger.warning(
             "Authentication failed - invalid API key",
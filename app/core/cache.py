@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LruTtlCache(Generic[V]):
+    """
+    LRU + TTL のスレッドセーフなキャッシュ
+    - max_entries / max_bytes のどちらかを超えたら古いものから追い出す
+    - 値のサイズは sizeof で計算（bytes ならその長さ）
+    - version を一緒に保存し、取得時に一致しなければミス扱いで破棄する
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl_seconds: float = 30.0,
+        enabled: bool = True,
+        sizeof: Callable[[V], int] = len,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._sizeof = sizeof
+        self._clock = clock
+        # key -> (version, expires_at, value, size)
+        self._data: "OrderedDict[Hashable, Tuple[int, float, V, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, version: int = 0) -> Optional[V]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry_version, expires_at, value, _ = entry
+            if entry_version != version or expires_at <= self._clock():
+                # 書き込みで古くなった or 期限切れ
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V, version: int = 0) -> None:
+        if not self.enabled:
+            return
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return  # 1件で上限を超えるものはキャッシュしない
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (version, self._clock() + self.ttl_seconds, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> Dict[str, int | bool]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
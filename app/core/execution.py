@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class ExecutionPolicy:
+    """
+    ブロッキング処理をどこで実行するかを決める
+    - 軽い処理(heavy=False): イベントループ上でそのまま実行
+    - 重い処理(heavy=True): 上限付きのスレッドプールで実行し、
+      イベントループを止めない。待ち行列の深さを stats() で公開する
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="heavy"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.peak_queued = 0
+
+    async def run(
+        self, fn: Callable[..., T], *args: Any, heavy: bool, **kwargs: Any
+    ) -> T:
+        if not heavy:
+            return fn(*args, **kwargs)
+        return await self.run_heavy(fn, *args, **kwargs)
+
+    async def run_heavy(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        # 呼び出し元の contextvar(リクエストのフェーズ計測など)を引き継ぐ
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+        def task() -> T:
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return call()
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+
+        with self._lock:
+            self._queued += 1
+            self.submitted += 1
+            self.peak_queued = max(self.peak_queued, self._queued)
+        future = self._executor.submit(task)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future: Future) -> None:
+        # 開始前にキャンセルされた(呼び出し元が切断した)分を待ち行列から外す
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def queue_depth(self) -> int:
+        """プールの空き待ちの件数"""
+        with self._lock:
+            return self._queued
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "peak_queued": self.peak_queued,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Tuple
+
+from .cache import LruTtlCache
+from .errors import BadRequest, Conflict
+
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse(NamedTuple):
+    """保存するレスポンス(シリアライズ済み)"""
+
+    status_code: int
+    body: bytes
+    headers: Tuple[Tuple[str, str], ...] = ()
+    fingerprint: str = ""
+
+
+def fingerprint(*parts: str) -> str:
+    """リクエスト内容の指紋(同じキーで別の内容が来たことを検出する)"""
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def scope_of(api_key: str | None) -> str:
+    """APIキーそのものは保持せず、ハッシュでスコープを分ける"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key ごとに成功レスポンスを保持し、再送にはそのバイト列を返す
+    - キーは (APIキーのスコープ, Idempotency-Key)
+    - 同じキーの同時リクエストは、最初の実行の完了を待ってその結果を返す
+    - 保存するのは 2xx だけ。失敗したら待っていた側が改めて実行する
+    - 同じキーで別の内容が来たら 409
+    - 実行中の管理はイベントループ上で行う(スレッドからは呼ばないこと)
+    """
+
+    def __init__(self, cache: LruTtlCache[StoredResponse]):
+        self._cache = cache
+        self._in_flight: Dict[Hashable, asyncio.Event] = {}
+        self.executions = 0
+        self.replays = 0
+        self.waits = 0
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        fingerprint: str,
+        execute: Callable[[], Awaitable[StoredResponse]],
+    ) -> Tuple[StoredResponse, bool]:
+        """(レスポンス, 再送への応答か) を返す"""
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            raise BadRequest(
+                "IDEMPOTENCY_KEY_INVALID",
+                f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters",
+            )
+        cache_key = (scope, key)
+        while True:
+            stored = self._cache.get(cache_key)
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    raise Conflict(
+                        "IDEMPOTENCY_KEY_REUSED",
+                        "Idempotency-Key was already used for a different request",
+                    )
+                self.replays += 1
+                return stored, True
+            event = self._in_flight.get(cache_key)
+            if event is None:
+                break
+            self.waits += 1
+            await event.wait()
+
+        event = self._in_flight[cache_key] = asyncio.Event()
+        self.executions += 1
+        try:
+            stored = (await execute())._replace(fingerprint=fingerprint)
+            if 200 <= stored.status_code < 300:
+                self._cache.put(cache_key, stored)
+            return stored, False
+        finally:
+            del self._in_flight[cache_key]
+            event.set()
+
+    def stats(self) -> Dict[str, int | bool]:
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "replays": self.replays,
+            "waits": self.waits,
+            **{f"cache_{k}": v for k, v in self._cache.stats().items()},
+        }
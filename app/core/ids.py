@@ -0,0 +1,64 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+# ID の数値部 = (EPOCH からのミリ秒 << SEQ_BITS) | ミリ秒内の連番
+SEQ_BITS = 20
+EPOCH_MS = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+DEFAULT_BLOCK_SIZE = 256
+
+
+class IdAllocator:
+    """
+    時刻順に並ぶ一意なIDを払い出す(存在チェック不要)
+    - 共有カウンタから BLOCK_SIZE 個ずつスレッドごとに予約し、
+      ブロック内はロックなしで払い出す
+    - ミリ秒が進んだら古いブロックは捨てて予約し直すので、
+      IDの大小はほぼ採番時刻の順になる
+    - カウンタは現在時刻より小さくならないため、再起動後も過去のIDと重ならない
+      (時計が巻き戻らない前提)
+    """
+
+    def __init__(
+        self,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._block_size = block_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+        self._local = threading.local()
+
+    def _floor(self) -> int:
+        return (int(self._clock() * 1000) - EPOCH_MS) << SEQ_BITS
+
+    def _reserve(self, floor: int) -> int:
+        with self._lock:
+            start = max(self._next, floor)
+            self._next = start + self._block_size
+            return start
+
+    def next_value(self) -> int:
+        local = self._local
+        cur = getattr(local, "cur", 0)
+        end = getattr(local, "end", 0)
+        floor = self._floor()
+        if cur >= end or floor >= end:
+            cur = self._reserve(floor)
+            end = cur + self._block_size
+            local.end = end
+        local.cur = cur + 1
+        return cur
+
+    def new_id(self, prefix: str) -> str:
+        """例: new_id("O") -> "O_0001a2b3c4d5e6f7" (16桁の16進で辞書順 = 時刻順)"""
+        return f"{prefix}_{self.next_value():016x}"
+
+
+_allocator = IdAllocator()
+
+
+def new_id(prefix: str) -> str:
+    return _allocator.new_id(prefix)
@@ -0,0 +1,127 @@
+"""
+データ構造のメモリ使用量の見積もり
+
+全要素をたどると大きなストアでは止まってしまうので、先頭から sample 件だけ
+深いサイズを測り、平均 × 件数 + 入れ物自体のサイズで見積もる
+(要素のサイズが偏っていると誤差が出る。桁を掴むための値)
+見本はロック内で islice して取り、サイズの計算はロック外で行う
+"""
+
+import itertools
+import sys
+from datetime import date
+from typing import Callable, Dict, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_SAMPLE = 256
+
+# 中身をたどらない型
+_ATOMIC = (str, bytes, int, float, complex, date, range)
+# インタプリタ全体で共有されるので数えない
+_SHARED = (type(None), bool, type, type(len))
+_SHARED_TYPES = frozenset(_SHARED)
+# 要素がこれより多い入れ物は、中身も先頭のこの件数から見積もる
+INNER_SAMPLE = 64
+_getsizeof = sys.getsizeof
+
+
+def _number_sizeof(v) -> int:
+    """int / float(キャッシュされた小さい int は共有なので数えない)"""
+    if type(v) is int and -5 <= v <= 256:
+        return 0
+    return _getsizeof(v)
+
+
+def _scale(measured: int, n: int) -> int:
+    """先頭 INNER_SAMPLE 件で測った分を n 件ぶんに伸ばす"""
+    return measured if n <= INNER_SAMPLE else measured * n // INNER_SAMPLE
+
+
+def deep_sizeof(obj, seen: set | None = None) -> int:
+    """
+    obj とそこから辿れるオブジェクトの sys.getsizeof の合計
+    seen に入っているもの(同じ見本の中で既に数えたもの)は数えない
+    数値は共有されることが少ないので seen を使わずに数える
+    要素が INNER_SAMPLE より多い入れ物は、先頭の INNER_SAMPLE 件から中身を見積もる
+    (件数カウンタの配列のような長い入れ物でも1オブジェクトあたりの手間を抑える)
+    """
+    if seen is None:
+        seen = set()
+    t = type(obj)
+    if t is int or t is float:
+        return _number_sizeof(obj)
+    if t in _SHARED_TYPES or isinstance(obj, _SHARED) or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = _getsizeof(obj)
+    if isinstance(obj, _ATOMIC):
+        return size
+    if isinstance(obj, dict):
+        inner = 0
+        for k, v in itertools.islice(obj.items(), INNER_SAMPLE):
+            inner += deep_sizeof(k, seen) + deep_sizeof(v, seen)
+        return size + _scale(inner, len(obj))
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        inner = 0
+        for v in itertools.islice(obj, INNER_SAMPLE):
+            tv = type(v)
+            if tv is int or tv is float:
+                inner += _number_sizeof(v)
+            else:
+                inner += deep_sizeof(v, seen)
+        return size + _scale(inner, len(obj))
+    attrs = getattr(obj, "__dict__", None)
+    if attrs is not None:
+        size += deep_sizeof(attrs, seen)
+    for cls in t.__mro__:
+        for slot in cls.__dict__.get("__slots__", ()):
+            if slot not in ("__dict__", "__weakref__"):
+                size += deep_sizeof(getattr(obj, slot, None), seen)
+    return size
+
+
+def head(items: Iterable[T], sample: int) -> List[T]:
+    """
+    見本として先頭から sample 件(ロックのある構造はロック内で呼ぶ)
+    ロックのない dict が途中で変わったら、そこまでに取れた分を返す
+    """
+    out: List[T] = []
+    try:
+        for item in itertools.islice(items, sample):
+            out.append(item)
+    except RuntimeError:
+        pass
+    return out
+
+
+def pair_sizeof(item, seen: set) -> int:
+    """dict の (キー, 値)。items() が作る一時的なタプル自体は数えない"""
+    key, value = item
+    return deep_sizeof(key, seen) + deep_sizeof(value, seen)
+
+
+def estimate(
+    container: object,
+    entries: int,
+    sample: List[T],
+    sizeof: Callable[[T, set], int] | None = None,
+) -> Dict[str, int]:
+    """
+    {"entries": 件数, "bytes": 見積もり}
+    sizeof(要素, seen) は要素1件のサイズ(既定は深いサイズ。dict なら pair_sizeof)
+    """
+    if sizeof is None:
+        sizeof = pair_sizeof if isinstance(container, dict) else deep_sizeof
+    size = sys.getsizeof(container)
+    if sample:
+        seen: set = set()
+        per_entry = sum(sizeof(item, seen) for item in sample) / len(sample)
+        size += int(per_entry * entries)
+    return {"entries": entries, "bytes": size}
+
+
+def shallow_items(item, seen: set) -> int:
+    """(キー, 列) の組で、列の中身は数えない(他の構造と共有している参照の索引用)"""
+    key, seq = item
+    return deep_sizeof(key, seen) + sys.getsizeof(seq)
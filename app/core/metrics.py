@@ -0,0 +1,318 @@
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+# (系列名, ラベル名, ラベル値, 値)
+Sample = Tuple[str, Tuple[str, ...], Labels, float]
+
+# 既定のバケット(秒)。API の応答はほぼミリ秒単位なので細かめに取る
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+class _Shards:
+    """
+    スレッドごとの値(dict)。記録は自スレッドの dict を書くだけでロックを取らない
+    集計時に全スレッドの dict を合算する(dict のコピーは GIL の下で一括で行われる)
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self._lock = threading.Lock()
+        self._all: List[dict] = []
+
+    def mine(self) -> dict:
+        """自スレッドの dict(記録側は self.local.values を直接読み、初回だけここへ来る)"""
+        try:
+            return self.local.values
+        except AttributeError:
+            values = self.local.values = {}
+            with self._lock:
+                self._all.append(values)
+            return values
+
+    def copies(self) -> List[dict]:
+        with self._lock:
+            shards = list(self._all)
+        return [s.copy() for s in shards]
+
+    def clear(self) -> None:
+        with self._lock:
+            for s in self._all:
+                s.clear()
+
+
+class Counter:
+    """単調増加のカウンタ(kind="gauge" なら増減する値)"""
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), kind="counter"
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        self._shards = _Shards()
+        self._local = self._shards.local
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._shards.mine()
+        values[labels] = values.get(labels, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        total: Dict[Labels, float] = {}
+        for shard in self._shards.copies():
+            for labels, v in shard.items():
+                total[labels] = total.get(labels, 0) + v
+        return total
+
+    def samples(self) -> List[Sample]:
+        return [
+            (self.name, self.labelnames, labels, v)
+            for labels, v in sorted(self.values().items())
+        ]
+
+    def clear(self) -> None:
+        self._shards.clear()
+
+
+class Histogram:
+    """
+    バケット別の件数と合計。スレッドごとに [各バケットの件数..., +Inf, 合計] を持つ
+    (バケットは累積せずに数え、出力時に累積する)
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _Shards()
+        self._local = self._shards.local
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._shards.mine()
+        row = values.get(labels)
+        if row is None:
+            row = values[labels] = [0] * (len(self.buckets) + 2)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def values(self) -> Dict[Labels, List[float]]:
+        total: Dict[Labels, List[float]] = {}
+        for shard in self._shards.copies():
+            for labels, row in shard.items():
+                acc = total.get(labels)
+                if acc is None:
+                    total[labels] = list(row)
+                else:
+                    for i, v in enumerate(row):
+                        acc[i] += v
+        return total
+
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        names = self.labelnames
+        for labels, row in sorted(self.values().items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), row):
+                cumulative += n
+                out.append(
+                    (
+                        f"{self.name}_bucket",
+                        (*names, "le"),
+                        (*labels, _number(bound)),
+                        cumulative,
+                    )
+                )
+            out.append((f"{self.name}_sum", names, labels, row[-1]))
+            out.append((f"{self.name}_count", names, labels, cumulative))
+        return out
+
+    def clear(self) -> None:
+        self._shards.clear()
+
+
+class GaugeFunc:
+    """集計時に関数を呼んで値を得るゲージ(サイズなど、記録側に手を入れない値用)"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Dict[Labels, float]],
+        labelnames: Sequence[str] = (),
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._fn = fn
+
+    def samples(self) -> List[Sample]:
+        return [
+            (self.name, self.labelnames, labels, v)
+            for labels, v in sorted(self._fn().items())
+        ]
+
+    def clear(self) -> None:
+        pass
+
+
+def _number(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    """メトリクスの登録先。render() で Prometheus のテキスト形式を返す"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Counter | Histogram | GaugeFunc] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # 同名は置き換える(再読み込み・テストで登録し直しても重複しない)
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        """増減するゲージ(inc に負の値を渡して減らす)"""
+        return self.register(Counter(name, help, labelnames, kind="gauge"))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_func(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Dict[Labels, float]],
+        labelnames: Sequence[str] = (),
+    ) -> GaugeFunc:
+        return self.register(GaugeFunc(name, help, fn, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, names, labels, value in m.samples():
+                if labels:
+                    pairs = ",".join(
+                        f'{k}="{_escape(str(v))}"' for k, v in zip(names, labels)
+                    )
+                    lines.append(f"{name}{{{pairs}}} {_number(value)}")
+                else:
+                    lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """記録した値を消す(テスト用)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for m in metrics:
+            m.clear()
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, method and status",
+    ("method", "route", "status"),
+)
+IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests being processed")
+RATE_LIMITED = REGISTRY.counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter", ("route",)
+)
+AUTH_FAILURES = REGISTRY.counter(
+    "auth_failures_total", "Failed API key authentications", ("reason",)
+)
+IP_BLOCKS = REGISTRY.counter(
+    "auth_ip_blocks_total", "Client IPs blocked after repeated auth failures"
+)
+
+
+class MetricsMiddleware:
+    """
+    リクエストの処理時間を (メソッド, ルートのテンプレート, ステータス) 別に記録する
+    ルートはルーティング後に scope["route"] から取る(パスそのままだと ID ごとに
+    系列が増えるため)。どのルートにも当たらなければ "unmatched"
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.inc(amount=-1)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, (scope["method"], path, str(status)))
@@ -0,0 +1,104 @@
+"""
+稼働中のプロセスを外から覗くサンプリングプロファイラ
+
+一定間隔で sys._current_frames() から全スレッドのスタックを取り、
+"スレッド名;外側の関数;...;内側の関数 件数" の collapsed 形式(flamegraph.pl /
+speedscope にそのまま渡せる)に集計する
+- 計測中もアプリは止めない(覗くのはフレームの参照だけ)
+- 同時に1セッションまで。異なるスタックの数と深さに上限を持つ
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+# 上限を超えた新しいスタックはここにまとめる(件数の合計は保つ)
+TRUNCATED = "(truncated)"
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class Profile(NamedTuple):
+    seconds: float
+    samples: int  # サンプリングした回数
+    stacks: Dict[str, int]  # collapsed スタック -> 件数
+    dropped: int  # 上限のため TRUNCATED にまとめた件数
+
+    def collapsed(self) -> str:
+        lines = [
+            f"{stack} {n}"
+            for stack, n in sorted(self.stacks.items(), key=lambda kv: -kv[1])
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+def _label(code) -> str:
+    name = f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+class SamplingProfiler:
+    def __init__(
+        self,
+        interval_seconds: float = 0.005,
+        max_stacks: int = 10_000,
+        max_depth: int = 64,
+    ):
+        self.interval_seconds = interval_seconds
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self._busy = threading.Lock()
+
+    def profile(self, seconds: float) -> Profile:
+        """
+        seconds 秒のあいだ呼び出したスレッドでサンプリングする(そのスレッド自身は除く)
+        実行中のセッションがあれば ProfilerBusy
+        """
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return self._run(seconds)
+        finally:
+            self._busy.release()
+
+    def _run(self, seconds: float) -> Profile:
+        me = threading.get_ident()
+        stacks: Dict[str, int] = {}
+        labels: Dict[object, str] = {}  # code -> ラベル(同じ関数は何度も出る)
+        samples = dropped = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts: List[str] = []
+                while frame is not None and len(parts) < self.max_depth:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _label(code)
+                    parts.append(label)
+                    frame = frame.f_back
+                if frame is not None:
+                    parts.append(TRUNCATED)
+                parts.append(names.get(ident, f"thread-{ident}"))
+                stack = ";".join(reversed(parts))
+                if stack not in stacks and len(stacks) >= self.max_stacks:
+                    stack = TRUNCATED
+                    dropped += 1
+                stacks[stack] = stacks.get(stack, 0) + 1
+            frame = None  # フレームへの参照を残さない
+            samples += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(self.interval_seconds, deadline - now))
+        return Profile(
+            round(time.perf_counter() - started, 3), samples, stacks, dropped
+        )
@@ -0,0 +1,50 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    同一キーの同時実行をまとめる（Go の singleflight 相当）
+    - 最初の呼び出しだけが fn() を実行し、実行中に来た同じキーの呼び出しは
+      その完了を待って同じ結果(または例外)を受け取る
+    - 待つのはイベントループ上の Future なので、待つ側はスレッドもプールの枠も
+      使わない(fn の中でプールへ出すのはリーダーの1件だけ)
+    - 実行は呼び出し元とは別のタスクなので、呼び出し元が切断しても他の待ち手には
+      結果が届く
+    - 完了後はキーを忘れるので、結果のキャッシュはしない
+    - イベントループ上で使うこと(スレッドからは呼ばない)
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is not None:
+            self.shared += 1
+        else:
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda done: self._forget(key, done))
+            self.executions += 1
+        return await asyncio.shield(call)
+
+    def _forget(self, key: Hashable, call: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # 待ち手が全員いなくなっていても「未取得の例外」の警告を出さない
+            call.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "shared": self.shared,
+        }
@@ -0,0 +1,188 @@
+"""
+遅いリクエストの自動記録
+
+処理時間がしきい値を超えたリクエストを、固定長のリングバッファに残す
+- ルート(テンプレート)・パス・ステータス・処理時間・フェーズ別の時間
+- パラメータ(パス・クエリ。秘密らしい名前は除き、値は切り詰める)
+- API キーはハッシュだけ(生のキーは残さない)
+- 任意で決定的プロファイル(cProfile)の上位関数
+
+監視対象は sample_rate の割合だけ(判定はリクエストの開始時に1回)
+プロファイルは profile_rate の割合で、同時に1リクエストだけ取る。cProfile は
+スレッド単位なので、同じイベントループで並行して動いた処理も含まれ、
+スレッドプールで動いた部分は含まれない
+"""
+
+import cProfile
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from .auth import api_key_hash
+from .timing import current_phases
+
+# 値を残さないパラメータ名(小文字で比較)
+SENSITIVE_PARAMS = {"api_key", "apikey", "key", "token", "password", "secret"}
+MAX_PARAMS = 20
+MAX_VALUE_CHARS = 100
+PROFILE_TOP = 20
+
+
+def sanitize_params(scope) -> Dict[str, str]:
+    params: Dict[str, str] = {}
+    for name, value in scope.get("path_params", {}).items():
+        params[name] = str(value)[:MAX_VALUE_CHARS]
+    query = scope.get("query_string", b"").decode("latin-1")
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        if len(params) >= MAX_PARAMS:
+            break
+        params[name] = (
+            "[redacted]"
+            if name.lower() in SENSITIVE_PARAMS
+            else value[:MAX_VALUE_CHARS]
+        )
+    return params
+
+
+def _api_key(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"x-api-key":
+            return value.decode("latin-1")
+    return None
+
+
+def summarize_profile(profiler: cProfile.Profile, top: int = PROFILE_TOP) -> List[Dict]:
+    """累積時間の長い順に上位の関数"""
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda kv: -kv[1][3])[:top]
+    return [
+        {
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": nc,
+            "totalMs": round(tt * 1000, 3),
+            "cumulativeMs": round(ct * 1000, 3),
+        }
+        for (filename, line, func), (_cc, nc, tt, ct, _callers) in rows
+    ]
+
+
+class SlowRequestLog:
+    def __init__(
+        self,
+        threshold_seconds: float = 0.5,
+        capacity: int = 100,
+        sample_rate: float = 1.0,
+        profile_rate: float = 0.0,
+    ):
+        self.threshold_seconds = threshold_seconds
+        self.sample_rate = sample_rate
+        self.profile_rate = profile_rate
+        self._entries: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self._entries.maxlen or 0
+
+    def should_watch(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def start_profile(self) -> Optional[cProfile.Profile]:
+        """このリクエストをプロファイルするなら、開始済みの cProfile を返す"""
+        if self.profile_rate <= 0 or random.random() >= self.profile_rate:
+            return None
+        if not self._profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # 他のプロファイラが動いている
+            self._profiling.release()
+            return None
+        return profiler
+
+    def stop_profile(self, profiler: cProfile.Profile) -> None:
+        profiler.disable()
+        self._profiling.release()
+
+    def record(
+        self,
+        scope,
+        status: int,
+        seconds: float,
+        phases: Dict[str, float],
+        profile: Optional[List[Dict]] = None,
+    ) -> None:
+        route = scope.get("route")
+        api_key = _api_key(scope)
+        entry: Dict[str, Any] = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "method": scope["method"],
+            "route": getattr(route, "path", None) or "unmatched",
+            "path": scope["path"],
+            "status": status,
+            "durationMs": round(seconds * 1000, 3),
+            "phasesMs": {k: round(v * 1000, 3) for k, v in phases.items()},
+            "params": sanitize_params(scope),
+            "keyHash": api_key_hash(api_key) if api_key else None,
+        }
+        if profile is not None:
+            entry["profile"] = profile
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """新しい順"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SlowRequestMiddleware:
+    """
+    しきい値を超えたリクエストを SlowRequestLog に記録する
+    フェーズ別の時間を読むため TimingMiddleware の内側に置く
+    """
+
+    def __init__(self, app, log: SlowRequestLog):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.log.should_watch():
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiler = self.log.start_profile()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                self.log.stop_profile(profiler)
+            if elapsed >= self.log.threshold_seconds:
+                self.log.record(
+                    scope,
+                    status,
+                    elapsed,
+                    current_phases(),
+                    summarize_profile(profiler) if profiler is not None else None,
+                )
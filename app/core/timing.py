@@ -0,0 +1,231 @@
+"""
+リクエストの処理段階(フェーズ)ごとの時間
+
+TimingMiddleware がリクエストごとに RequestTiming を contextvar に置き、
+各所のフックがそこへ経過時間を足していく。リクエストの外(ベンチマークや
+バックグラウンド処理)では contextvar が空なので、フックは何もしない
+
+- auth:       require_api_key / get_auth_context
+- validate:   ボディの読み取り・検証と依存関係の解決(auth を除く)
+- rate_limit: レート制限の判定
+- service:    サービス層(create_order, render_orders_page など)
+- commit:     UoW のコミット(リポジトリのロック・ジャーナル書き込みを含む)
+- lock_wait:  計測つきロック(LOCK_METRICS=true)で他スレッドを待った時間
+- serialize:  エンドポイントが返した値のレスポンスへの変換
+- total:      ミドルウェアに入ってから応答ヘッダーを送るまで
+service は commit・lock_wait を含む(各フェーズは重なりうる)
+
+全フェーズをルート別のヒストグラムに記録する。管理者キーで X-Server-Timing: 1 を
+付けたリクエストには Server-Timing ヘッダーでも返す
+"""
+
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, TypeVar
+
+from fastapi.routing import APIRoute
+
+from .metrics import REGISTRY
+
+F = TypeVar("F", bound=Callable)
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "http_request_phase_seconds",
+    "Time spent in each request phase by route template",
+    ("route", "phase"),
+)
+
+# 応答に Server-Timing を付けてほしいときのリクエストヘッダー(管理者キーのみ有効)
+OPT_IN_HEADER = b"x-server-timing"
+
+
+class RequestTiming:
+    __slots__ = ("phases", "route_started", "endpoint_done")
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.route_started = 0.0
+        self.endpoint_done = 0.0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+_current: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+
+def add_phase(name: str, seconds: float) -> None:
+    """計測済みの時間をフェーズに足す(リクエストの外なら何もしない)"""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+def current_phases() -> Dict[str, float]:
+    """実行中のリクエストのフェーズ別の時間(コピー。リクエストの外なら空)"""
+    timing = _current.get()
+    return dict(timing.phases) if timing is not None else {}
+
+
+class phase:
+    """with phase("service"): ... の間の時間をフェーズに足す"""
+
+    __slots__ = ("name", "timing", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timing = _current.get()
+        if self.timing is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.timing is not None:
+            self.timing.add(self.name, time.perf_counter() - self.started)
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """関数の実行時間をフェーズに足すデコレータ(同期・非同期の両方)"""
+
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                timing = _current.get()
+                if timing is None:
+                    return await fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    timing.add(name, time.perf_counter() - started)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timing.add(name, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorate
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """エンドポイントの開始までを validate、終了時刻を serialize の起点として記録する"""
+    if not asyncio.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        timing = _current.get()
+        if timing is None:
+            return await endpoint(*args, **kwargs)
+        before = time.perf_counter() - timing.route_started
+        timing.add("validate", max(before - timing.phases.get("auth", 0.0), 0.0))
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timing.endpoint_done = time.perf_counter()
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """
+    FastAPI のルート。ハンドラの前半(ボディ検証・依存関係)と
+    後半(戻り値のシリアライズ)の時間を測る
+    app.router.route_class に設定してから各ルートを定義する
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            timing = _current.get()
+            if timing is None:
+                return await handler(request)
+            timing.route_started = time.perf_counter()
+            response = await handler(request)
+            if timing.endpoint_done:
+                timing.add("serialize", time.perf_counter() - timing.endpoint_done)
+            return response
+
+        return timed_handler
+
+
+def _wants_header(scope, is_admin: Callable[[str], bool]) -> bool:
+    opted_in = False
+    api_key = None
+    for name, value in scope["headers"]:
+        if name == OPT_IN_HEADER:
+            opted_in = value in (b"1", b"true")
+        elif name == b"x-api-key":
+            api_key = value.decode("latin-1")
+    return opted_in and api_key is not None and is_admin(api_key)
+
+
+def server_timing(phases: Dict[str, float]) -> str:
+    """Server-Timing ヘッダーの値(ミリ秒)"""
+    return ", ".join(f"{name};dur={s * 1000:.3f}" for name, s in phases.items())
+
+
+class TimingMiddleware:
+    """
+    リクエストごとに RequestTiming を用意し、終わったらヒストグラムに記録する
+    is_admin は API キーが管理者のものかを返す(Server-Timing を返してよいか)
+    """
+
+    def __init__(self, app, is_admin: Callable[[str], bool]):
+        self.app = app
+        self.is_admin = is_admin
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming()
+        token = _current.set(timing)
+        started = time.perf_counter()
+        wants_header = _wants_header(scope, self.is_admin)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and wants_header:
+                phases = {
+                    **timing.phases,
+                    "total": time.perf_counter() - started,
+                }
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", ()),
+                        (b"server-timing", server_timing(phases).encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total = time.perf_counter() - started
+            _current.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            for name, seconds in timing.phases.items():
+                PHASE_SECONDS.observe(seconds, (path, name))
+            PHASE_SECONDS.observe(total, (path, "total"))
@@ -0,0 +1,381 @@
+"""
+プロセス内のトレース(スパン)とファイルへの書き出し
+
+TracingMiddleware がリクエストの開始時に1回だけ記録するかを決め(ヘッドベース
+サンプリング)、記録する場合はルートスパンを contextvar に置く。各所のフック
+(span / traced、リポジトリの呼び出し)はその子スパンを作る。記録しない
+リクエストやリクエストの外では contextvar が空なので、フックは何もしない
+
+終わったスパンは SpanExporter の上限つきキューに入れるだけで、ファイルへの
+書き込みはバックグラウンドのスレッドがまとめて行う(キューが満杯なら捨てて
+数える。リクエストは待たせない)。1行が OTLP/JSON の ExportTraceServiceRequest
+1件なので、コレクタなしでもファイルのまま読め、後から OTLP の受け口へ送れる
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+SPANS_EXPORTED = REGISTRY.counter(
+    "trace_spans_exported_total", "Spans written to the trace export file"
+)
+SPANS_DROPPED = REGISTRY.counter(
+    "trace_spans_dropped_total", "Spans dropped because the export queue was full"
+)
+
+# OTLP の Span.SpanKind / Status.StatusCode
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+SCOPE_NAME = "app.core.tracing"
+
+
+class Span:
+    __slots__ = (
+        "exporter",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "status",
+        "message",
+    )
+
+    def __init__(
+        self,
+        exporter: "SpanExporter",
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: int = KIND_INTERNAL,
+    ):
+        self.exporter = exporter
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+        self.status = STATUS_UNSET
+        self.message = ""
+
+    def child(self, name: str) -> "Span":
+        return Span(self.exporter, name, self.trace_id, self.span_id)
+
+    def set_error(self, exc: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.message = type(exc).__name__
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        self.exporter.export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": k, "value": _any_value(v)} for k, v in self.attributes.items()
+            ],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        if self.message:
+            out["status"]["message"] = self.message
+        return out
+
+
+def _any_value(v: Any) -> Dict[str, Any]:
+    """OTLP/JSON の AnyValue(int64 は文字列で表す)"""
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+_current: ContextVar[Span | None] = ContextVar("trace_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """記録中のリクエストなら現在のスパン(それ以外は None)"""
+    return _current.get()
+
+
+class span:
+    """with span("name", key=value): ... の間を現在のスパンの子として記録する"""
+
+    __slots__ = ("name", "attributes", "span", "token")
+
+    def __init__(self, name: str, **attributes: Any):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current.get()
+        if parent is None:
+            self.span = None
+            return None
+        self.span = parent.child(self.name)
+        self.span.attributes.update(self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.span is None:
+            return
+        _current.reset(self.token)
+        if exc is not None:
+            self.span.set_error(exc)
+        self.span.end()
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """関数の呼び出しを子スパンとして記録するデコレータ(同期・非同期の両方)"""
+
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+_FLUSH = object()
+_STOP = object()
+
+
+class SpanExporter:
+    """
+    終わったスパンを batch_size 件か flush_interval 秒ごとにまとめて、
+    OTLP/JSON の1行としてファイルへ追記する
+    スレッドは最初のスパンが来たときに起動する(記録しない設定なら起動しない)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        service_name: str = "order-api",
+        batch_size: int = 512,
+        flush_interval: float = 1.0,
+        max_queue: int = 8192,
+    ):
+        self.path = path
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, s: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(s)
+        except queue.Full:
+            self.dropped += 1
+            SPANS_DROPPED.inc()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """キューに入っている分を書き終えるまで待つ"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put((_FLUSH, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """残りを書き出してスレッドを止める(次のスパンが来たら起動し直す)"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def _run(self) -> None:
+        batch: List[Span] = []
+        deadline = 0.0
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write(batch)
+                batch = []
+                continue
+            if item is _STOP:
+                self._write(batch)
+                return
+            if isinstance(item, tuple):
+                self._write(batch)
+                batch = []
+                item[1].set()
+                continue
+            if not batch:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+
+    def encode(self, batch: List[Span]) -> str:
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": SCOPE_NAME},
+                            "spans": [s.to_otlp() for s in batch],
+                        }
+                    ],
+                }
+            ]
+        }
+        return json.dumps(request, separators=(",", ":"))
+
+    def _write(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(self.encode(batch) + "\n")
+        except OSError:
+            # 書けなくてもリクエストには影響させない(その分は捨てる)
+            logger.exception("failed to write %d spans to %s", len(batch), self.path)
+            self.dropped += len(batch)
+            SPANS_DROPPED.inc(len(batch))
+            return
+        self.exported += len(batch)
+        SPANS_EXPORTED.inc(len(batch))
+
+
+class Tracer:
+    """sample_rate の割合のリクエストだけを記録する(0 なら何もしない)"""
+
+    def __init__(self, exporter: SpanExporter, sample_rate: float = 0.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def should_sample(self) -> bool:
+        rate = self.sample_rate
+        return rate > 0 and (rate >= 1.0 or random.random() < rate)
+
+    def start_root(self, name: str) -> Span:
+        return Span(
+            self.exporter, name, "%032x" % random.getrandbits(128), kind=KIND_SERVER
+        )
+
+
+class TracingMiddleware:
+    """
+    記録するリクエストにルートスパン(SERVER)を作り、終わったら書き出しに回す
+    他のミドルウェアの時間も含めるため最も外側に置く
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.should_sample():
+            await self.app(scope, receive, send)
+            return
+        root = self.tracer.start_root(scope["method"])
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current.set(root)
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException as exc:
+            root.set_error(exc)
+            raise
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            root.name = f"{scope['method']} {route}"
+            attrs = root.attributes
+            attrs["http.request.method"] = scope["method"]
+            attrs["http.route"] = route
+            attrs["url.path"] = scope["path"]
+            attrs["http.response.status_code"] = status
+            if status >= 500:
+                root.status = STATUS_ERROR
+            root.end()
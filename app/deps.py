@@ -1,17 +1,124 @@
+import os
 from functools import lru_cache
 
-from .adapters.memory_uow import MemoryUoW
+from .adapters.journal import Journal
+from .adapters.memory_uow import MemoryStore, MemoryUoW
+from .adapters.traced_uow import TracedUoW
+from .core.cache import LruTtlCache
+from .core.execution import ExecutionPolicy
+from .core.idempotency import IdempotencyStore
+from .core.profiler import SamplingProfiler
+from .core.singleflight import SingleFlight
+from .core.slowlog import SlowRequestLog
+from .core.tracing import SpanExporter, Tracer, current_span
+from .ports import UoW
 
 
 @lru_cache(maxsize=1)
-def _memory_uow_singleton() -> MemoryUoW:
-    return MemoryUoW()
+def get_store() -> MemoryStore:
+    """全リクエストで共有するコミット済みの状態"""
+    journal = None
+    journal_path = os.getenv("JOURNAL_PATH")
+    if journal_path:
+        journal = Journal(
+            journal_path,
+            durability=os.getenv("JOURNAL_DURABILITY", "group"),
+            group_window_seconds=float(os.getenv("JOURNAL_GROUP_WINDOW_MS", "2"))
+            / 1000,
+        )
+    return MemoryStore(
+        hot_months=int(os.getenv("ORDERS_HOT_MONTHS", "3")),
+        archive_dir=os.getenv("ORDERS_ARCHIVE_DIR") or None,
+        journal=journal,
+        snapshot_path=os.getenv("SNAPSHOT_PATH") or None,
+    )
 
 
-def get_uow():
-    return _memory_uow_singleton()
+def get_uow() -> UoW:
+    """
+    リクエストごとに新しいトランザクション(変更セット)を返す
+    トレースを記録するリクエストでは、リポジトリ呼び出しをスパンにするラッパで包む
+    """
+    uow = MemoryUoW(get_store())
+    if current_span() is not None:
+        return TracedUoW(uow)
+    return uow
 
 
-def reset_uow_for_tests() -> MemoryUoW:
-    _memory_uow_singleton.cache_clear()
-    return _memory_uow_singleton()
+@lru_cache(maxsize=1)
+def get_orders_cache() -> LruTtlCache[bytes]:
+    """注文検索レスポンス(シリアライズ済みbytes)のキャッシュ"""
+    return LruTtlCache(
+        max_entries=int(os.getenv("ORDERS_CACHE_MAX_ENTRIES", "1024")),
+        max_bytes=int(os.getenv("ORDERS_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        ttl_seconds=float(os.getenv("ORDERS_CACHE_TTL_SECONDS", "30")),
+        enabled=os.getenv("ORDERS_CACHE_ENABLED", "true").lower() == "true",
+    )
+
+
+@lru_cache(maxsize=1)
+def get_orders_flight() -> SingleFlight:
+    """同一条件の注文検索を1回にまとめるための singleflight"""
+    return SingleFlight()
+
+
+@lru_cache(maxsize=1)
+def get_execution_policy() -> ExecutionPolicy:
+    """重い処理(管理者検索・大きな注文)を流すスレッドプール"""
+    return ExecutionPolicy(max_workers=int(os.getenv("EXEC_HEAVY_MAX_WORKERS", "4")))
+
+
+@lru_cache(maxsize=1)
+def get_idempotency_store() -> IdempotencyStore:
+    """POST の Idempotency-Key ごとの成功レスポンス(APIキー単位)"""
+    return IdempotencyStore(
+        LruTtlCache(
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.getenv("IDEMPOTENCY_MAX_BYTES", str(32 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+            sizeof=lambda r: len(r.body),
+        )
+    )
+
+
+@lru_cache(maxsize=1)
+def get_profiler() -> SamplingProfiler:
+    """POST /admin/profile で使うサンプリングプロファイラ(同時に1セッション)"""
+    return SamplingProfiler(
+        interval_seconds=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+        max_stacks=int(os.getenv("PROFILE_MAX_STACKS", "10000")),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_slow_request_log() -> SlowRequestLog:
+    """しきい値を超えたリクエストのリングバッファ"""
+    return SlowRequestLog(
+        threshold_seconds=float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "500")) / 1000,
+        capacity=int(os.getenv("SLOW_REQUEST_CAPACITY", "100")),
+        sample_rate=float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1.0")),
+        profile_rate=float(os.getenv("SLOW_REQUEST_PROFILE_RATE", "0")),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_tracer() -> Tracer:
+    """リクエストのトレース(TRACE_SAMPLE_RATE の割合だけ記録し、ファイルへ書き出す)"""
+    return Tracer(
+        SpanExporter(
+            os.getenv("TRACE_EXPORT_PATH", "traces.jsonl"),
+            service_name=os.getenv("TRACE_SERVICE_NAME", "order-api"),
+            batch_size=int(os.getenv("TRACE_BATCH_SIZE", "512")),
+            flush_interval=float(os.getenv("TRACE_FLUSH_INTERVAL_SECONDS", "1")),
+            max_queue=int(os.getenv("TRACE_QUEUE_SIZE", "8192")),
+        ),
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")),
+    )
+
+
+def reset_uow_for_tests() -> UoW:
+    get_store.cache_clear()
+    # 版カウンタは共有状態と一緒に0へ戻るので、キャッシュも作り直す
+    get_orders_cache.cache_clear()
+    get_idempotency_store.cache_clear()
+    return get_uow()
@@ -1,16 +1,30 @@
+import asyncio
 import logging.config
 import os
+import time
 from contextlib import asynccontextmanager
 from datetime import date
-from typing import Optional
-
-from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
 from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 from slowapi import Limiter
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from starlette.requests import Request as StarletteRequest
 
+from .adapters.order_archive import OrderArchiver
+from .adapters.snapshot import Snapshotter
 from .core.auth import (
     bind_api_key_to_customer,
     get_customer_id_from_api_key,
@@ -19,10 +33,29 @@ from .core.auth import (
     is_admin_api_key,
     is_api_key_bound,
     is_valid_api_key,
+    memory_usage,
     require_api_key,
 )
+from .core.errors import BadRequest, Conflict
 from .core.exception_handlers import include_handlers
-from .deps import get_uow
+from .core.idempotency import StoredResponse, fingerprint, scope_of
+from .core.memsize import DEFAULT_SAMPLE, estimate, head
+from .core.metrics import RATE_LIMITED, REGISTRY, MetricsMiddleware
+from .core.profiler import ProfilerBusy
+from .core.slowlog import SlowRequestMiddleware
+from .core.timing import TimedRoute, TimingMiddleware, phase, timed
+from .core.tracing import TracingMiddleware, span, traced
+from .deps import (
+    get_execution_policy,
+    get_idempotency_store,
+    get_orders_cache,
+    get_orders_flight,
+    get_profiler,
+    get_slow_request_log,
+    get_store,
+    get_tracer,
+    get_uow,
+)
 from .ports import UoW
 from .schemas import (
     AuthContext,
@@ -34,11 +67,13 @@ from .schemas import (
     ProductWithId,
 )
 from .services_customers import create_customer
-from .services_orders import create_order, search_orders
+from .services_orders import create_order, render_orders_page
 from .services_products import create_product
 
 # テスト環境かどうかを判定
 TESTING = os.getenv("TESTING", "false").lower() == "true"
+# デバッグモード(注文検索の explain=true で実行計画を返す)
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
 # グローバルレート制限
 GLOBAL_RATE_LIMIT = "100/minute" if TESTING else "10/minute"
@@ -48,6 +83,27 @@ AUTH_RATE_LIMIT = "10000/minute" if TESTING else "5/minute"
 # Redis接続情報を環境変数から取得（本番環境用）
 REDIS_URL = os.getenv("REDIS_URL", "")
 
+# 古い注文をセグメントファイルへ退避する設定(ディレクトリ未設定なら無効)
+ORDERS_ARCHIVE_DIR = os.getenv("ORDERS_ARCHIVE_DIR", "")
+ORDERS_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDERS_ARCHIVE_AFTER_DAYS", "90"))
+ORDERS_ARCHIVE_INTERVAL_SECONDS = float(
+    os.getenv("ORDERS_ARCHIVE_INTERVAL_SECONDS", "3600")
+)
+
+# 状態のスナップショットを定期的に書き出す設定(パス未設定なら無効)
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+
+# 明細数がこれ以上の注文登録はスレッドプールで実行する
+HEAVY_ORDER_ITEMS = int(os.getenv("EXEC_HEAVY_ORDER_ITEMS", "20"))
+
+# ルート別の処理時間などを記録し、/metrics で返す
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# 処理段階ごとの時間を記録する(管理者キーなら Server-Timing ヘッダーでも返す)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+# POST /admin/profile で指定できる最長の秒数
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
 
 LOGGING_CONFIG = {
     "version": 1,
@@ -75,8 +131,30 @@ async def lifespan(app: FastAPI):
     logging.config.dictConfig(LOGGING_CONFIG)
     init_api_key()
     initialize_api_keys()
+    archiver = None
+    if ORDERS_ARCHIVE_DIR:
+        archiver = OrderArchiver(
+            get_store().orders,
+            after_days=ORDERS_ARCHIVE_AFTER_DAYS,
+            interval_seconds=ORDERS_ARCHIVE_INTERVAL_SECONDS,
+        )
+        archiver.start()
+    snapshotter = None
+    if SNAPSHOT_PATH:
+        snapshotter = Snapshotter(
+            get_store(), SNAPSHOT_PATH, interval_seconds=SNAPSHOT_INTERVAL_SECONDS
+        )
+        snapshotter.start()
     yield
     # シャットダウン処理（必要に応じて追加）
+    if archiver is not None:
+        archiver.stop()
+    if snapshotter is not None:
+        snapshotter.stop()
+    get_tracer().exporter.shutdown()
+    # 実行中の重い処理を待ってからプールを閉じる(次の起動では作り直す)
+    get_execution_policy().shutdown()
+    get_execution_policy.cache_clear()
 
 
 def get_api_key_for_limit(request: Request) -> str:
@@ -94,6 +172,8 @@ def get_api_key_for_limit(request: Request) -> str:
     return api_key if api_key else get_remote_address(request)
 
 
+@traced("get_auth_context")
+@timed("auth")
 async def get_auth_context(request: Request) -> AuthContext:
     """認証コンテキストを取得"""
     api_key = request.headers.get("X-API-KEY")
@@ -109,8 +189,28 @@ async def get_auth_context(request: Request) -> AuthContext:
     return AuthContext(api_key=api_key, customer_id=customer_id, is_admin=is_admin)
 
 
+class TimedLimiter(Limiter):
+    """レート制限の判定時間を rate_limit フェーズ(とトレースのスパン)として数える"""
+
+    def _check_request_limit(self, *args, **kwargs):
+        with phase("rate_limit"), span("rate_limit"):
+            return super()._check_request_limit(*args, **kwargs)
+
+
+async def require_admin(
+    auth_context: AuthContext = Depends(get_auth_context),
+) -> AuthContext:
+    """管理者キーのみ通す(運用向けエンドポイント用)"""
+    if not auth_context.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin API key required",
+        )
+    return auth_context
+
+
 # Limiterの初期化（default_limitsでグローバル制限を設定）
-limiter = Limiter(
+limiter = TimedLimiter(
     key_func=get_api_key_for_limit,
     default_limits=[GLOBAL_RATE_LIMIT],  # ← グローバル制限
     headers_enabled=True,  # X-RateLimit-* ヘッダーを有効化
@@ -118,6 +218,31 @@ limiter = Limiter(
 )
 
 app = FastAPI(title="Order Management API", version="1.0.0", lifespan=lifespan)
+# 遅いリクエストの記録はフェーズ別の時間を読むので TimingMiddleware の内側に置く
+app.add_middleware(SlowRequestMiddleware, log=get_slow_request_log())
+if SERVER_TIMING_ENABLED:
+    app.router.route_class = TimedRoute
+    app.add_middleware(TimingMiddleware, is_admin=is_admin_api_key)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+# ルートスパンに他のミドルウェアの時間も含めるため最も外側に置く
+app.add_middleware(TracingMiddleware, tracer=get_tracer())
+REGISTRY.gauge_func(
+    "repository_size",
+    "Entities held by the repository",
+    lambda: {(kind,): n for kind, n in get_store().sizes().items()},
+    ("kind",),
+)
+REGISTRY.gauge_func(
+    "exec_pool_queue_depth",
+    "Heavy tasks waiting for a free worker",
+    lambda: {(): get_execution_policy().queue_depth()},
+)
+REGISTRY.gauge_func(
+    "exec_pool_active_workers",
+    "Heavy tasks running on the worker pool",
+    lambda: {(): get_execution_policy().stats()["running"]},
+)
 
 
 @app.exception_handler(RateLimitExceeded)
@@ -126,6 +251,9 @@ async def rate_limit_handler(request: StarletteRequest, exc: RateLimitExceeded):
     レート制限超過時のカスタムエラーハンドラー
     既存のエラーレスポンス形式 {"code", "message", "details"} に統一
     """
+    route = request.scope.get("route")
+    RATE_LIMITED.inc((getattr(route, "path", None) or "unmatched",))
+
     # SlowAPI のヘッダー情報を取得（利用可能な場合）
     headers = {}
     if hasattr(exc, "headers") and exc.headers:
@@ -161,12 +289,160 @@ include_handlers(app)
 app.state.limiter = limiter
 
 
+async def run_idempotent(
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str],
+    body: BaseModel,
+    execute: Callable[[], Awaitable[Tuple[BaseModel, str]]],
+):
+    """
+    作成系 POST の共通処理。execute は (作成したモデル, Location) を返す
+    - Idempotency-Key なし: そのまま実行する
+    - あり: 同じAPIキー・同じキーの成功レスポンスがあれば、サービスを呼ばずに
+      保存済みのバイト列を返す(Idempotent-Replayed: true)
+    """
+    if idempotency_key is None:
+        created, location = await execute()
+        response.headers["Location"] = location
+        return created
+
+    async def execute_and_render() -> StoredResponse:
+        created, location = await execute()
+        rendered = JSONResponse(
+            status_code=status.HTTP_201_CREATED,
+            content=created.model_dump(by_alias=True, mode="json"),
+        )
+        return StoredResponse(
+            rendered.status_code, rendered.body, (("Location", location),)
+        )
+
+    stored, replayed = await get_idempotency_store().run(
+        scope_of(request.headers.get("X-API-KEY")),
+        idempotency_key,
+        fingerprint(request.method, request.url.path, body.model_dump_json()),
+        execute_and_render,
+    )
+    headers = dict(stored.headers)
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return Response(
+        content=stored.body,
+        status_code=stored.status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
 @app.get("/health")
 @limiter.limit(GLOBAL_RATE_LIMIT)
 async def health_check(request: Request, response: Response) -> dict[str, bool]:
     return {"ok": True}
 
 
+@app.get("/metrics", dependencies=[Depends(require_api_key), Depends(require_admin)])
+async def get_metrics():
+    """Prometheus のテキスト形式のメトリクス(管理者のみ)"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post(
+    "/admin/profile",
+    dependencies=[Depends(require_api_key), Depends(require_admin)],
+)
+async def post_profile(seconds: float = 10.0):
+    """
+    seconds 秒のあいだ全スレッドのスタックをサンプリングし、collapsed 形式で返す
+    (flamegraph.pl / speedscope 用。同時に1セッションまで)
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise BadRequest(
+            "INVALID_DURATION",
+            f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]",
+        )
+    try:
+        # サンプリングは別スレッドで行い、その間もイベントループは止めない
+        profile = await asyncio.to_thread(get_profiler().profile, seconds)
+    except ProfilerBusy:
+        raise Conflict("PROFILE_IN_PROGRESS", "another profiling session is running")
+    return Response(
+        content=profile.collapsed(),
+        media_type="text/plain",
+        headers={
+            "X-Profile-Samples": str(profile.samples),
+            "X-Profile-Dropped": str(profile.dropped),
+        },
+    )
+
+
+@app.get(
+    "/admin/slow-requests",
+    dependencies=[Depends(require_api_key), Depends(require_admin)],
+)
+async def get_slow_requests():
+    """しきい値を超えたリクエストの記録(新しい順)"""
+    log = get_slow_request_log()
+    return {
+        "thresholdMs": log.threshold_seconds * 1000,
+        "capacity": log.capacity,
+        "entries": log.entries(),
+    }
+
+
+def _limiter_memory(sample: int) -> Dict[str, Dict[str, int]]:
+    """インメモリのレート制限カウンタ(Redis を使う場合はプロセス外なので数えない)"""
+    storage = getattr(limiter, "_storage", None)
+    counters = getattr(storage, "storage", None)
+    if not isinstance(counters, dict):
+        return {}
+    return {
+        "limiter.storage": estimate(
+            counters, len(counters), head(counters.items(), sample)
+        )
+    }
+
+
+def _cache_memory() -> Dict[str, Dict[str, int]]:
+    """キャッシュは値のバイト数を自分で数えているので、それをそのまま使う"""
+    orders = get_orders_cache().stats()
+    idempotency = get_idempotency_store().stats()
+    return {
+        "cache.orders": {"entries": orders["entries"], "bytes": orders["bytes"]},
+        "cache.idempotency": {
+            "entries": idempotency["cache_entries"],
+            "bytes": idempotency["cache_bytes"],
+        },
+    }
+
+
+@app.get(
+    "/admin/memory",
+    dependencies=[Depends(require_api_key), Depends(require_admin)],
+)
+async def get_memory(sample: int = DEFAULT_SAMPLE):
+    """
+    ストア・索引・認証テーブル・レート制限・キャッシュの件数と見積もりバイト数
+    各構造の先頭 sample 件から見積もる(全件はたどらない)
+    """
+    if not 1 <= sample <= 10_000:
+        raise BadRequest("INVALID_SAMPLE", "sample must be between 1 and 10000")
+    started = time.perf_counter()
+    # ロックのないテーブルはイベントループ上で見本を取る(更新と並行しないように)
+    structures = {
+        **memory_usage(sample),
+        **_limiter_memory(sample),
+        **_cache_memory(),
+    }
+    # ストアは各ロック内で見本を取るので、計算ごとプールへ逃がす
+    structures.update(await asyncio.to_thread(get_store().memory, sample))
+    return {
+        "sample": sample,
+        "seconds": round(time.perf_counter() - started, 3),
+        "totalBytes": sum(s["bytes"] for s in structures.values()),
+        "structures": structures,
+    }
+
+
 @app.post(
     "/customers",
     response_model=CustomerWithId,
@@ -179,27 +455,38 @@ async def post_customer(
     body: CustomerCreate,
     response: Response,
     uow: UoW = Depends(get_uow),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ) -> CustomerWithId:
     """
     顧客を作成
     - 管理者: 制限なく作成可能
     - 一般ユーザー: 1つのAPIキーにつき1顧客まで作成可能
+      (同じ Idempotency-Key での再送には、作成時のレスポンスを返す)
     """
     api_key = request.headers.get("X-API-KEY")
 
-    # 管理者でない場合、すでにバインド済みならエラー
-    if not is_admin_api_key(api_key) and is_api_key_bound(api_key):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="This API key is already associated with a customer",
+    async def execute() -> Tuple[CustomerWithId, str]:
+        # 管理者でない場合、すでにバインド済みならエラー
+        if not is_admin_api_key(api_key) and is_api_key_bound(api_key):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="This API key is already associated with a customer",
+            )
+
+        # ジャーナルの fsync を待つコミットはイベントループを止めないようプールで行う
+        customer = await get_execution_policy().run(
+            create_customer,
+            uow,
+            body.name,
+            body.email,
+            heavy=get_store().commit_waits_for_fsync,
         )
 
-    customer = create_customer(uow, body.name, body.email)
-    response.headers["Location"] = f"/customers/{customer.cust_id}"
+        # APIキーを顧客IDにバインド(管理者キーの場合は何もしない)
+        bind_api_key_to_customer(api_key, customer.cust_id)
+        return customer, f"/customers/{customer.cust_id}"
 
-    # APIキーを顧客IDにバインド(管理者キーの場合は何もしない)
-    bind_api_key_to_customer(api_key, customer.cust_id)
-    return customer
+    return await run_idempotent(request, response, idempotency_key, body, execute)
 
 
 @app.post(
@@ -214,10 +501,19 @@ async def post_product(
     body: ProductCreate,
     response: Response,
     uow: UoW = Depends(get_uow),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ) -> ProductWithId:
-    product = create_product(uow, body.name, body.unit_price)
-    response.headers["Location"] = f"/products/{product.prod_id}"
-    return product
+    async def execute() -> Tuple[ProductWithId, str]:
+        product = await get_execution_policy().run(
+            create_product,
+            uow,
+            body.name,
+            body.unit_price,
+            heavy=get_store().commit_waits_for_fsync,
+        )
+        return product, f"/products/{product.prod_id}"
+
+    return await run_idempotent(request, response, idempotency_key, body, execute)
 
 
 @app.post(
@@ -232,10 +528,21 @@ async def post_order(
     body: OrderCreate,
     response: Response,
     uow: UoW = Depends(get_uow),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ) -> OrderCreateResponse:
-    order = create_order(uow, body)
-    response.headers["Location"] = f"/orders/{order.order_id}"
-    return order
+    async def execute() -> Tuple[OrderCreateResponse, str]:
+        # 大きな注文と fsync を待つコミットはイベントループを止めないようプールで処理する
+        order = await get_execution_policy().run(
+            create_order,
+            uow,
+            body,
+            heavy=len(body.items) >= HEAVY_ORDER_ITEMS
+            or get_store().commit_waits_for_fsync,
+        )
+        return order, f"/orders/{order.order_id}"
+
+    # タイムアウト後の再送で注文が二重にならないよう Idempotency-Key に対応する
+    return await run_idempotent(request, response, idempotency_key, body, execute)
 
 
 @app.get(
@@ -250,12 +557,16 @@ async def get_order(
     to: Optional[date] = None,
     page: Optional[int] = 0,
     size: Optional[int] = 20,
+    with_total: bool = Query(True, alias="withTotal"),
+    explain: bool = False,
     uow: UoW = Depends(get_uow),
 ):
     """
     注文一覧を取得
     - 一般ユーザー：自分の注文のみ取得
     - 管理者：すべての注文を取得
+    - withTotal=false の場合は totalCount を数えない(null を返す)
+    - explain=true の場合は一覧の代わりに実行計画を返す(デバッグモードのみ)
     """
     cust_id = None if auth_context.is_admin else auth_context.customer_id
 
@@ -265,10 +576,31 @@ async def get_order(
             detail="No customer associated with this API key",
         )
 
-    items, total_count = search_orders(uow, cust_id, from_date, to, page, size)
-    return {
-        "list": [i.model_dump(by_alias=True) for i in items],
-        "totalCount": total_count,
-        "page": page,
-        "size": size,
-    }
+    if explain:
+        if not DEBUG:
+            raise BadRequest("EXPLAIN_DISABLED", "explain is available in debug mode")
+        return JSONResponse(uow.orders.explain(cust_id, from_date, to, page, size))
+
+    # 管理者の全件検索は重いのでプールで実行する
+    # 顧客自身の検索は軽いのでイベントループ上でそのまま実行する
+    def search() -> Awaitable[bytes]:
+        return get_execution_policy().run(
+            render_orders_page,
+            uow,
+            cust_id,
+            from_date,
+            to,
+            page,
+            size,
+            with_total,
+            cache=get_orders_cache(),
+            heavy=cust_id is None,
+        )
+
+    # 同じ条件・同じ版の検索が実行中なら、イベントループ上でその結果を待つ
+    # (プールに出すのは最初の1件だけで、待つ側はプールの枠を使わない。
+    # 版をキーに含め、書き込み後のリクエストが古い実行に相乗りしないようにする)
+    version = uow.orders.version(cust_id)
+    key = (cust_id, from_date, to, page, size, with_total, version)
+    body = await get_orders_flight().do(key, search)
+    return Response(content=body, media_type="application/json")
@@ -1,14 +1,67 @@
+import json
 from datetime import date
-from typing import Protocol
+from enum import Enum
+from typing import Any, Dict, NamedTuple, Protocol
 
 from .schemas import CustomerWithId, OrderCreateResponse, ProductWithId
 
 
+class InsertConflict(str, Enum):
+    """insert_if_absent が挿入しなかった理由(どの一意制約に当たったか)"""
+
+    ID = "id"
+    EMAIL = "email"
+    NAME = "name"
+
+
+class CommitConflict(Exception):
+    """commit 時の検証で一意制約違反が見つかった(変更セットは破棄される)"""
+
+    def __init__(self, conflict: InsertConflict, key: str):
+        super().__init__(f"{conflict.value} conflict: {key}")
+        self.conflict = conflict
+        self.key = key
+
+
+class OrderSummaryRow(NamedTuple):
+    """
+    注文一覧の読み取りモデルの1行
+    一覧に要る項目と、一覧の1要素としてシリアライズ済みのJSONを持つ
+    (タプルの大小 = (注文日, 注文ID) の順なので、そのままソートできる)
+    """
+
+    order_date: date
+    order_id: str
+    total_amount: int
+    fragment: bytes
+
+    @classmethod
+    def of(cls, o: OrderCreateResponse) -> "OrderSummaryRow":
+        return cls.build(o.order_id, o.order_date, o.total_amount)
+
+    @classmethod
+    def build(
+        cls, order_id: str, order_date: date, total_amount: int
+    ) -> "OrderSummaryRow":
+        # OrderSummary を by_alias で JSON にしたものと同じ
+        fragment = json.dumps(
+            {
+                "orderId": order_id,
+                "orderDate": order_date.isoformat(),
+                "totalAmount": total_amount,
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        return cls(order_date, order_id, total_amount, fragment)
+
+
 class CustomersRepo(Protocol):
     def by_id(self, cust_id: str) -> CustomerWithId | None: ...
     def save(self, c: CustomerWithId) -> None: ...
     def exists_email(self, email: str) -> bool: ...
     def exists_id(self, cust_id: str) -> bool: ...
+    def insert_if_absent(self, c: CustomerWithId) -> InsertConflict | None: ...
 
 
 class ProductsRepo(Protocol):
@@ -16,6 +69,7 @@ class ProductsRepo(Protocol):
     def by_name_norm_exists(self, name_norm: str) -> bool: ...
     def save(self, p: ProductWithId) -> None: ...
     def exists_id(self, prod_id: str) -> bool: ...
+    def insert_if_absent(self, p: ProductWithId) -> InsertConflict | None: ...
 
 
 class OrdersRepo(Protocol):
@@ -29,8 +83,19 @@ class OrdersRepo(Protocol):
         to: date | None,
         page: int,
         size: int,
-    ) -> tuple[list[OrderCreateResponse], int]: ...
+        with_total: bool = True,
+    ) -> tuple[list[OrderSummaryRow], int | None]: ...
+    def explain(
+        self,
+        cust_id: str | None,
+        frm: date | None,
+        to: date | None,
+        page: int,
+        size: int,
+    ) -> Dict[str, Any]: ...
     def pop_line_no(self) -> int: ...
+    def reserve_line_nos(self, n: int) -> range: ...
+    def version(self, cust_id: str | None) -> int: ...
 
 
 class UoW(Protocol):
@@ -40,3 +105,57 @@ class UoW(Protocol):
 
     def commit(self) -> None: ...
     def rollback(self) -> None: ...
+
+
+# --- 非同期版(非同期ドライバのDBアダプタ用) ---
+
+
+class AsyncCustomersRepo(Protocol):
+    async def by_id(self, cust_id: str) -> CustomerWithId | None: ...
+    async def save(self, c: CustomerWithId) -> None: ...
+    async def exists_email(self, email: str) -> bool: ...
+    async def exists_id(self, cust_id: str) -> bool: ...
+    async def insert_if_absent(self, c: CustomerWithId) -> InsertConflict | None: ...
+
+
+class AsyncProductsRepo(Protocol):
+    async def by_id(self, prod_id: str) -> ProductWithId | None: ...
+    async def by_name_norm_exists(self, name_norm: str) -> bool: ...
+    async def save(self, p: ProductWithId) -> None: ...
+    async def exists_id(self, prod_id: str) -> bool: ...
+    async def insert_if_absent(self, p: ProductWithId) -> InsertConflict | None: ...
+
+
+class AsyncOrdersRepo(Protocol):
+    async def by_id(self, order_id: str) -> OrderCreateResponse | None: ...
+    async def save(self, o: OrderCreateResponse, cust_id: str) -> None: ...
+    async def exists_id(self, order_id: str) -> bool: ...
+    async def search(
+        self,
+        cust_id: str | None,
+        frm: date | None,
+        to: date | None,
+        page: int,
+        size: int,
+        with_total: bool = True,
+    ) -> tuple[list[OrderSummaryRow], int | None]: ...
+    async def explain(
+        self,
+        cust_id: str | None,
+        frm: date | None,
+        to: date | None,
+        page: int,
+        size: int,
+    ) -> Dict[str, Any]: ...
+    async def pop_line_no(self) -> int: ...
+    async def reserve_line_nos(self, n: int) -> range: ...
+    async def version(self, cust_id: str | None) -> int: ...
+
+
+class AsyncUoW(Protocol):
+    customers: AsyncCustomersRepo
+    products: AsyncProductsRepo
+    orders: AsyncOrdersRepo
+
+    async def commit(self) -> None: ...
+    async def rollback(self) -> None: ...
@@ -0,0 +1,257 @@
+"""
+大量の合成データ(顧客・商品・注文)をリポジトリのポート経由で投入する
+
+    python -m app.seeding --customers 100000 --products 1000 --orders 1000000 --seed 42
+
+- 顧客ごとの注文数はべき分布、商品の人気は Zipf 分布、注文日は季節性あり
+- 同じ seed なら同じデータになる(ID も seed と通し番号から決まる)
+- UoW を1バッチ1コミットで使うので、設定されたどのアダプタにも投入できる
+  (CLI は deps の設定に従う。SNAPSHOT_PATH があれば最後にスナップショットを書く)
+空のストアへの投入を前提にする(同じ seed を2回流すと ID が重なる)
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Callable, List, NamedTuple, Sequence
+
+from .ports import UoW
+from .schemas import CustomerWithId, OrderCreateResponse, ProductWithId
+
+# 数量の分布(1個が最も多い)
+_QTY_WEIGHTS = (50, 25, 12, 8, 5)
+
+
+class SeedResult(NamedTuple):
+    customers: int
+    products: int
+    orders: int
+    items: int
+    seconds: float
+
+
+def _seed_id(prefix: str, seed: int, i: int) -> str:
+    """
+    "C_5e00000000000001" のような ID(採番器と同じ 16桁の16進)
+    先頭を 5e + seed にして、採番器が払い出す範囲(現在時刻基準)と重ならないようにする
+    通し番号は日付順に振るので、同日内の並びも採番順と一致する
+    """
+    return f"{prefix}_5e{seed % 256:02x}{i:012x}"
+
+
+def _cum_weights(weights: Sequence[float]) -> List[float]:
+    return list(itertools.accumulate(weights))
+
+
+def _zipf_weights(n: int, s: float) -> List[float]:
+    """順位 r (1始まり) の重み 1/r^s"""
+    return [1.0 / (r**s) for r in range(1, n + 1)]
+
+
+def _season_weights(start: date, end: date, amplitude: float) -> List[float]:
+    """
+    日別の重み: 12月をピークとする年周期 + 週末の増加 + 緩やかな成長
+    """
+    days = (end - start).days + 1
+    out = []
+    for k in range(days):
+        d = start + timedelta(days=k)
+        doy = d.timetuple().tm_yday
+        season = 1 + amplitude * math.cos(2 * math.pi * (doy - 350) / 365.25)
+        weekend = 1.3 if d.weekday() >= 5 else 1.0
+        growth = 1 + 0.5 * k / days
+        out.append(season * weekend * growth)
+    return out
+
+
+def _pick_distinct(rnd: random.Random, cum: List[float], n: int, k: int) -> List[int]:
+    """累積重み cum から重複なしで k 個選ぶ(人気の偏りを保ったまま)"""
+    total = cum[-1]
+    chosen: List[int] = []
+    seen = set()
+    while len(chosen) < k:
+        i = min(bisect.bisect(cum, rnd.random() * total), n - 1)
+        if i not in seen:
+            seen.add(i)
+            chosen.append(i)
+    return chosen
+
+
+def seed_store(
+    uow_factory: Callable[[], UoW],
+    *,
+    customers: int,
+    products: int,
+    orders: int,
+    start: date | None = None,
+    end: date | None = None,
+    seed: int = 0,
+    batch_size: int = 10_000,
+    customer_skew: float = 1.1,
+    product_skew: float = 1.0,
+    season_amplitude: float = 0.3,
+    max_items: int = 20,
+) -> SeedResult:
+    """
+    uow_factory が返す UoW に batch_size 件ずつ積んでコミットする
+    start/end の既定は、昨日までの3年間
+    """
+    if customers < 1 or products < 1:
+        raise ValueError("customers and products must be >= 1")
+    started = time.perf_counter()
+    rnd = random.Random(seed)
+    end = end or date.today() - timedelta(days=1)
+    start = start or end - timedelta(days=3 * 365)
+
+    def batches(n: int):
+        for lo in range(0, n, batch_size):
+            yield range(lo, min(lo + batch_size, n))
+
+    for batch in batches(customers):
+        uow = uow_factory()
+        for i in batch:
+            # メールアドレスの検証は1件 0.1ms ほどかかるので省く(正規化済みの形で作る)
+            c = CustomerWithId.model_construct(
+                cust_id=_seed_id("C", seed, i),
+                name=f"Seed User {i}",
+                email=f"seed{seed}.{i}@example.com",
+            )
+            if uow.customers.insert_if_absent(c) is not None:
+                raise RuntimeError(f"customer already exists: {c.cust_id}")
+        uow.commit()
+
+    prices: List[int] = []
+    for batch in batches(products):
+        uow = uow_factory()
+        for i in batch:
+            # 価格は対数正規(中央値 1,500 円程度)を10円単位に丸める
+            price = min(
+                max(int(rnd.lognormvariate(7.3, 1.0)) // 10 * 10, 10), 1_000_000
+            )
+            prices.append(price)
+            p = ProductWithId(
+                prod_id=_seed_id("P", seed, i),
+                name=f"Seed Item {seed}-{i}",
+                unit_price=price,
+            )
+            if uow.products.insert_if_absent(p) is not None:
+                raise RuntimeError(f"product already exists: {p.prod_id}")
+        uow.commit()
+
+    # 人気の順位と ID の対応はシャッフルする(ID が小さいほど人気、にならないように)
+    cust_rank = list(range(customers))
+    rnd.shuffle(cust_rank)
+    prod_rank = list(range(products))
+    rnd.shuffle(prod_rank)
+    cust_cum = _cum_weights(_zipf_weights(customers, customer_skew))
+    prod_cum = _cum_weights(_zipf_weights(products, product_skew))
+    day_cum = _cum_weights(_season_weights(start, end, season_amplitude))
+    qty_cum = _cum_weights(_QTY_WEIGHTS)
+    base = start.toordinal()
+    # 日付を先に全部引いて並べる(古い月から順に保存すると、古い月は凍結されていく)
+    ordinals = sorted(
+        base + d
+        for d in rnd.choices(range(len(day_cum)), cum_weights=day_cum, k=orders)
+    )
+    max_items = max(1, min(max_items, products, 100))
+
+    items_total = 0
+    for batch in batches(orders):
+        uow = uow_factory()
+        plans = []
+        n_items = 0
+        for i in batch:
+            # 明細数は 1 + 幾何分布(平均 2.5 程度)
+            k = min(1 + int(rnd.expovariate(1 / 1.5)), max_items)
+            prods = _pick_distinct(rnd, prod_cum, products, k)
+            cust = cust_rank[
+                min(bisect.bisect(cust_cum, rnd.random() * cust_cum[-1]), customers - 1)
+            ]
+            plans.append((i, cust, prods))
+            n_items += k
+        line_nos = iter(uow.orders.reserve_line_nos(n_items))
+        for i, cust, prods in plans:
+            items = []
+            total = 0
+            for r in prods:
+                p = prod_rank[r]
+                qty = bisect.bisect(qty_cum, rnd.random() * qty_cum[-1]) + 1
+                amount = prices[p] * qty
+                total += amount
+                items.append(
+                    {
+                        "line_no": next(line_nos),
+                        "prod_id": _seed_id("P", seed, p),
+                        "qty": qty,
+                        "unit_price": prices[p],
+                        "line_amount": amount,
+                    }
+                )
+            # dict からの検証は model_construct より速い(pydantic v2 はコア側で組み立てる)
+            order = OrderCreateResponse.model_validate(
+                {
+                    "order_id": _seed_id("O", seed, i),
+                    "order_date": date.fromordinal(ordinals[i]),
+                    "total_amount": total,
+                    "items": items,
+                }
+            )
+            uow.orders.save(order, _seed_id("C", seed, cust))
+        uow.commit()
+        items_total += n_items
+
+    return SeedResult(
+        customers,
+        products,
+        orders,
+        items_total,
+        round(time.perf_counter() - started, 3),
+    )
+
+
+def main() -> None:
+    from .deps import get_store, get_uow
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--products", type=int, default=1_000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--start", type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--customer-skew", type=float, default=1.1)
+    parser.add_argument("--product-skew", type=float, default=1.0)
+    parser.add_argument("--season-amplitude", type=float, default=0.3)
+    args = parser.parse_args()
+
+    result = seed_store(
+        get_uow,
+        customers=args.customers,
+        products=args.products,
+        orders=args.orders,
+        start=args.start,
+        end=args.end,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        customer_skew=args.customer_skew,
+        product_skew=args.product_skew,
+        season_amplitude=args.season_amplitude,
+    )
+    store = get_store()
+    snapshot_path = os.getenv("SNAPSHOT_PATH")
+    if snapshot_path:
+        store.save_snapshot(snapshot_path)
+    if store.journal is not None:
+        store.journal.close()
+    print(json.dumps(result._asdict()), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,31 @@
-import uuid
-
 from .core.errors import Conflict
-from .ports import UoW
+from .core.ids import new_id
+from .core.timing import timed
+from .core.tracing import traced
+from .ports import CommitConflict, InsertConflict, UoW
 from .schemas import CustomerWithId
 
 
-def new_cust_id(uow: UoW) -> str:
-    max_attempts = 100
-    for _ in range(max_attempts):
-        cust_id = f"C_{uuid.uuid4().hex[:8]}"
-        if not uow.customers.exists_id(cust_id):
-            return cust_id
-    raise RuntimeError("Failed to generate unique customer ID after maximum attempts")
+def new_cust_id() -> str:
+    return new_id("C")
 
 
+@traced("create_customer")
+@timed("service")
 def create_customer(uow: UoW, name: str, email: str) -> CustomerWithId:
     # Create instance first to apply validators (including email normalization)
-    cust_id = new_cust_id(uow)
+    cust_id = new_cust_id()
     customer = CustomerWithId(cust_id=cust_id, name=name, email=email)
-    if uow.customers.exists_email(customer.email):
+    # 一意チェックと保存を不可分に行う(同じ email の同時登録も片方だけ成功)
+    conflict = uow.customers.insert_if_absent(customer)
+    if conflict is None:
+        try:
+            uow.commit()
+        except CommitConflict as e:
+            # 検証後に他のリクエストが先にコミットした
+            conflict = e.conflict
+    if conflict is InsertConflict.EMAIL:
         raise Conflict("EMAIL_DUP", "email already exists")
-
-    uow.customers.save(customer)
-    uow.commit()
+    if conflict is not None:
+        raise RuntimeError(f"customer ID collision: {cust_id}")
     return customer
@@ -1,26 +1,22 @@
-import uuid
+import json
 from datetime import date
-from typing import List, Optional, Tuple
+from typing import Optional
 
+from .core.cache import LruTtlCache
 from .core.errors import Conflict, NotFound
+from .core.ids import new_id
+from .core.timing import timed
+from .core.tracing import traced
 from .ports import UoW
-from .schemas import (
-    OrderCreate,
-    OrderCreateResponse,
-    OrderItemCreateResponse,
-    OrderSummary,
-)
+from .schemas import OrderCreate, OrderCreateResponse, OrderItemCreateResponse
 
 
-def new_order_id(uow: UoW) -> str:
-    max_attempts = 100
-    for _ in range(max_attempts):
-        order_id = f"O_{uuid.uuid4().hex[:8]}"
-        if not uow.orders.exists_id(order_id):
-            return order_id
-    raise RuntimeError("Failed to generate unique order ID after maximum attempts")
+def new_order_id() -> str:
+    return new_id("O")
 
 
+@traced("create_order")
+@timed("service")
 def create_order(
     uow: UoW, payload: OrderCreate, *, today_provider=None
 ) -> OrderCreateResponse:
@@ -37,6 +33,7 @@ def create_order(
 
     seen = set()
     total = 0
+    prods = []
     for it in payload.items:
         if it.prod_id in seen:
             raise Conflict("ITEM_DUP", f"duplicate product line: {it.prod_id}")
@@ -44,14 +41,16 @@ def create_order(
         prod = uow.products.by_id(it.prod_id)
         if not prod:
             raise NotFound("PROD_NOT_FOUND", f"prodId not found: {it.prod_id}")
+        prods.append(prod)
         total += prod.unit_price * it.qty
 
-    order_id = new_order_id(uow)
+    order_id = new_order_id()
+    # 行番号は明細数ぶんをまとめて予約する
+    line_nos = uow.orders.reserve_line_nos(len(payload.items))
     items = []
-    for it in payload.items:
-        prod = uow.products.by_id(it.prod_id)
+    for it, prod, line_no in zip(payload.items, prods, line_nos):
         item = OrderItemCreateResponse(
-            line_no=uow.orders.pop_line_no(),
+            line_no=line_no,
             prod_id=it.prod_id,
             qty=it.qty,
             unit_price=prod.unit_price,
@@ -70,22 +69,47 @@ def create_order(
     return order
 
 
-def search_orders(
+@traced("render_orders_page")
+@timed("service")
+def render_orders_page(
     uow: UoW,
     cust_id: Optional[str],
     from_date: Optional[date],
     to_date: Optional[date],
     page: int,
     size: int,
-) -> Tuple[List[OrderSummary], int]:
-    page_items, total_count = uow.orders.search(cust_id, from_date, to_date, page, size)
+    with_total: bool = True,
+    *,
+    cache: Optional[LruTtlCache[bytes]] = None,
+) -> bytes:
+    """
+    注文一覧レスポンスをJSON(bytes)で返す
+    一覧の各要素は読み取りモデルが持つシリアライズ済みの断片をつなぐだけ
+    with_total=False のときは件数を数えず totalCount を null にする
+    キャッシュにヒットすれば検索もシリアライズも行わない
+    (顧客別の版カウンタが進んでいればミス扱い)
+    同じ条件の同時呼び出しをまとめるのは呼び出し側(イベントループ上の SingleFlight)
+    """
+    key = (cust_id, from_date, to_date, page, size, with_total)
+    # 検索より先に版を読む(途中で save されても古い版で保存されるだけで安全)
+    version = uow.orders.version(cust_id)
+    if cache is not None:
+        cached = cache.get(key, version)
+        if cached is not None:
+            return cached
 
-    summaries = [
-        OrderSummary(
-            order_id=o.order_id,
-            order_date=o.order_date,
-            total_amount=o.total_amount,
-        )
-        for o in page_items
-    ]
-    return summaries, total_count
+    rows, total_count = uow.orders.search(
+        cust_id, from_date, to_date, page, size, with_total
+    )
+    # starlette の JSONResponse.render と同じ形式
+    tail = json.dumps(
+        {"totalCount": total_count, "page": page, "size": size},
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    body = b'{"list":[%s],%s' % (b",".join(r.fragment for r in rows), tail[1:])
+    if cache is not None:
+        cache.put(key, body, version)
+    return body
@@ -1,26 +1,30 @@
-import uuid
-
 from .core.errors import Conflict
-from .ports import UoW
+from .core.ids import new_id
+from .core.timing import timed
+from .core.tracing import traced
+from .ports import CommitConflict, InsertConflict, UoW
 from .schemas import ProductWithId
 
 
-def new_prod_id(uow: UoW) -> str:
-    max_attempts = 100
-    for _ in range(max_attempts):
-        prod_id = f"P_{uuid.uuid4().hex[:8]}"
-        if not uow.products.exists_id(prod_id):
-            return prod_id
-    raise RuntimeError("Failed to generate unique product ID after maximum attempts")
+def new_prod_id() -> str:
+    return new_id("P")
 
 
+@traced("create_product")
+@timed("service")
 def create_product(uow: UoW, name: str, unit_price) -> ProductWithId:
-    name_lower = name.strip().lower()
-    if uow.products.by_name_norm_exists(name_lower):
-        raise Conflict("NAME_DUP", "name already exists")
-    prod_id = new_prod_id(uow)
+    prod_id = new_prod_id()
     product = ProductWithId(prod_id=prod_id, name=name, unit_price=unit_price)
-
-    uow.products.save(product)
-    uow.commit()
+    # 一意チェックと保存を不可分に行う(同じ名前の同時登録も片方だけ成功)
+    conflict = uow.products.insert_if_absent(product)
+    if conflict is None:
+        try:
+            uow.commit()
+        except CommitConflict as e:
+            # 検証後に他のリクエストが先にコミットした
+            conflict = e.conflict
+    if conflict is InsertConflict.NAME:
+        raise Conflict("NAME_DUP", "name already exists")
+    if conflict is not None:
+        raise RuntimeError(f"product ID collision: {prod_id}")
     return product
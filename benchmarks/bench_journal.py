@@ -0,0 +1,77 @@
+"""
+ジャーナルのコミット性能ベンチマーク(fsync 毎回 vs グループコミット)
+
+    python -m benchmarks.bench_journal --threads 1 8 32 --commits 200
+
+結果は1行1件のJSONで標準出力に出す
+"""
+
+import argparse
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.adapters.journal import Journal
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.schemas import CustomerWithId
+
+
+def run(mode: str, threads: int, commits: int, window_ms: float, workdir: Path) -> dict:
+    path = workdir / f"journal-{mode}-{threads}.bin"
+    journal = Journal(str(path), durability=mode, group_window_seconds=window_ms / 1000)
+    store = MemoryStore(journal=journal)
+    start_barrier = threading.Barrier(threads + 1)
+
+    def worker(t: int) -> None:
+        start_barrier.wait()
+        for i in range(commits):
+            tx = MemoryUoW(store)
+            tx.customers.insert_if_absent(
+                CustomerWithId(
+                    cust_id=f"C_{t}_{i}", name="bench", email=f"u{t}_{i}@ex.com"
+                )
+            )
+            tx.commit()
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    journal.close()
+
+    total = threads * commits
+    return {
+        "benchmark": "journal_commit",
+        "mode": mode,
+        "window_ms": window_ms if mode == "group" else 0,
+        "threads": threads,
+        "commits": total,
+        "fsyncs": journal.fsyncs,
+        "seconds": round(elapsed, 6),
+        "commits_per_sec": round(total / elapsed, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--commits", type=int, default=200, help="スレッドあたり")
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--dir", help="ジャーナルを書くディレクトリ(既定: 一時)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for threads in args.threads:
+            for mode in ("per_commit", "group"):
+                result = run(mode, threads, args.commits, args.window_ms, Path(tmp))
+                print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+プロセス内の負荷生成ツール(ネットワーク不要)
+
+    python -m benchmarks.bench_load --concurrency 32 --duration 10
+    python -m benchmarks.bench_load --rate 500 --duration 10 --read-ratio 0.9
+
+app.main.app を httpx の ASGITransport 経由で直接呼ぶ(lifespan はここで起動・停止する)
+- リクエストの配分: 読み取り/書き込みの比率、管理者キー/顧客キーの比率、注文の明細数
+- 負荷のかけ方: 同時実行数を固定(クローズドループ)か、到着レートを固定(オープンループ)
+  オープンループの遅延は予定到着時刻から測る(詰まって送れなかった時間も遅延に含める)
+結果はルートごとのスループットと p50/p95/p99/p999 を1行1件のJSONで標準出力に出す
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+ADMIN_KEY = "admin-api-key"
+
+
+def _setup_env(customers: int) -> List[str]:
+    """app.main を import する前に、顧客ごとのAPIキーを環境変数で用意する"""
+    keys = [f"load-key-{i:06d}" for i in range(customers)]
+    os.environ["API_KEYS"] = ",".join([ADMIN_KEY, *keys])
+    os.environ.setdefault("API_KEY_HASH_SECRET", "load-secret")
+    os.environ.setdefault("TESTING", "true")
+    return keys
+
+
+class Lifespan:
+    """ASGI の lifespan プロトコルでアプリを起動・停止する"""
+
+    def __init__(self, app):
+        self._app = app
+        self._receive: asyncio.Queue = asyncio.Queue()
+        self._send: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    async def _call(self, event: str) -> None:
+        await self._receive.put({"type": f"lifespan.{event}"})
+        message = await self._send.get()
+        if message["type"] != f"lifespan.{event}.complete":
+            raise RuntimeError(f"lifespan {event} failed: {message}")
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(
+            self._app(
+                {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+                self._receive.get,
+                self._send.put,
+            )
+        )
+        await self._call("startup")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._call("shutdown")
+        await self._task
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """最近傍順位法(samples は昇順)"""
+    if not samples:
+        return 0.0
+    rank = max(int(len(samples) * p / 100 + 0.999999) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def add(self, route: str, seconds: float, status: int) -> None:
+        self.latencies[route].append(seconds)
+        self.statuses[route][status] += 1
+        if status >= 400:
+            self.errors[route] += 1
+
+    def report(self, elapsed: float) -> List[Dict[str, Any]]:
+        rows = []
+        routes = sorted(self.latencies)
+        everything = [x for r in routes for x in self.latencies[r]]
+        for route, samples in [
+            *((r, self.latencies[r]) for r in routes),
+            ("all", everything),
+        ]:
+            samples = sorted(samples)
+            row: Dict[str, Any] = {
+                "benchmark": "load",
+                "route": route,
+                "requests": len(samples),
+                "errors": (
+                    sum(self.errors.values()) if route == "all" else self.errors[route]
+                ),
+                "throughput_rps": round(len(samples) / elapsed, 1),
+            }
+            for name, p in (("p50", 50), ("p95", 95), ("p99", 99), ("p999", 99.9)):
+                row[f"{name}_ms"] = round(percentile(samples, p) * 1000, 3)
+            row["max_ms"] = round(samples[-1] * 1000, 3) if samples else 0.0
+            if route != "all":
+                row["statuses"] = {str(k): v for k, v in self.statuses[route].items()}
+            rows.append(row)
+        return rows
+
+
+class Workload:
+    """リクエストの配分(乱数は seed で固定できる)"""
+
+    def __init__(self, args, keys: List[str], cust_ids: Dict[str, str], products):
+        self.args = args
+        self.keys = keys
+        self.cust_ids = cust_ids
+        self.products = products
+        self.rnd = random.Random(args.seed)
+
+    def next_request(self) -> Tuple[str, str, str, Dict[str, Any]]:
+        """(ルート名, メソッド, パス, httpx の引数)"""
+        a, rnd = self.args, self.rnd
+        admin = rnd.random() < a.admin_ratio
+        key = ADMIN_KEY if admin else rnd.choice(self.keys)
+        who = "admin" if admin else "customer"
+        headers = {"X-API-KEY": key}
+        if rnd.random() < a.read_ratio:
+            params: Dict[str, Any] = {"page": rnd.randrange(a.max_page + 1), "size": 20}
+            if a.range_days:
+                to = date.today()
+                params["from"] = (to - timedelta(days=a.range_days)).isoformat()
+                params["to"] = to.isoformat()
+            return (
+                f"GET /orders ({who})",
+                "GET",
+                "/orders",
+                {"params": params, "headers": headers},
+            )
+        n = rnd.choice(a.items)
+        cust_id = self.cust_ids[rnd.choice(self.keys) if admin else key]
+        body = {
+            "custId": cust_id,
+            "items": [
+                {"prodId": p, "qty": rnd.randint(1, 5)}
+                for p in rnd.sample(self.products, n)
+            ],
+        }
+        return (
+            f"POST /orders ({who}, {n} items)",
+            "POST",
+            "/orders",
+            {"json": body, "headers": headers},
+        )
+
+
+async def _setup(
+    client, keys: List[str], n_products: int
+) -> Tuple[Dict[str, str], List[str]]:
+    """商品と、キーごとの顧客(キーにバインドされる)をアプリ経由で作る"""
+    products = []
+    for i in range(n_products):
+        r = await client.post(
+            "/products",
+            json={"name": f"Load item {i}", "unitPrice": 100 + i},
+            headers={"X-API-KEY": ADMIN_KEY},
+        )
+        r.raise_for_status()
+        products.append(r.json()["prodId"])
+    cust_ids = {}
+    for i, key in enumerate(keys):
+        r = await client.post(
+            "/customers",
+            json={"name": f"Load user {i}", "email": f"load{i}@ex.com"},
+            headers={"X-API-KEY": key},
+        )
+        r.raise_for_status()
+        cust_ids[key] = r.json()["custId"]
+    return cust_ids, products
+
+
+async def _send(
+    client, workload: Workload, recorder: Recorder, scheduled: float
+) -> None:
+    route, method, path, kwargs = workload.next_request()
+    r = await client.request(method, path, **kwargs)
+    recorder.add(route, time.perf_counter() - scheduled, r.status_code)
+
+
+async def closed_loop(client, workload, recorder, concurrency: int, deadline: float):
+    """各ワーカーが応答を受け取ったらすぐ次を送る"""
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            await _send(client, workload, recorder, time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(
+    client, workload, recorder, rate: float, deadline: float, poisson: bool
+):
+    """応答を待たずに、決まった到着レートで送る"""
+    rnd = random.Random(workload.args.seed + 1)
+    tasks = set()
+    scheduled = time.perf_counter()
+    while scheduled < deadline:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(_send(client, workload, recorder, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        scheduled += rnd.expovariate(rate) if poisson else 1 / rate
+    await asyncio.gather(*tasks)
+
+
+async def run(args) -> List[Dict[str, Any]]:
+    import httpx
+
+    keys = _setup_env(args.customers)
+    from app.main import app, limiter
+
+    # 既定ではレート制限を外してアプリ本体の性能を測る
+    limiter.enabled = args.rate_limit
+    async with Lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load"
+        ) as client:
+            cust_ids, products = await _setup(client, keys, args.products)
+            workload = Workload(args, keys, cust_ids, products)
+            recorder = Recorder()
+            started = time.perf_counter()
+            deadline = started + args.duration
+            if args.rate:
+                await open_loop(
+                    client, workload, recorder, args.rate, deadline, args.poisson
+                )
+            else:
+                await closed_loop(
+                    client, workload, recorder, args.concurrency, deadline
+                )
+            elapsed = time.perf_counter() - started
+    mode = (
+        {"mode": "open", "rate": args.rate, "poisson": args.poisson}
+        if args.rate
+        else {"mode": "closed", "concurrency": args.concurrency}
+    )
+    return [{**mode, **row} for row in recorder.report(elapsed)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10.0, help="秒")
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="クローズドループの同時実行数"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="オープンループの到着レート(req/s)"
+    )
+    parser.add_argument(
+        "--poisson", action="store_true", help="到着間隔を指数分布にする"
+    )
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    parser.add_argument("--admin-ratio", type=float, default=0.1)
+    parser.add_argument(
+        "--items",
+        type=int,
+        nargs="+",
+        default=[1, 5, 20],
+        help="注文の明細数(一様に選ぶ)",
+    )
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--max-page", type=int, default=3)
+    parser.add_argument(
+        "--range-days", type=int, default=0, help="検索の日付範囲(0 は指定なし)"
+    )
+    parser.add_argument(
+        "--rate-limit", action="store_true", help="レート制限を有効のまま測る"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if max(args.items) > args.products:
+        parser.error("--items must not exceed --products")
+
+    for row in asyncio.run(run(args)):
+        print(json.dumps(row, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+メトリクス記録のオーバーヘッド
+
+    python -m benchmarks.bench_metrics
+
+- counter_inc / histogram_observe: 記録1回あたりの時間
+- metrics_middleware / timing_middleware / slow_request_middleware:
+  何もしない ASGI アプリを各ミドルウェアあり・なしで呼び、1リクエストあたりの差
+  (overhead_us)を出す(slow_request はしきい値未満で記録しない場合)
+- tracing_middleware: サンプリング率 0(既定)の場合
+- tracing_middleware_sampled: 全件記録する場合(スパンは一時ファイルへ書き出す)
+結果は1行1件のJSONで標準出力に出す
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict
+
+from app.core.metrics import MetricsMiddleware, Registry
+from app.core.slowlog import SlowRequestLog, SlowRequestMiddleware
+from app.core.timing import TimingMiddleware
+from app.core.tracing import SpanExporter, Tracer, TracingMiddleware
+
+
+class _Route:
+    path = "/orders/{order_id}"
+
+
+async def _app(scope, receive, send):
+    """ルーティング済みの体で 200 を返すだけのアプリ"""
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+def _per_op_ns(fn, n: int) -> float:
+    fn()
+    started = time.perf_counter_ns()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter_ns() - started) / n
+
+
+async def _per_request_ns(app, n: int) -> float:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/orders/O_1",
+        "headers": [(b"x-api-key", b"bench-key")],
+    }
+    await app(dict(scope), _receive, _send)
+    started = time.perf_counter_ns()
+    for _ in range(n):
+        await app(dict(scope), _receive, _send)
+    return (time.perf_counter_ns() - started) / n
+
+
+def bench_record(n: int) -> Dict:
+    reg = Registry()
+    counter = reg.counter("c_total", "c", ("route",))
+    hist = reg.histogram("h_seconds", "h", ("method", "route", "status"))
+    labels = ("GET", "/orders", "200")
+    return {
+        "benchmark": "metrics_record",
+        "ops": n,
+        "counter_inc_ns": round(_per_op_ns(lambda: counter.inc(("/orders",)), n), 1),
+        "histogram_observe_ns": round(
+            _per_op_ns(lambda: hist.observe(0.0042, labels), n), 1
+        ),
+    }
+
+
+def bench_middleware(name: str, wrapped, n: int, rounds: int) -> Dict:
+    async def run():
+        # 交互に測って最小値を取る(CPU の周波数変動などの影響を減らす)
+        bare, metered = [], []
+        for _ in range(rounds):
+            bare.append(await _per_request_ns(_app, n))
+            metered.append(await _per_request_ns(wrapped, n))
+        return min(bare), min(metered)
+
+    bare, metered = asyncio.run(run())
+    return {
+        "benchmark": name,
+        "requests": n * rounds,
+        "bare_us": round(bare / 1000, 3),
+        "wrapped_us": round(metered / 1000, 3),
+        "overhead_us": round((metered - bare) / 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(bench_record(args.ops)), flush=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        exporter = SpanExporter(os.path.join(tmp, "traces.jsonl"))
+        for name, wrapped in (
+            ("metrics_middleware", MetricsMiddleware(_app)),
+            ("timing_middleware", TimingMiddleware(_app, is_admin=lambda key: False)),
+            ("slow_request_middleware", SlowRequestMiddleware(_app, SlowRequestLog())),
+            ("tracing_middleware", TracingMiddleware(_app, Tracer(exporter))),
+            (
+                "tracing_middleware_sampled",
+                TracingMiddleware(_app, Tracer(exporter, sample_rate=1.0)),
+            ),
+        ):
+            print(
+                json.dumps(bench_middleware(name, wrapped, args.requests, args.rounds)),
+                flush=True,
+            )
+        exporter.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+サービス・リポジトリ・認証のマイクロベンチマーク
+
+    python -m benchmarks.bench_micro --sizes 1000 100000 1000000
+    python -m benchmarks.bench_micro --sizes 1000 --only render_orders_page
+
+保存済みの注文件数ごとにストアを作り、各処理を1回ずつ計測する
+(create_* は1回ごとにコミットまで行うので、計測中も件数は少しずつ増える)
+require_api_key は注文件数に依存しないので、キー数ごとに1回だけ測る
+結果は1行1件のJSONで標準出力に出す(commit を付けるのでコミット間で比べられる)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.core import auth
+from app.schemas import (
+    CustomerWithId,
+    OrderCreate,
+    OrderCreateResponse,
+    OrderItemCreate,
+    OrderItemCreateResponse,
+    OrderSummary,
+    ProductWithId,
+)
+from app.services_customers import create_customer
+from app.services_orders import create_order, render_orders_page
+from app.services_products import create_product
+
+MONTHS = 36
+ORDERS_PER_CUSTOMER = 100
+PRODUCTS = 100
+# 注文の1割を持つ大口顧客
+BIG_CUSTOMER = "C_0"
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def measure(fn: Callable[[], object], min_time: float, max_ops: int) -> Dict:
+    """min_time 秒(または max_ops 回)まで fn を繰り返し、1回あたりの時間を返す"""
+    fn()  # 初回の展開・キャッシュ作成は計測しない
+    samples: List[int] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_ops and time.perf_counter() < deadline:
+        t = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - t)
+    samples.sort()
+    n = len(samples)
+    mean = sum(samples) / n
+    return {
+        "ops": n,
+        "mean_us": round(mean / 1000, 3),
+        "p50_us": round(samples[n // 2] / 1000, 3),
+        "p95_us": round(samples[min(n * 95 // 100, n - 1)] / 1000, 3),
+        "min_us": round(samples[0] / 1000, 3),
+        "ops_per_sec": round(1e9 / mean, 1),
+    }
+
+
+def populate(n: int) -> tuple[MemoryStore, date, date]:
+    """
+    n 件の注文を MONTHS か月に散らして保存したストアを作る
+    (検証済みの値なので model_construct で組み立てて時間を節約する)
+    """
+    store = MemoryStore()
+    customers = max(n // ORDERS_PER_CUSTOMER, 10)
+    for c in range(customers):
+        store.customers.save(
+            CustomerWithId.model_construct(
+                cust_id=f"C_{c}", name=f"User {c}", email=f"u{c}@ex.com"
+            )
+        )
+    for p in range(PRODUCTS):
+        store.products.save(
+            ProductWithId.model_construct(
+                prod_id=f"P_{p}", name=f"Item {p}", unit_price=100
+            )
+        )
+    last = date.today().replace(day=1) - timedelta(days=1)
+    first = last - timedelta(days=MONTHS * 30)
+    span = (last - first).days + 1
+    for k in range(n):
+        # 古い日付から順に保存する(古い月は凍結される)
+        d = first + timedelta(days=k * span // n)
+        cust_id = BIG_CUSTOMER if k % 10 == 0 else f"C_{k % customers}"
+        item = OrderItemCreateResponse.model_construct(
+            line_no=k + 1, prod_id="P_1", qty=1, unit_price=100, line_amount=100
+        )
+        order = OrderCreateResponse.model_construct(
+            order_id=f"O_{k:016x}", order_date=d, total_amount=100, items=[item]
+        )
+        store.orders.save(order, cust_id)
+    store.orders.reserve_line_nos(n)
+    return store, first, last
+
+
+def _ranges(first: date, last: date) -> Dict[str, tuple]:
+    mid = first + (last - first) / 2
+    return {
+        "all": (None, None),
+        "year": (last - timedelta(days=364), last),
+        "month": (last - timedelta(days=29), last),
+        "day": (mid, mid),
+    }
+
+
+def bench_store(n: int, min_time: float, max_ops: int, only: List[str]) -> Iterator:
+    started = time.perf_counter()
+    store, first, last = populate(n)
+    yield {
+        "benchmark": "populate",
+        "orders": n,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+    def run(name: str, fn: Callable[[], object], **params) -> Optional[Dict]:
+        if only and not any(name.startswith(o) for o in only):
+            return None
+        return {
+            "benchmark": name,
+            "orders": n,
+            **params,
+            **measure(fn, min_time, max_ops),
+        }
+
+    results: List[Optional[Dict]] = []
+    for who, cust_id in (("admin", None), ("customer", BIG_CUSTOMER), ("small", "C_1")):
+        for range_name, (frm, to) in _ranges(first, last).items():
+            for page in (0, 10):
+                # キャッシュなしで、検索とシリアライズを毎回行う
+                results.append(
+                    run(
+                        "render_orders_page",
+                        lambda c=cust_id, f=frm, t=to, p=page: render_orders_page(
+                            MemoryUoW(store), c, f, t, p, 20
+                        ),
+                        who=who,
+                        range=range_name,
+                        page=page,
+                        size=20,
+                    )
+                )
+
+    # 一覧レスポンスのシリアライズ(断片の連結 / モデル経由)
+    uow = MemoryUoW(store)
+    for size in (20, 100):
+        results.append(
+            run(
+                "serialize_orders_page",
+                lambda s=size: render_orders_page(uow, None, None, None, 0, s),
+                path="fragments",
+                size=size,
+            )
+        )
+
+        def via_models(s: int = size) -> bytes:
+            rows, total = uow.orders.search(None, None, None, 0, s)
+            items = [
+                OrderSummary(
+                    order_id=r.order_id,
+                    order_date=r.order_date,
+                    total_amount=r.total_amount,
+                )
+                for r in rows
+            ]
+            return JSONResponse(
+                {
+                    "list": [i.model_dump(by_alias=True, mode="json") for i in items],
+                    "totalCount": total,
+                    "page": 0,
+                    "size": s,
+                }
+            ).body
+
+        results.append(
+            run("serialize_orders_page", via_models, path="models", size=size)
+        )
+
+    seq = iter(range(10**9))
+
+    def new_customer() -> None:
+        i = next(seq)
+        create_customer(MemoryUoW(store), f"Bench {i}", f"bench{i}@ex.com")
+
+    def new_product() -> None:
+        create_product(MemoryUoW(store), f"Bench item {next(seq)}", 100)
+
+    # 書き込みは読み取りの後に測る(作った注文が検索対象の月に混ざらないように)
+    results.append(run("create_customer", new_customer))
+    results.append(run("create_product", new_product))
+    for items in (1, 10, 100):
+        body = OrderCreate(
+            cust_id="C_1",
+            items=[OrderItemCreate(prod_id=f"P_{p}", qty=1) for p in range(items)],
+        )
+        results.append(
+            run(
+                "create_order",
+                lambda body=body: create_order(MemoryUoW(store), body),
+                items=items,
+            )
+        )
+
+    # 注文登録レスポンスのシリアライズ
+    for items in (1, 10, 100):
+        order = create_order(
+            MemoryUoW(store),
+            OrderCreate(
+                cust_id="C_1",
+                items=[OrderItemCreate(prod_id=f"P_{p}", qty=1) for p in range(items)],
+            ),
+        )
+        results.append(
+            run(
+                "serialize_order",
+                lambda o=order: JSONResponse(
+                    o.model_dump(by_alias=True, mode="json")
+                ).body,
+                items=items,
+            )
+        )
+    yield from (r for r in results if r is not None)
+
+
+def _drive(coro) -> object:
+    """await しないコルーチンをイベントループなしで最後まで進める"""
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError("coroutine awaited unexpectedly")
+
+
+def bench_auth(keys: int, min_time: float, max_ops: int) -> Dict:
+    """有効なキーが keys 個あるときの require_api_key(成功時)"""
+    saved = {
+        k: os.environ.get(k) for k in ("API_KEY", "API_KEYS", "API_KEY_HASH_SECRET")
+    }
+    valid = [f"bench-key-{i:08d}" for i in range(keys)]
+    os.environ.pop("API_KEY", None)
+    os.environ["API_KEYS"] = ",".join(valid)
+    os.environ["API_KEY_HASH_SECRET"] = "bench-secret"
+    try:
+        auth.init_api_key()
+        auth.initialize_api_keys()
+        request = Request(
+            {"type": "http", "headers": [], "client": ("127.0.0.1", 50000)}
+        )
+        picks = iter(range(10**9))
+
+        def call() -> None:
+            # 毎回別のキー(集合の走査位置がばらけるように)
+            _drive(auth.require_api_key(request, valid[next(picks) * 7919 % keys]))
+
+        return {
+            "benchmark": "require_api_key",
+            "keys": keys,
+            **measure(call, min_time, max_ops),
+        }
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--keys", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--min-time", type=float, default=0.2, help="ケースごとの秒数")
+    parser.add_argument("--max-ops", type=int, default=100_000)
+    parser.add_argument(
+        "--only", nargs="*", default=[], help="ベンチマーク名の前方一致で絞り込む"
+    )
+    args = parser.parse_args()
+
+    commit = _git_rev()
+
+    def emit(result: Dict) -> None:
+        print(json.dumps({"commit": commit, **result}), flush=True)
+
+    if not args.only or any("require_api_key".startswith(o) for o in args.only):
+        for keys in args.keys:
+            emit(bench_auth(keys, args.min_time, args.max_ops))
+    for n in args.sizes:
+        for result in bench_store(n, args.min_time, args.max_ops, args.only):
+            emit(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+スナップショットからの起動時間ベンチマーク
+
+    python -m benchmarks.bench_startup --sizes 100000 1000000 10000000
+
+件数ごとに合成したスナップショットを書き、MemoryStore を開くまでの時間と
+最初のリクエスト(顧客の注文一覧1ページ + 注文1件 + 顧客1件)までの時間を測る
+続けて、スナップショットの月への最初の書き込み(コミット1回)と、その月の
+全体一覧(管理者の検索)の最初の1ページの時間を測る
+結果は1行1件のJSONで標準出力に出す
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterator, List, Tuple
+
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.adapters.order_partition import month_key
+from app.adapters.snapshot import SnapshotState, encode_days, encode_row, write_snapshot
+from app.schemas import OrderCreateResponse
+
+MONTHS = 36
+ORDERS_PER_CUSTOMER = 100
+_FIRST_MONTH = month_key(date(2023, 1, 1))
+_ORDER = (
+    '{"order_id":"%s","order_date":"%s","total_amount":100,"items":[{"line_no":%d,'
+    '"prod_id":"P_1","qty":1,"unit_price":100,"line_amount":100}]}'
+)
+
+
+def _order_id(k: int) -> str:
+    return f"O_{k:016x}"
+
+
+def synth_state(n: int) -> SnapshotState:
+    """n 件の注文を MONTHS か月・n/ORDERS_PER_CUSTOMER 人の顧客に均等に散らす"""
+    customers = max(n // ORDERS_PER_CUSTOMER, 1)
+    counts: Dict[str, Dict[int, int]] = defaultdict(dict)
+    counts_all: Dict[int, int] = defaultdict(int)
+
+    def month_rows(m: int, first: int, last: int) -> Iterator[Tuple[str, List[bytes]]]:
+        year, mon = divmod(_FIRST_MONTH + m, 12)
+        groups: Dict[int, List[bytes]] = defaultdict(list)
+        for k in range(last - 1, first - 1, -1):
+            c = k % customers
+            d = date(year, mon + 1, 28 - (k - first) * 28 // (last - first))
+            groups[c].append(
+                encode_row(
+                    _order_id(k),
+                    f"C_{c}",
+                    (_ORDER % (_order_id(k), d.isoformat(), k + 1)).encode(),
+                )
+            )
+            o = d.toordinal()
+            days = counts[f"C_{c}"]
+            days[o] = days.get(o, 0) + 1
+            counts_all[o] += 1
+        for c, lines in groups.items():
+            # 月内は古い順に採番しているので、逆順にすると日付降順になる
+            yield f"C_{c}", lines
+
+    def months() -> Iterator:
+        per_month = -(-n // MONTHS)
+        for m in range(MONTHS):
+            first, last = m * per_month, min((m + 1) * per_month, n)
+            if first < last:
+                yield _FIRST_MONTH + m, month_rows(m, first, last)
+
+    def customer_rows() -> Iterator[Tuple[str, bytes]]:
+        for c in range(customers):
+            yield f"C_{c}", json.dumps(
+                {"cust_id": f"C_{c}", "name": f"User {c}", "email": f"u{c}@ex.com"}
+            ).encode()
+
+    def count_rows() -> Iterator[Tuple[str, bytes]]:
+        # 件数は月の行を書き終えてから確定する(write_snapshot は月を先に書く)
+        for c, days in counts.items():
+            yield c, encode_days(days)
+
+    return SnapshotState(
+        version=n,
+        line_no=n + 1,
+        journal_offset=0,
+        customers=customer_rows(),
+        emails=((f"u{c}@ex.com", f"C_{c}".encode()) for c in range(customers)),
+        products=iter([("P_1", b'{"prod_id":"P_1","name":"Pen","unit_price":100}')]),
+        names=iter([("pen", b"P_1")]),
+        months=months(),
+        counts=count_rows(),
+        counts_all=counts_all,
+    )
+
+
+def run(n: int, workdir: str) -> dict:
+    path = os.path.join(workdir, f"state-{n}.snap")
+    started = time.perf_counter()
+    write_snapshot(path, synth_state(n))
+    written = time.perf_counter()
+
+    store = MemoryStore(snapshot_path=path)
+    opened = time.perf_counter()
+    items, total = store.orders.search("C_0", None, None, 0, 20)
+    store.orders.by_id(_order_id(n // 2))
+    store.customers.by_id("C_0")
+    first_request = time.perf_counter()
+
+    # 最初の月の月末に1件足す(スナップショットの月への最初の書き込み)
+    year, mon = divmod(_FIRST_MONTH, 12)
+    day = date(year, mon + 1, 28)
+    tx = MemoryUoW(store)
+    tx.orders.save(
+        OrderCreateResponse.model_validate_json(_ORDER % (_order_id(n), day, n + 1)),
+        "C_0",
+    )
+    tx.commit()
+    first_write = time.perf_counter()
+    admin_items, _ = store.orders.search(None, day, day, 0, 20)
+    first_admin_read = time.perf_counter()
+
+    result = {
+        "benchmark": "snapshot_startup",
+        "orders": n,
+        "file_bytes": os.path.getsize(path),
+        "write_seconds": round(written - started, 3),
+        "open_seconds": round(opened - written, 6),
+        "first_request_seconds": round(first_request - opened, 6),
+        "time_to_first_request_seconds": round(first_request - written, 6),
+        "first_write_seconds": round(first_write - first_request, 6),
+        "first_admin_read_seconds": round(first_admin_read - first_write, 6),
+        "first_page_rows": len(items),
+        "customer_total": total,
+        "admin_page_rows": len(admin_items),
+    }
+    os.remove(path)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000]
+    )
+    parser.add_argument("--dir", help="スナップショットを書くディレクトリ(既定: 一時)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for n in args.sizes:
+            print(json.dumps(run(n, tmp)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
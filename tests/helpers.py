@@ -1,6 +1,10 @@
+from datetime import date
+
 from httpx import Response
 from starlette.testclient import TestClient
 
+from app.schemas import OrderCreateResponse, OrderItemCreateResponse
+
 
 def post_json(
     client: TestClient, path: str, payload: dict, *, api_key: str | None = None
@@ -13,3 +17,21 @@ def post_json(
         response.status_code < 500
     ), f"5xx from {path}: {response.status_code}, {response.text}"
     return response
+
+
+def make_order(i: int, d: date, amount: int = 100) -> OrderCreateResponse:
+    """リポジトリ直叩き用の1明細の注文"""
+    return OrderCreateResponse(
+        order_id=f"O_{i:08x}",
+        order_date=d,
+        total_amount=amount,
+        items=[
+            OrderItemCreateResponse(
+                line_no=i + 1,
+                prod_id="P_1",
+                qty=1,
+                unit_price=amount,
+                line_amount=amount,
+            )
+        ],
+    )
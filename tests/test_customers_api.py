@@ -28,7 +28,7 @@ def test_create_customer_ok(client):
     assert response.status_code == 201
     assert "Location" in response.headers
     body = response.json()
-    assert re.fullmatch(r"C_[0-9a-f]{8}", body["custId"])
+    assert re.fullmatch(r"C_[0-9a-f]{16}", body["custId"])
     assert body["name"] == "Alice"
     assert body["email"] == "a@example.com"
 
@@ -30,3 +30,44 @@ def test_many_parallel_posts(client):
         data = result.json()
         assert data["name"] == f"U{i}"
         assert data["email"] == f"u{i}@ex.com"
+
+
+@pytest.mark.timeout(30)
+def test_parallel_posts_with_same_email_create_one_customer(client):
+    def _post(client, i):
+        return post_json(
+            client,
+            "/customers",
+            {"name": f"U{i}", "email": "same@ex.com"},
+            api_key="test-secret",
+        )
+
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        results = list(ex.map(_post, repeat(client), range(50)))
+
+    codes = sorted(r.status_code for r in results)
+    assert codes == [201] + [409] * 49
+    assert all(
+        r.json()["detail"]["code"] == "EMAIL_DUP"
+        for r in results
+        if r.status_code == 409
+    )
+
+
+def test_insert_if_absent_reports_conflict():
+    from app.adapters.memory_uow import MemoryUoW
+    from app.ports import InsertConflict
+    from app.schemas import CustomerWithId, ProductWithId
+
+    uow = MemoryUoW()
+    c = CustomerWithId(cust_id="C_1", name="A", email="a@ex.com")
+    assert uow.customers.insert_if_absent(c) is None
+    assert uow.customers.insert_if_absent(c) is InsertConflict.ID
+    dup = CustomerWithId(cust_id="C_2", name="B", email="A@EX.com")
+    assert uow.customers.insert_if_absent(dup) is InsertConflict.EMAIL
+    assert not uow.customers.exists_id("C_2")
+
+    p = ProductWithId(prod_id="P_1", name="Pen", unit_price=100)
+    assert uow.products.insert_if_absent(p) is None
+    dup = ProductWithId(prod_id="P_2", name=" pen ", unit_price=100)
+    assert uow.products.insert_if_absent(dup) is InsertConflict.NAME
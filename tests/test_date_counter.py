@@ -0,0 +1,71 @@
+import random
+from datetime import date, timedelta
+
+from app.adapters.date_counter import DateCounter
+
+
+def _naive_count(days, frm, to):
+    return sum(1 for d in days if (frm is None or d >= frm) and (to is None or d <= to))
+
+
+def test_count_matches_naive_filter():
+    rng = random.Random(0)
+    start = date(2023, 1, 1)
+    days = [start + timedelta(days=rng.randrange(0, 1000)) for _ in range(500)]
+    counter = DateCounter()
+    for d in days:
+        counter.add(d)
+
+    assert counter.count() == len(days)
+    for _ in range(200):
+        frm = start + timedelta(days=rng.randrange(-10, 1010))
+        to = frm + timedelta(days=rng.randrange(0, 300))
+        assert counter.count(frm, to) == _naive_count(days, frm, to)
+        assert counter.count(frm, None) == _naive_count(days, frm, None)
+        assert counter.count(None, to) == _naive_count(days, None, to)
+
+
+def test_grows_in_both_directions():
+    counter = DateCounter()
+    d = date(2025, 10, 6)
+    counter.add(d)
+    counter.add(d - timedelta(days=400))  # 過去方向
+    counter.add(d + timedelta(days=400))  # 未来方向
+
+    assert counter.count() == 3
+    assert counter.count(d, d) == 1
+    assert counter.count(None, d - timedelta(days=1)) == 1
+    assert counter.count(d + timedelta(days=1), None) == 1
+    assert counter.count(date(2000, 1, 1), date(2000, 12, 31)) == 0
+
+
+def test_sparse_customer_keeps_memory_proportional_to_orders():
+    counter = DateCounter()
+    start = date(2000, 1, 1)
+    days = [start + timedelta(days=i * 365) for i in range(20)]
+    for d in days:
+        counter.add(d)
+    # 20年に20件なら木を作らず、日付の種類数ぶんの配列だけ
+    assert counter._size == 0 and len(counter._ords) == 20
+    assert counter.count(days[3], days[10]) == 8
+    assert counter.count(None, start - timedelta(days=1)) == 0
+
+
+def test_switches_to_tree_when_dense_and_back_when_sparse():
+    rng = random.Random(1)
+    start = date(2025, 1, 1)
+    days = [start + timedelta(days=rng.randrange(0, 300)) for _ in range(2000)]
+    counter = DateCounter()
+    for d in days:
+        counter.add(d)
+    assert counter._size > 0
+    assert DateCounter.from_days(counter.days()).days() == counter.days()
+
+    far = start + timedelta(days=365 * 50)
+    counter.add(far)  # 期間が広がってまばらになったら配列に戻る
+    days.append(far)
+    assert counter._size == 0
+    for _ in range(100):
+        frm = start + timedelta(days=rng.randrange(-10, 310))
+        to = frm + timedelta(days=rng.randrange(0, 20000))
+        assert counter.count(frm, to) == _naive_count(days, frm, to)
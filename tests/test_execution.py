@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.execution import ExecutionPolicy
+
+
+@pytest.fixture
+def policy():
+    policy = ExecutionPolicy(max_workers=1)
+    try:
+        yield policy
+    finally:
+        policy.shutdown()
+
+
+def test_light_work_runs_inline_and_heavy_work_in_pool(policy):
+    async def main():
+        inline = await policy.run(threading.get_ident, heavy=False)
+        pooled = await policy.run(threading.get_ident, heavy=True)
+        return threading.get_ident(), inline, pooled
+
+    loop_thread, inline, pooled = asyncio.run(main())
+    assert inline == loop_thread
+    assert pooled != loop_thread
+    assert policy.stats()["completed"] == 1
+
+
+def test_queue_depth_counts_waiting_tasks(policy):
+    release = threading.Event()
+
+    async def main():
+        tasks = [
+            asyncio.ensure_future(policy.run_heavy(release.wait, 2)) for _ in range(3)
+        ]
+        while policy.stats()["running"] == 0:
+            await asyncio.sleep(0.001)
+        depth = policy.queue_depth()
+        release.set()
+        await asyncio.gather(*tasks)
+        return depth
+
+    assert asyncio.run(main()) == 2
+    stats = policy.stats()
+    assert stats["queued"] == 0 and stats["running"] == 0
+    assert stats["peak_queued"] >= 2
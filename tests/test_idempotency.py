@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import LruTtlCache
+from app.core.errors import BadRequest, Conflict
+from app.core.idempotency import IdempotencyStore, StoredResponse
+from tests.helpers import post_json
+
+ADMIN = "test-secret"
+
+
+def _post(client, path, payload, key, api_key=ADMIN):
+    return client.post(
+        path,
+        json=payload,
+        headers={"X-API-KEY": api_key, "Idempotency-Key": key},
+    )
+
+
+def _order_payload(client):
+    cust = post_json(
+        client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=ADMIN
+    ).json()
+    prod = post_json(
+        client, "/products", {"name": "Pen", "unitPrice": 100}, api_key=ADMIN
+    ).json()
+    return {"custId": cust["custId"], "items": [{"prodId": prod["prodId"], "qty": 2}]}
+
+
+def test_retried_order_is_created_once(client):
+    payload = _order_payload(client)
+
+    first = _post(client, "/orders", payload, "k-1")
+    retry = _post(client, "/orders", payload, "k-1")
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.content == first.content
+    assert retry.headers["Location"] == first.headers["Location"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    listed = client.get("/orders", headers={"X-API-KEY": ADMIN}).json()
+    assert listed["totalCount"] == 1
+
+
+def test_without_key_each_post_creates(client):
+    payload = _order_payload(client)
+    post_json(client, "/orders", payload, api_key=ADMIN)
+    post_json(client, "/orders", payload, api_key=ADMIN)
+    listed = client.get("/orders", headers={"X-API-KEY": ADMIN}).json()
+    assert listed["totalCount"] == 2
+
+
+def test_key_reused_with_different_body(client):
+    r1 = _post(client, "/products", {"name": "Pen", "unitPrice": 100}, "k-1")
+    r2 = _post(client, "/products", {"name": "Ink", "unitPrice": 100}, "k-1")
+    assert r1.status_code == 201
+    assert r2.status_code == 409
+    assert r2.json()["detail"]["code"] == "IDEMPOTENCY_KEY_REUSED"
+
+
+def test_keys_are_scoped_per_api_key(client):
+    r1 = _post(client, "/customers", {"name": "A", "email": "a@ex.com"}, "k-1")
+    r2 = _post(
+        client,
+        "/customers",
+        {"name": "A", "email": "b@ex.com"},
+        "k-1",
+        api_key="new-test-key",
+    )
+    assert r1.status_code == r2.status_code == 201
+    assert r1.json()["custId"] != r2.json()["custId"]
+
+
+def test_customer_replay_after_key_is_bound(client):
+    payload = {"name": "A", "email": "a@ex.com"}
+    first = _post(client, "/customers", payload, "k-1", api_key="new-test-key")
+    # バインド済みでも、同じキーの再送には作成時のレスポンスを返す
+    retry = _post(client, "/customers", payload, "k-1", api_key="new-test-key")
+    assert retry.status_code == 201 and retry.content == first.content
+    other = _post(client, "/customers", payload, "k-2", api_key="new-test-key")
+    assert other.status_code == 403
+
+
+def test_failures_are_not_stored(client):
+    payload = {"custId": "C_404", "items": [{"prodId": "P_x", "qty": 1}]}
+    assert _post(client, "/orders", payload, "k-1").status_code == 404
+    assert _post(client, "/orders", payload, "k-1").status_code == 404
+
+
+def test_concurrent_duplicates_share_one_execution():
+    store = IdempotencyStore(LruTtlCache(sizeof=lambda r: len(r.body)))
+    calls = 0
+
+    async def execute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return StoredResponse(201, b'{"id":1}')
+
+    async def main():
+        return await asyncio.gather(
+            *(store.run("scope", "k", "fp", execute) for _ in range(5))
+        )
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert {r.body for r, _ in results} == {b'{"id":1}'}
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert store.stats()["waits"] == 4
+
+
+def test_waiters_retry_after_leader_fails():
+    store = IdempotencyStore(LruTtlCache(sizeof=lambda r: len(r.body)))
+    calls = 0
+
+    async def execute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        if calls == 1:
+            raise Conflict("EMAIL_DUP", "email already exists")
+        return StoredResponse(201, b"{}")
+
+    async def main():
+        return await asyncio.gather(
+            *(store.run("scope", "k", "fp", execute) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert isinstance(results[0], Conflict)
+    assert calls == 2
+    assert all(r[0].body == b"{}" for r in results[1:])
+
+
+def test_invalid_key_length():
+    store = IdempotencyStore(LruTtlCache(sizeof=lambda r: len(r.body)))
+
+    async def execute():
+        return StoredResponse(201, b"{}")
+
+    with pytest.raises(BadRequest) as e:
+        asyncio.run(store.run("scope", "x" * 256, "fp", execute))
+    assert e.value.status_code == 400
@@ -0,0 +1,47 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.ids import SEQ_BITS, IdAllocator
+
+
+class _Clock:
+    def __init__(self, now=1_760_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_ids_are_unique_across_threads():
+    alloc = IdAllocator(block_size=16)
+
+    def take(_):
+        return [alloc.new_id("C") for _ in range(500)]
+
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        ids = [i for chunk in ex.map(take, range(8)) for i in chunk]
+
+    assert len(ids) == len(set(ids)) == 4000
+    assert all(re.fullmatch(r"C_[0-9a-f]{16}", i) for i in ids)
+
+
+def test_ids_follow_clock_order():
+    clock = _Clock()
+    alloc = IdAllocator(block_size=4, clock=clock)
+
+    first = [alloc.new_id("O") for _ in range(10)]  # ブロックを跨いでも単調増加
+    clock.now += 0.001
+    later = alloc.new_id("O")
+
+    assert first == sorted(first)
+    assert later > first[-1]
+    # 新しいミリ秒の先頭から払い出される
+    assert int(later[2:], 16) & ((1 << SEQ_BITS) - 1) == 0
+
+
+def test_counter_never_goes_below_previous_values():
+    clock = _Clock()
+    alloc = IdAllocator(block_size=4, clock=clock)
+    before = alloc.new_id("P")
+    clock.now -= 10  # 時計が戻っても重複しない
+    assert alloc.new_id("P") > before
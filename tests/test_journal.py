@@ -0,0 +1,200 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from app.adapters.journal import Journal, JournalFailed
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.ports import CommitConflict
+from app.schemas import CustomerWithId
+from tests.helpers import make_order, post_json
+
+
+def _commit_customer(store, i):
+    tx = MemoryUoW(store)
+    tx.customers.insert_if_absent(
+        CustomerWithId(cust_id=f"C_{i}", name=f"U{i}", email=f"u{i}@ex.com")
+    )
+    tx.commit()
+
+
+def test_committed_state_survives_restart(tmp_path):
+    path = str(tmp_path / "journal.bin")
+    store = MemoryStore(journal=Journal(path))
+    _commit_customer(store, 1)
+    tx = MemoryUoW(store)
+    tx.orders.save(make_order(7, date(2025, 10, 1)), "C_1")
+    tx.commit()
+    aborted = MemoryUoW(store)
+    aborted.customers.save(CustomerWithId(cust_id="C_x", name="X", email="x@ex.com"))
+    aborted.rollback()
+    store.journal.close()
+
+    restored = MemoryStore(journal=Journal(path))
+    assert restored.customers.exists_email("u1@ex.com")
+    assert not restored.customers.exists_id("C_x")
+    items, total = restored.orders.search("C_1", None, None, 0, 10)
+    assert total == 1 and items[0].order_id == make_order(7, date.today()).order_id
+    # 再生した行番号の続きから払い出す
+    assert restored.orders.pop_line_no() == 9
+    assert restored.version == 2
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = str(tmp_path / "journal.bin")
+    store = MemoryStore(journal=Journal(path))
+    _commit_customer(store, 1)
+    store.journal.close()
+    with open(path, "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")  # 書きかけのレコード
+
+    journal = Journal(path)
+    restored = MemoryStore(journal=journal)
+    assert restored.customers.exists_id("C_1")
+    _commit_customer(restored, 2)
+    journal.close()
+
+    again = MemoryStore(journal=Journal(path))
+    assert again.customers.exists_id("C_1") and again.customers.exists_id("C_2")
+
+
+def test_group_commit_shares_fsync(tmp_path):
+    journal = Journal(str(tmp_path / "journal.bin"), group_window_seconds=0.02)
+    store = MemoryStore(journal=journal)
+    threads = [
+        threading.Thread(target=_commit_customer, args=(store, i)) for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert journal.appends == 8
+    assert journal.fsyncs < 8
+    assert all(store.customers.exists_id(f"C_{i}") for i in range(8))
+
+
+def test_commit_is_visible_only_after_fsync(tmp_path, monkeypatch):
+    journal = Journal(str(tmp_path / "journal.bin"))
+    store = MemoryStore(journal=journal)
+    wait_durable = journal.wait_durable
+    started, release = threading.Event(), threading.Event()
+
+    def slow_wait(lsn):
+        started.set()
+        release.wait(2)
+        wait_durable(lsn)
+
+    monkeypatch.setattr(journal, "wait_durable", slow_wait)
+    t = threading.Thread(target=_commit_customer, args=(store, 1))
+    t.start()
+    assert started.wait(2)
+    # 永続化前は見えないが、同じ email の挿入は予約に当たって失敗する
+    assert not store.customers.exists_id("C_1")
+    dup = MemoryUoW(store)
+    dup.customers.insert_if_absent(
+        CustomerWithId(cust_id="C_2", name="U", email="U1@ex.com")
+    )
+    with pytest.raises(CommitConflict):
+        dup.commit()
+    release.set()
+    t.join()
+    assert store.customers.exists_id("C_1")
+    assert store._pending == {}
+
+
+def test_snapshot_during_fsync_wait_replays_the_waiting_commit(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "journal.bin")
+    snap = str(tmp_path / "state.snap")
+    journal = Journal(journal_path)
+    store = MemoryStore(journal=journal)
+    _commit_customer(store, 0)
+    wait_durable = journal.wait_durable
+    started, release = threading.Event(), threading.Event()
+
+    def slow_wait(lsn):
+        started.set()
+        release.wait(2)
+        wait_durable(lsn)
+
+    monkeypatch.setattr(journal, "wait_durable", slow_wait)
+    t = threading.Thread(target=_commit_customer, args=(store, 1))
+    t.start()
+    assert started.wait(2)
+    # 追記済み・未反映のコミットはスナップショットに含まれず、位置もその手前
+    store.save_snapshot(snap)
+    release.set()
+    t.join()
+    assert store.customers.exists_id("C_1")
+    journal.close()
+
+    restored = MemoryStore(journal=Journal(journal_path), snapshot_path=snap)
+    assert restored.customers.exists_id("C_0") and restored.customers.exists_id("C_1")
+    assert restored.version == 2
+    restored.journal.close()
+
+
+def test_per_commit_fsync_runs_outside_the_store_locks(tmp_path, monkeypatch):
+    import app.adapters.journal as mod
+
+    journal = Journal(str(tmp_path / "journal.bin"), durability="per_commit")
+    store = MemoryStore(journal=journal)
+    fsync = mod.os.fsync
+    readable = []
+
+    def checking_fsync(fd):
+        # ストアのロックを持ったままなら、別スレッドの読み取りは終わらない
+        reader = threading.Thread(target=store.customers.exists_id, args=("C_x",))
+        reader.start()
+        reader.join(1)
+        readable.append(not reader.is_alive())
+        fsync(fd)
+
+    monkeypatch.setattr(mod.os, "fsync", checking_fsync)
+    for i in range(3):
+        _commit_customer(store, i)
+    assert readable == [True, True, True]
+    assert journal.fsyncs == 3
+
+
+def test_failed_fsync_applies_nothing_and_stops_the_journal(tmp_path, monkeypatch):
+    import app.adapters.journal as mod
+
+    journal = Journal(str(tmp_path / "journal.bin"), group_window_seconds=0)
+    store = MemoryStore(journal=journal)
+
+    def broken_fsync(fd):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(mod.os, "fsync", broken_fsync)
+    with pytest.raises(JournalFailed):
+        _commit_customer(store, 1)
+    assert not store.customers.exists_id("C_1")
+    assert store._pending == {}
+    # 失敗後の fsync は信用できないので、以後のコミットは追記の前に失敗する
+    with pytest.raises(JournalFailed):
+        _commit_customer(store, 2)
+
+
+def test_app_groups_fsyncs_of_concurrent_writes(tmp_path, monkeypatch, client):
+    from app.deps import get_store, reset_uow_for_tests
+
+    monkeypatch.setenv("JOURNAL_PATH", str(tmp_path / "journal.bin"))
+    monkeypatch.setenv("JOURNAL_GROUP_WINDOW_MS", "20")
+    reset_uow_for_tests()
+    journal = get_store().journal
+
+    def post(i):
+        return post_json(
+            client,
+            "/products",
+            {"name": f"P{i}", "unitPrice": 100},
+            api_key="test-secret",
+        )
+
+    with ThreadPoolExecutor(max_workers=20) as ex:
+        results = list(ex.map(post, range(20)))
+    assert all(r.status_code == 201 for r in results)
+    assert journal.appends == 20
+    assert journal.fsyncs < journal.appends
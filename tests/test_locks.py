@@ -0,0 +1,70 @@
+import threading
+import time
+
+from app.adapters.memory_uow import MemoryStore
+from app.core.locks import (
+    LOCK_CONTENDED,
+    LOCK_HOLD_SECONDS,
+    LOCK_WAIT_SECONDS,
+    InstrumentedLock,
+    make_lock,
+)
+from app.core.metrics import REGISTRY
+
+
+def _count(hist, name):
+    row = hist.values()[(name,)]
+    return sum(row[:-1])
+
+
+def test_disabled_by_default_returns_plain_rlock(monkeypatch):
+    monkeypatch.delenv("LOCK_METRICS", raising=False)
+    assert type(make_lock("x")) is type(threading.RLock())
+    monkeypatch.setenv("LOCK_METRICS", "true")
+    assert isinstance(make_lock("x"), InstrumentedLock)
+
+
+def test_reentrant_acquire_counts_once():
+    REGISTRY.clear()
+    lock = InstrumentedLock("t-reentrant")
+    with lock:
+        with lock:
+            pass
+    assert _count(LOCK_WAIT_SECONDS, "t-reentrant") == 1
+    assert _count(LOCK_HOLD_SECONDS, "t-reentrant") == 1
+    assert ("t-reentrant",) not in LOCK_CONTENDED.values()
+
+
+def test_contention_records_wait_and_hold():
+    REGISTRY.clear()
+    lock = InstrumentedLock("t-contended")
+    held = threading.Event()
+
+    def holder():
+        with lock:
+            held.set()
+            time.sleep(0.05)
+
+    t = threading.Thread(target=holder)
+    t.start()
+    held.wait()
+    with lock:
+        pass
+    t.join()
+
+    assert LOCK_CONTENDED.values()[("t-contended",)] == 1
+    wait = LOCK_WAIT_SECONDS.values()[("t-contended",)]
+    hold = LOCK_HOLD_SECONDS.values()[("t-contended",)]
+    assert wait[-1] > 0.01  # 合計(秒)
+    assert hold[-1] > 0.04
+
+
+def test_store_locks_are_named(monkeypatch):
+    REGISTRY.clear()
+    monkeypatch.setenv("LOCK_METRICS", "true")
+    store = MemoryStore()
+    store.customers.exists_email("a@ex.com")
+    store.orders.search(None, None, None, 0, 20)
+    text = REGISTRY.render()
+    assert 'lock_hold_seconds_count{lock="customers"} 1' in text
+    assert 'lock_hold_seconds_count{lock="orders"}' in text
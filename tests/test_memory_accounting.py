@@ -0,0 +1,96 @@
+import sys
+from datetime import date
+
+from app.adapters.memory_uow import MemoryStore
+from app.adapters.order_partition import month_key
+from app.core.memsize import deep_sizeof, estimate, head
+from app.schemas import CustomerWithId
+from tests.helpers import make_order, post_json
+
+
+def test_deep_sizeof_counts_shared_objects_once():
+    s = "x" * 1000
+    assert deep_sizeof([s]) == sys.getsizeof([s]) + sys.getsizeof(s)
+    assert deep_sizeof([s, s]) == sys.getsizeof([s, s]) + sys.getsizeof(s)
+    assert deep_sizeof(make_order(1, date(2025, 1, 1))) > 500
+
+
+def test_estimate_from_sample_is_close_to_full_size():
+    data = {f"key-{i:06d}": [f"value-{i}"] * 3 for i in range(5000)}
+    full = sys.getsizeof(data) + sum(
+        deep_sizeof(k) + deep_sizeof(v) for k, v in data.items()
+    )
+    est = estimate(data, len(data), head(data.items(), 50))
+    assert est["entries"] == 5000
+    assert abs(est["bytes"] - full) / full < 0.1
+
+
+def test_store_memory_covers_each_structure():
+    store = MemoryStore()
+    for c in range(10):
+        store.customers.save(
+            CustomerWithId(cust_id=f"C_{c}", name=f"U{c}", email=f"u{c}@ex.com")
+        )
+    for i in range(300):
+        store.orders.save(make_order(i, date(2025, 1 + i % 6, 1)), f"C_{i % 10}")
+    # 古い月は凍結済み(タプル)、新しい月は書き込み可能(リスト)の両方を含める
+    store.orders.freeze_before(month_key(date(2025, 4, 1)))
+
+    usage = store.memory(sample=20)
+    assert usage["customers.by_id"]["entries"] == 10
+    assert usage["customers.by_email"]["entries"] == 10
+    assert usage["orders.by_id"]["entries"] == 300
+    assert usage["orders.partitions.rows"]["entries"] == 300
+    # (月, 顧客) の組は i % 30 で決まるので 30 通り
+    assert usage["orders.partitions.by_custid"]["entries"] == 30
+    assert usage["orders.counts"]["entries"] == 10
+    # 注文全体(明細つき)は一覧の行より大きい
+    assert usage["orders.by_id"]["bytes"] > usage["orders.partitions.rows"]["bytes"]
+
+
+def test_store_memory_covers_archived_segment_indexes(tmp_path):
+    store = MemoryStore(archive_dir=str(tmp_path / "archive"))
+    for i in range(300):
+        store.orders.save(make_order(i, date(2025, 1 + i % 6, 1)), f"C_{i % 10}")
+    assert store.orders.archive_before(month_key(date(2025, 4, 1))) == 3
+
+    usage = store.memory(sample=20)
+    # 退避した3か月ぶんの索引: 1か月50件なので各1ブロック、顧客は各月5人
+    assert usage["orders.segments.blocks"]["entries"] == 3
+    assert usage["orders.segments.customers"]["entries"] == 15
+    assert usage["orders.segments.blocks"]["bytes"] > 0
+    assert usage["orders.partitions.rows"]["entries"] == 150
+    assert usage["orders.versions"]["entries"] == 10
+
+
+def test_memory_endpoint_is_admin_only(client):
+    key = "test-secret"
+    post_json(client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=key)
+    r = client.get("/admin/memory", params={"sample": 10}, headers={"X-API-KEY": key})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["sample"] == 10
+    for name in (
+        "customers.by_id",
+        "orders.by_id",
+        "auth.api_key_to_customer",
+        "auth.failed_attempts",
+        "auth.blocked_ips",
+        "cache.orders",
+        "cache.idempotency",
+    ):
+        assert name in body["structures"]
+    assert body["structures"]["customers.by_id"]["entries"] == 1
+    assert body["totalBytes"] == sum(s["bytes"] for s in body["structures"].values())
+
+    assert (
+        client.get(
+            "/admin/memory", params={"sample": 0}, headers={"X-API-KEY": key}
+        ).status_code
+        == 400
+    )
+    post_json(
+        client, "/customers", {"name": "B", "email": "b@ex.com"}, api_key="new-test-key"
+    )
+    r = client.get("/admin/memory", headers={"X-API-KEY": "new-test-key"})
+    assert r.status_code == 403
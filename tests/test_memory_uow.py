@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.ports import CommitConflict, InsertConflict
+from app.schemas import CustomerWithId, ProductWithId
+from tests.helpers import make_order
+
+
+def _customer(i: int, email: str | None = None) -> CustomerWithId:
+    return CustomerWithId(cust_id=f"C_{i}", name=f"U{i}", email=email or f"u{i}@ex.com")
+
+
+def test_changes_are_invisible_until_commit():
+    store = MemoryStore()
+    tx = MemoryUoW(store)
+    tx.customers.save(_customer(1))
+    tx.orders.save(make_order(1, date(2025, 10, 1)), "C_1")
+
+    # 自分の変更セットは読めるが、他のトランザクションからは見えない
+    assert tx.customers.exists_id("C_1")
+    assert not MemoryUoW(store).customers.exists_id("C_1")
+    assert store.orders.search(None, None, None, 0, 10) == ([], 0)
+
+    tx.commit()
+    assert MemoryUoW(store).customers.exists_id("C_1")
+    assert store.orders.search(None, None, None, 0, 10)[1] == 1
+    assert store.version == 1
+
+
+def test_rollback_discards_changes():
+    store = MemoryStore()
+    tx = MemoryUoW(store)
+    tx.customers.save(_customer(1))
+    tx.rollback()
+    tx.commit()
+
+    assert not store.customers.exists_id("C_1")
+    assert store.version == 0
+
+
+def test_conflicting_commit_applies_nothing():
+    store = MemoryStore()
+    tx1 = MemoryUoW(store)
+    tx2 = MemoryUoW(store)
+    assert tx1.customers.insert_if_absent(_customer(1)) is None
+    assert (
+        tx1.products.insert_if_absent(
+            ProductWithId(prod_id="P_1", name="Pen", unit_price=1)
+        )
+        is None
+    )
+    assert (
+        tx2.products.insert_if_absent(
+            ProductWithId(prod_id="P_2", name="pen", unit_price=1)
+        )
+        is None
+    )
+    tx2.commit()
+
+    with pytest.raises(CommitConflict) as e:
+        tx1.commit()
+    assert e.value.conflict is InsertConflict.NAME
+    # 同じ変更セットの顧客も反映されない
+    assert not store.customers.exists_id("C_1")
+    assert store.products.exists_id("P_2") and not store.products.exists_id("P_1")
+
+
+def test_conflicts_inside_one_change_set_are_detected():
+    tx = MemoryUoW(MemoryStore())
+    assert tx.customers.insert_if_absent(_customer(1, "a@ex.com")) is None
+    assert (
+        tx.customers.insert_if_absent(_customer(2, "A@ex.com")) is InsertConflict.EMAIL
+    )
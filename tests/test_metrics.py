@@ -0,0 +1,105 @@
+import re
+import threading
+
+import pytest
+
+from app.core.metrics import REGISTRY, Registry
+from tests.helpers import post_json
+
+
+def _value(text: str, series: str) -> float:
+    """render() の出力から1系列の値を取る(なければ 0)"""
+    for line in text.splitlines():
+        name, _, value = line.rpartition(" ")
+        if name == series:
+            return float(value)
+    return 0.0
+
+
+def test_registry_merges_threads_and_renders_histogram():
+    reg = Registry()
+    hits = reg.counter("hits_total", "hits", ("kind",))
+    latency = reg.histogram("latency_seconds", "latency", buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            hits.inc(("a",))
+        latency.observe(0.05)
+        latency.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latency.observe(2.0)
+
+    text = reg.render()
+    assert "# TYPE hits_total counter" in text
+    assert _value(text, 'hits_total{kind="a"}') == 4000
+    # バケットは累積で出る
+    assert _value(text, 'latency_seconds_bucket{le="0.1"}') == 4
+    assert _value(text, 'latency_seconds_bucket{le="1"}') == 8
+    assert _value(text, 'latency_seconds_bucket{le="+Inf"}') == 9
+    assert _value(text, "latency_seconds_count") == 9
+    assert _value(text, "latency_seconds_sum") == pytest.approx(4 * 0.55 + 2.0)
+
+
+def test_metrics_endpoint_reports_routes_auth_and_sizes(client):
+    REGISTRY.clear()
+    ck = "test-secret"
+    post_json(client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=ck)
+    post_json(client, "/products", {"name": "Pen", "unitPrice": 100}, api_key=ck)
+    for _ in range(2):
+        assert client.get("/orders", headers={"X-API-KEY": ck}).status_code == 200
+    assert client.get("/orders", headers={"X-API-KEY": "wrong"}).status_code == 401
+
+    r = client.get("/metrics", headers={"X-API-KEY": ck})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    # パスではなくルートのテンプレートで数える
+    assert (
+        _value(
+            text,
+            'http_request_duration_seconds_count{method="GET",route="/orders",status="200"}',
+        )
+        == 2
+    )
+    assert (
+        _value(
+            text,
+            'http_request_duration_seconds_count{method="GET",route="/orders",status="401"}',
+        )
+        == 1
+    )
+    assert _value(text, 'auth_failures_total{reason="invalid_key"}') == 1
+    assert _value(text, 'repository_size{kind="customers"}') == 1
+    assert _value(text, 'repository_size{kind="products"}') == 1
+    assert "# TYPE exec_pool_queue_depth gauge" in text
+    assert _value(text, "exec_pool_queue_depth") == 0
+    assert _value(text, "exec_pool_active_workers") == 0
+    # /metrics 自身の処理中の分だけ
+    assert _value(text, "http_requests_in_flight") == 1
+    assert re.search(r"^# TYPE http_request_duration_seconds histogram$", text, re.M)
+
+
+def test_metrics_requires_admin_key(client):
+    r = post_json(
+        client, "/customers", {"name": "B", "email": "b@ex.com"}, api_key="new-test-key"
+    )
+    assert r.status_code == 201
+    assert (
+        client.get("/metrics", headers={"X-API-KEY": "new-test-key"}).status_code == 403
+    )
+    assert client.get("/metrics").status_code == 401
+
+
+def test_rate_limit_rejections_are_counted(client_with_rate_limit):
+    REGISTRY.clear()
+    for _ in range(11):
+        client_with_rate_limit.get("/health")
+    text = client_with_rate_limit.get(
+        "/metrics", headers={"X-API-KEY": "test-secret"}
+    ).text
+    assert _value(text, 'rate_limit_rejections_total{route="/health"}') == 1
@@ -0,0 +1,132 @@
+from datetime import date
+
+from app.adapters.memory_uow import MemoryStore
+from app.adapters.order_archive import OrderArchiver
+from app.adapters.order_partition import month_key
+from tests.helpers import make_order
+
+_DATES = [
+    date(2025, 1, 3),
+    date(2025, 1, 20),
+    date(2025, 2, 14),
+    date(2025, 3, 1),
+    date(2025, 6, 30),
+]
+
+
+def _fill(store):
+    for i, d in enumerate(_DATES):
+        store.orders.save(make_order(i, d, amount=100 + i), f"C_{i % 2}")
+
+
+def _snapshot(orders):
+    return [
+        [o.order_id for o in orders.search(cust_id, frm, to, 0, 10)[0]]
+        for cust_id in (None, "C_0", "C_1")
+        for frm, to in ((None, None), (date(2025, 1, 10), date(2025, 2, 28)))
+    ]
+
+
+def test_archived_orders_are_still_found(tmp_path):
+    store = MemoryStore(archive_dir=str(tmp_path))
+    _fill(store)
+    before = _snapshot(store.orders)
+
+    assert store.orders.archive_before(month_key(date(2025, 4, 1))) == 3
+    assert len(list(tmp_path.glob("*.seg"))) == 3
+    # ホット側に残るのは6月の1件のみ
+    assert len(store.orders._by_id) == 1
+
+    assert _snapshot(store.orders) == before
+    o = store.orders.by_id(make_order(1, _DATES[1]).order_id)
+    assert o is not None and o.order_date == _DATES[1] and o.total_amount == 101
+    assert store.orders.exists_id(make_order(0, _DATES[0]).order_id)
+    assert store.orders.search(None, None, None, 0, 10)[1] == len(_DATES)
+
+
+def test_write_to_archived_month_restores_it(tmp_path):
+    store = MemoryStore(archive_dir=str(tmp_path))
+    _fill(store)
+    store.orders.archive_before(month_key(date(2025, 4, 1)))
+
+    store.orders.save(make_order(99, date(2025, 1, 25)), "C_0")
+
+    items, total = store.orders.search(
+        "C_0", date(2025, 1, 1), date(2025, 1, 31), 0, 10
+    )
+    assert total == 2
+    assert [o.order_date for o in items] == [date(2025, 1, 25), date(2025, 1, 3)]
+    assert len(list(tmp_path.glob("*.seg"))) == 2
+
+
+def test_archiver_run_once_uses_age(tmp_path):
+    store = MemoryStore(archive_dir=str(tmp_path))
+    _fill(store)
+    archiver = OrderArchiver(
+        store.orders,
+        after_days=60,
+        interval_seconds=3600,
+        today_provider=lambda: date(2025, 7, 1),
+    )
+    # 2025-05-02 より前の月(1〜4月)が退避対象
+    assert archiver.run_once() == 3
+    assert archiver.run_once() == 0
+
+
+def test_archive_disabled_without_directory():
+    store = MemoryStore()
+    _fill(store)
+    assert store.orders.archive_before(month_key(date(2030, 1, 1))) == 0
+
+
+def test_index_keeps_id_ranges_per_block_instead_of_every_id(tmp_path):
+    store = MemoryStore(archive_dir=str(tmp_path))
+    for i in range(600):
+        store.orders.save(make_order(i, date(2025, 1, 1 + i % 28)), f"C_{i % 7}")
+    store.orders.save(make_order(999, date(2025, 6, 1)), "C_0")
+    store.orders.archive_before(month_key(date(2025, 2, 1)))
+
+    segment = store.orders._partitions[month_key(date(2025, 1, 1))].segment
+    assert len(segment) == 600 and len(segment._blocks) == 3
+    assert not hasattr(store.orders, "_archived_ids")
+    for i in (0, 255, 256, 599):
+        o = store.orders.by_id(make_order(i, date(2025, 1, 1)).order_id)
+        assert o is not None and o.items[0].line_no == i + 1
+    assert store.orders.by_id("O_ffffffff") is None
+    assert not store.orders.exists_id("O_ffffffff")
+
+
+def test_restore_defers_close_until_readers_finish(tmp_path):
+    store = MemoryStore(archive_dir=str(tmp_path))
+    _fill(store)
+    store.orders.archive_before(month_key(date(2025, 4, 1)))
+    segment = store.orders._partitions[month_key(_DATES[0])].segment
+
+    segment.acquire()  # ロック外で読んでいる検索の代わり
+    store.orders.save(make_order(99, date(2025, 1, 25)), "C_0")  # 月を戻す
+    assert segment.get(make_order(0, _DATES[0]).order_id) is not None
+    segment.release()
+    assert segment._mm.closed
+
+
+def test_write_during_archiving_keeps_month_in_memory(tmp_path, monkeypatch):
+    import app.adapters.memory_uow as mod
+
+    store = MemoryStore(archive_dir=str(tmp_path))
+    _fill(store)
+    write_segment = mod.write_segment
+
+    def write_with_concurrent_save(path, month, rows):
+        write_segment(path, month, rows)
+        if month == month_key(_DATES[0]):
+            # 書き込み中に解凍・書き込みされ、また凍結される
+            store.orders.save(make_order(99, date(2025, 1, 25)), "C_0")
+            store.orders.freeze_before(month_key(date(2025, 4, 1)))
+
+    monkeypatch.setattr(mod, "write_segment", write_with_concurrent_save)
+    assert store.orders.archive_before(month_key(date(2025, 4, 1))) == 2
+    assert not store.orders._partitions[month_key(_DATES[0])].archived
+    items, total = store.orders.search(
+        "C_0", date(2025, 1, 1), date(2025, 1, 31), 0, 10
+    )
+    assert total == 2 and len(items) == 2
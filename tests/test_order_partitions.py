@@ -0,0 +1,59 @@
+import random
+from datetime import date, timedelta
+
+from app.adapters.memory_uow import MemoryStore
+from app.adapters.order_partition import month_key
+from tests.helpers import make_order
+
+
+def _naive(saved, cust_id, frm, to):
+    rows = [
+        o
+        for o, c in saved
+        if (cust_id is None or c == cust_id)
+        and (frm is None or o.order_date >= frm)
+        and (to is None or o.order_date <= to)
+    ]
+    return sorted(rows, key=lambda o: (o.order_date, o.order_id), reverse=True)
+
+
+def test_search_across_partitions_matches_full_scan():
+    rng = random.Random(1)
+    store = MemoryStore(hot_months=2)
+    saved = []
+    start = date(2024, 1, 1)
+    for i in range(300):
+        o = make_order(i, start + timedelta(days=rng.randrange(0, 600)))
+        cust_id = f"C_{rng.randrange(5)}"
+        store.orders.save(o, cust_id)
+        saved.append((o, cust_id))
+
+    for _ in range(100):
+        cust_id = rng.choice([None, "C_0", "C_3", "C_missing"])
+        frm = rng.choice([None, start + timedelta(days=rng.randrange(0, 600))])
+        to = rng.choice([None, start + timedelta(days=rng.randrange(0, 600))])
+        page, size = rng.randrange(0, 4), rng.choice([1, 7, 20])
+        items, total = store.orders.search(cust_id, frm, to, page, size)
+
+        expected = _naive(saved, cust_id, frm, to)
+        assert total == len(expected)
+        # 同日内は注文IDの降順
+        want = expected[page * size : (page + 1) * size]
+        assert [o.order_id for o in items] == [o.order_id for o in want]
+
+
+def test_old_partitions_are_frozen_and_thawed_on_write():
+    store = MemoryStore(hot_months=2)
+    orders = store.orders
+    for i, d in enumerate([date(2025, 1, 5), date(2025, 2, 5), date(2025, 3, 5)]):
+        orders.save(make_order(i, d), "C_1")
+
+    assert orders._partitions[month_key(date(2025, 1, 1))].frozen
+    assert not orders._partitions[month_key(date(2025, 2, 1))].frozen
+    assert not orders._partitions[month_key(date(2025, 3, 1))].frozen
+
+    # 凍結済みの月への書き込みも検索できる
+    orders.save(make_order(9, date(2025, 1, 20)), "C_1")
+    items, total = orders.search("C_1", date(2025, 1, 1), date(2025, 1, 31), 0, 10)
+    assert total == 2
+    assert [o.order_date for o in items] == [date(2025, 1, 20), date(2025, 1, 5)]
@@ -0,0 +1,121 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.adapters.memory_uow import MemoryStore
+from app.adapters.order_partition import month_bounds, month_key
+from app.ports import OrderSummaryRow
+from tests.helpers import make_order
+
+ADMIN = "test-secret"
+
+
+def _fill(store, n=400, seed=7):
+    rnd = random.Random(seed)
+    expected = []
+    start = date(2024, 1, 1)
+    for i in range(n):
+        d = start + timedelta(days=rnd.randrange(540))
+        # 顧客 C_0 に偏らせる(大口顧客)
+        cust_id = "C_0" if rnd.random() < 0.6 else f"C_{rnd.randrange(1, 20)}"
+        o = make_order(i, d)
+        store.orders.save(o, cust_id)
+        expected.append((cust_id, OrderSummaryRow.of(o)))
+    return expected
+
+
+def _reference(expected, cust_id, frm, to, page, size):
+    rows = sorted(
+        (
+            r
+            for c, r in expected
+            if (cust_id is None or c == cust_id)
+            and (frm is None or r.order_date >= frm)
+            and (to is None or r.order_date <= to)
+        ),
+        reverse=True,
+    )
+    return rows[page * size : (page + 1) * size], len(rows)
+
+
+@pytest.mark.parametrize("archive", [False, True])
+def test_search_matches_reference(tmp_path, archive):
+    store = MemoryStore(hot_months=2, archive_dir=str(tmp_path / "archive"))
+    expected = _fill(store)
+    if archive:
+        store.orders.archive_before(month_key(date(2024, 9, 1)))
+
+    rnd = random.Random(1)
+    for _ in range(200):
+        cust_id = rnd.choice([None, "C_0", "C_3", "C_404"])
+        frm = date(2024, 1, 1) + timedelta(days=rnd.randrange(560))
+        to = frm + timedelta(days=rnd.choice([0, 3, 40, 400]))
+        frm = rnd.choice([None, frm])
+        page, size = rnd.randrange(6), rnd.choice([1, 5, 20])
+        got = store.orders.search(cust_id, frm, to, page, size)
+        assert got == _reference(expected, cust_id, frm, to, page, size)
+
+
+def test_plan_skips_months_without_touching_partitions():
+    store = MemoryStore()
+    store.orders.save(make_order(1, date(2024, 1, 5)), "C_1")
+    for i in range(30):
+        store.orders.save(make_order(100 + i, date(2024, 6, 1 + i)), "C_0")
+    store.orders.save(make_order(2, date(2024, 12, 5)), "C_1")
+
+    plan = store.orders.explain("C_1", None, None, 0, 10)
+    paths = {s["month"]: s["path"] for s in plan["steps"]}
+    # C_1 の注文がない6月はパーティションを読まない
+    assert paths["2024-06"] == "skip_empty"
+    # 凍結済みの1月は索引、書き込み中の12月は走査
+    assert paths["2024-01"] == "customer_index"
+    assert paths["2024-12"] == "customer_scan"
+
+    # 2ページ目は12月(10件未満)を件数だけで読み飛ばす
+    plan = store.orders.explain(None, None, None, 1, 10)
+    steps = {s["month"]: s for s in plan["steps"]}
+    assert steps["2024-12"]["path"] == "skip_offset"
+    assert steps["2024-06"]["offset"] == 9 and steps["2024-06"]["limit"] == 10
+
+
+def test_narrow_range_uses_index_on_frozen_partition():
+    store = MemoryStore(hot_months=1)
+    for i in range(300):
+        store.orders.save(make_order(i, date(2024, 3, 1 + i % 31)), "C_0")
+    store.orders.save(make_order(999, date(2024, 9, 1)), "C_0")  # 3月を凍結する
+
+    plan = store.orders.explain("C_0", date(2024, 3, 10), date(2024, 3, 10), 0, 5)
+    (step,) = [s for s in plan["steps"] if s["limit"]]
+    assert step["path"] == "customer_index"
+    assert step["cost"] < step["alternatives"]["customer_scan"]
+    items, total = store.orders.search(
+        "C_0", date(2024, 3, 10), date(2024, 3, 10), 0, 5
+    )
+    assert total == 10 and [r.order_date for r in items] == [date(2024, 3, 10)] * 5
+
+
+def test_month_bounds():
+    assert month_bounds(month_key(date(2024, 2, 10))) == (
+        date(2024, 2, 1),
+        date(2024, 2, 29),
+    )
+    assert month_bounds(month_key(date(2024, 12, 31))) == (
+        date(2024, 12, 1),
+        date(2024, 12, 31),
+    )
+
+
+def test_explain_endpoint_only_in_debug_mode(client, monkeypatch):
+    import app.main as main_mod
+
+    headers = {"X-API-KEY": ADMIN}
+
+    r = client.get("/orders", params={"explain": "true"}, headers=headers)
+    assert r.status_code == 400
+    assert r.json()["detail"]["code"] == "EXPLAIN_DISABLED"
+
+    monkeypatch.setattr(main_mod, "DEBUG", True)
+    r = client.get("/orders", params={"explain": "true"}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()["custId"] is None and r.json()["steps"] == []
@@ -0,0 +1,66 @@
+import json
+from datetime import date
+
+from starlette.responses import JSONResponse
+
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.adapters.order_partition import month_key
+from app.ports import OrderSummaryRow
+from app.schemas import OrderSummary
+from app.services_orders import render_orders_page
+from tests.helpers import make_order
+
+
+def test_fragment_matches_order_summary_json():
+    o = make_order(1, date(2025, 1, 3), amount=1234)
+    row = OrderSummaryRow.of(o)
+    summary = OrderSummary(
+        order_id=o.order_id, order_date=o.order_date, total_amount=o.total_amount
+    )
+    assert json.loads(row.fragment) == summary.model_dump(by_alias=True, mode="json")
+
+
+def test_rendered_page_matches_model_serialization():
+    store = MemoryStore()
+    for i, d in enumerate([date(2025, 1, 3), date(2025, 2, 1), date(2025, 2, 9)]):
+        store.orders.save(make_order(i, d), "C_1")
+    uow = MemoryUoW(store)
+
+    for with_total in (True, False):
+        body = render_orders_page(uow, "C_1", None, None, 0, 2, with_total)
+        rows, total = uow.orders.search("C_1", None, None, 0, 2, with_total)
+        items = [
+            OrderSummary(
+                order_id=r.order_id,
+                order_date=r.order_date,
+                total_amount=r.total_amount,
+            )
+            for r in rows
+        ]
+        expected = JSONResponse(
+            {
+                "list": [i.model_dump(by_alias=True, mode="json") for i in items],
+                "totalCount": total,
+                "page": 0,
+                "size": 2,
+            }
+        ).body
+        assert body == expected
+
+
+def test_archive_months_loaded_from_snapshot(tmp_path):
+    path = str(tmp_path / "state.snap")
+    store = MemoryStore()
+    for i, d in enumerate([date(2025, 1, 3), date(2025, 1, 9), date(2025, 6, 1)]):
+        store.orders.save(make_order(i, d), f"C_{i % 2}")
+    store.save_snapshot(path)
+
+    restored = MemoryStore(archive_dir=str(tmp_path / "archive"), snapshot_path=path)
+    # 1月は書き込みでメモリ上のパーティションへ移る(注文全体は書き込みモデルにない)
+    restored.orders.save(make_order(7, date(2025, 1, 20)), "C_0")
+    before = restored.orders.search(None, None, None, 0, 10)
+
+    assert restored.orders.archive_before(month_key(date(2025, 7, 1))) == 2
+    assert restored.orders.search(None, None, None, 0, 10) == before
+    o = restored.orders.by_id(make_order(1, date(2025, 1, 9)).order_id)
+    assert o is not None and o.items[0].line_no == 2
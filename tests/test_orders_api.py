@@ -1,6 +1,8 @@
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 
+from app.adapters.memory_uow import MemoryUoW
 from tests.helpers import post_json
 
 
@@ -28,7 +30,7 @@ def test_create_order_ok(client):
     r = post_json(client, "/orders", od, api_key=ck)
     assert r.status_code == 201
     body = r.json()
-    assert re.fullmatch(r"O_[0-9a-f]{8}", body["orderId"])
+    assert re.fullmatch(r"O_[0-9a-f]{16}", body["orderId"])
     assert body["orderDate"] == today.strftime("%Y-%m-%d")
     assert body["totalAmount"] == 2 * 100 + 1 * 250
     assert isinstance(body["items"], list)
@@ -113,3 +115,36 @@ def test_create_order_sets_fixed_date(client, frozen_today):
     assert r.status_code == 201
     body = r.json()
     assert body["orderDate"] == "2025-10-06"
+
+
+def test_create_order_line_numbers_are_consecutive(client):
+    ck = "test-secret"
+    cust = post_json(
+        client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=ck
+    ).json()
+    prods = [
+        post_json(
+            client, "/products", {"name": f"P{i}", "unitPrice": 10}, api_key=ck
+        ).json()
+        for i in range(3)
+    ]
+    od = {
+        "custId": cust["custId"],
+        "items": [{"prodId": p["prodId"], "qty": 1} for p in prods],
+    }
+
+    first = post_json(client, "/orders", od, api_key=ck).json()
+    second = post_json(client, "/orders", od, api_key=ck).json()
+
+    nos = [it["lineNo"] for it in first["items"] + second["items"]]
+    assert nos == list(range(nos[0], nos[0] + 6))
+
+
+def test_reserve_line_nos_is_atomic():
+    orders = MemoryUoW().orders
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        ranges = list(ex.map(lambda _: orders.reserve_line_nos(100), range(50)))
+
+    nos = [n for r in ranges for n in r]
+    assert sorted(nos) == list(range(1, 5001))
+    assert orders.pop_line_no() == 5001
@@ -0,0 +1,90 @@
+from app.core.cache import LruTtlCache
+from app.deps import get_orders_cache
+from tests.helpers import post_json
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_lru_eviction():
+    cache = LruTtlCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"  # a を最近使用にする
+    cache.put("c", b"3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_max_bytes():
+    cache = LruTtlCache(max_entries=10, max_bytes=5)
+    cache.put("a", b"123")
+    cache.put("b", b"456")
+    assert cache.get("a") is None
+    assert cache.get("b") == b"456"
+    assert cache.stats()["bytes"] == 3
+
+
+def test_cache_ttl_and_version():
+    clock = _Clock()
+    cache = LruTtlCache(ttl_seconds=10, clock=clock)
+    cache.put("k", b"v", version=1)
+
+    assert cache.get("k", version=1) == b"v"
+    assert cache.get("k", version=2) is None  # 版違いは破棄
+    cache.put("k", b"v", version=2)
+    clock.now = 11
+    assert cache.get("k", version=2) is None  # 期限切れ
+
+
+def test_cache_disabled():
+    cache = LruTtlCache(enabled=False)
+    cache.put("k", b"v")
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def _setup_order(client, api_key="admin-api-key"):
+    cust = post_json(
+        client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=api_key
+    ).json()
+    prod = post_json(
+        client, "/products", {"name": "Pen", "unitPrice": 100}, api_key=api_key
+    ).json()
+    order = {"custId": cust["custId"], "items": [{"prodId": prod["prodId"], "qty": 1}]}
+    post_json(client, "/orders", order, api_key=api_key)
+    return order
+
+
+def test_get_orders_served_from_cache(client):
+    _setup_order(client)
+    headers = {"X-API-KEY": "admin-api-key"}
+
+    r1 = client.get("/orders", headers=headers)
+    r2 = client.get("/orders", headers=headers)
+
+    assert r1.status_code == r2.status_code == 200
+    assert r1.content == r2.content
+    assert r1.headers["content-type"] == "application/json"
+    stats = get_orders_cache().stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_get_orders_cache_invalidated_by_save(client):
+    order = _setup_order(client)
+    headers = {"X-API-KEY": "admin-api-key"}
+
+    assert client.get("/orders", headers=headers).json()["totalCount"] == 1
+    post_json(client, "/orders", order, api_key="admin-api-key")
+
+    assert client.get("/orders", headers=headers).json()["totalCount"] == 2
+    assert get_orders_cache().stats()["hits"] == 0
@@ -319,3 +319,18 @@ def test_admin_can_create_multiple_customers(client):
 
     assert response1.status_code == 201
     assert response2.status_code == 201
+
+
+def test_get_orders_without_total(client):
+    api_key = "test-secret"
+    _prepare_basic_data(client)
+
+    r = client.get(
+        "/orders",
+        params={"withTotal": "false", "size": 2},
+        headers={"X-API-KEY": api_key},
+    )
+    assert r.status_code == 200
+    body = r.json()
+    assert body["totalCount"] is None
+    assert [it["orderDate"] for it in body["list"]] == ["2025-10-04", "2025-10-03"]
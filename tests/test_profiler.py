@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from app.core.profiler import TRUNCATED, ProfilerBusy, SamplingProfiler
+from tests.helpers import post_json
+
+
+def _spin_until(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(100))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    t = threading.Thread(target=_spin_until, args=(stop,), name="busy-worker")
+    t.start()
+    yield t
+    stop.set()
+    t.join()
+
+
+def test_collapsed_stacks_name_thread_and_function(busy_thread):
+    profile = SamplingProfiler(interval_seconds=0.001).profile(0.2)
+    assert profile.samples > 10
+    busy = [s for s in profile.stacks if s.startswith("busy-worker;")]
+    assert busy and all("_spin_until (test_profiler.py:" in s for s in busy)
+    for line in profile.collapsed().splitlines():
+        stack, n = line.rsplit(" ", 1)
+        assert int(n) > 0 and stack
+
+
+def test_one_session_at_a_time():
+    profiler = SamplingProfiler()
+    t = threading.Thread(target=profiler.profile, args=(0.3,))
+    t.start()
+    time.sleep(0.05)
+    with pytest.raises(ProfilerBusy):
+        profiler.profile(0.01)
+    t.join()
+    assert profiler.profile(0.01).samples >= 1
+
+
+def test_stacks_and_depth_are_bounded(busy_thread):
+    profile = SamplingProfiler(
+        interval_seconds=0.001, max_stacks=1, max_depth=2
+    ).profile(0.05)
+    assert len(profile.stacks) <= 2
+    assert profile.dropped > 0 and TRUNCATED in profile.stacks
+    assert all(s.count(";") <= 3 for s in profile.stacks)
+
+
+def test_profile_endpoint_is_admin_only(client):
+    r = client.post(
+        "/admin/profile", params={"seconds": 0.1}, headers={"X-API-KEY": "test-secret"}
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert int(r.headers["X-Profile-Samples"]) >= 1
+    assert r.text.strip()
+
+    r = client.post(
+        "/admin/profile", params={"seconds": 0}, headers={"X-API-KEY": "test-secret"}
+    )
+    assert r.status_code == 400
+
+    post_json(
+        client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key="new-test-key"
+    )
+    r = client.post(
+        "/admin/profile", params={"seconds": 0.1}, headers={"X-API-KEY": "new-test-key"}
+    )
+    assert r.status_code == 403
@@ -0,0 +1,74 @@
+from collections import Counter
+from datetime import date
+
+from app.adapters.journal import Journal
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.seeding import seed_store
+
+_START, _END = date(2023, 1, 1), date(2025, 12, 31)
+
+
+def _seed(store, **kw):
+    args = dict(customers=200, products=50, orders=3000, start=_START, end=_END)
+    args.update(kw)
+    return seed_store(lambda: MemoryUoW(store), batch_size=500, **args)
+
+
+def _orders_by_customer(store):
+    return Counter({c: counter.total for c, counter in store.orders._counts.items()})
+
+
+def test_same_seed_same_data():
+    a, b, c = MemoryStore(), MemoryStore(), MemoryStore()
+    _seed(a, seed=1)
+    _seed(b, seed=1)
+    _seed(c, seed=2)
+    page = a.orders.search(None, None, None, 3, 50)
+    assert page == b.orders.search(None, None, None, 3, 50)
+    assert page != c.orders.search(None, None, None, 3, 50)
+    assert _orders_by_customer(a) == _orders_by_customer(b)
+
+
+def test_counts_dates_and_line_numbers():
+    store = MemoryStore()
+    result = _seed(store)
+    assert (result.customers, result.products, result.orders) == (200, 50, 3000)
+
+    rows, total = store.orders.search(None, None, None, 0, 3000)
+    assert total == 3000
+    assert _START <= rows[-1].order_date and rows[0].order_date <= _END
+    line_nos = [it.line_no for r in rows for it in store.orders.by_id(r.order_id).items]
+    assert len(line_nos) == result.items == len(set(line_nos))
+    assert store.orders.pop_line_no() == max(line_nos) + 1
+
+
+def test_distributions_are_skewed():
+    store = MemoryStore()
+    _seed(store)
+    per_customer = sorted(_orders_by_customer(store).values(), reverse=True)
+    # べき分布: 上位の顧客が中央値よりずっと多く注文している
+    assert per_customer[0] > 10 * per_customer[len(per_customer) // 2]
+
+    rows, _ = store.orders.search(None, None, None, 0, 3000)
+    popularity = Counter(
+        it.prod_id for r in rows for it in store.orders.by_id(r.order_id).items
+    )
+    top = popularity.most_common()
+    assert top[0][1] > 5 * top[len(top) // 2][1]
+
+    # 季節性: 12月は6月より多い(3年分の合計)
+    months = Counter(r.order_date.month for r in rows)
+    assert months[12] > months[6]
+
+
+def test_seeds_through_journal(tmp_path):
+    path = str(tmp_path / "journal.bin")
+    store = MemoryStore(journal=Journal(path))
+    _seed(store, orders=500)
+    expected = store.orders.search("C_5e00000000000000", None, None, 0, 100)
+    store.journal.close()
+
+    restored = MemoryStore(journal=Journal(path))
+    assert restored.customers.exists_email("seed0.0@example.com")
+    assert restored.orders.search("C_5e00000000000000", None, None, 0, 100) == expected
+    restored.journal.close()
@@ -0,0 +1,73 @@
+import asyncio
+
+from app.core.execution import ExecutionPolicy
+from app.core.metrics import REGISTRY
+from app.core.timing import PHASE_SECONDS, RequestTiming, _current, timed
+from tests.helpers import post_json
+
+
+def _phases(header: str) -> dict:
+    out = {}
+    for part in header.split(", "):
+        name, dur = part.split(";dur=")
+        out[name] = float(dur)
+    return out
+
+
+def _order(client, key):
+    c = post_json(client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=key)
+    p = post_json(client, "/products", {"name": "Pen", "unitPrice": 100}, api_key=key)
+    return {
+        "custId": c.json()["custId"],
+        "items": [{"prodId": p.json()["prodId"], "qty": 1}],
+    }
+
+
+def test_admin_opt_in_gets_server_timing(client):
+    REGISTRY.clear()
+    key = "test-secret"
+    r = client.post(
+        "/orders",
+        json=_order(client, key),
+        headers={"X-API-KEY": key, "X-Server-Timing": "1"},
+    )
+    assert r.status_code == 201
+    phases = _phases(r.headers["Server-Timing"])
+    for name in ("auth", "validate", "rate_limit", "service", "commit", "serialize"):
+        assert name in phases
+    assert phases["total"] >= phases["service"] >= phases["commit"]
+
+    recorded = PHASE_SECONDS.values()
+    for name in ("auth", "service", "commit", "total"):
+        assert ("/orders", name) in recorded
+
+
+def test_server_timing_is_admin_only_and_opt_in(client):
+    key = "new-test-key"
+    body = _order(client, key)
+    r = client.post(
+        "/orders", json=body, headers={"X-API-KEY": key, "X-Server-Timing": "1"}
+    )
+    assert r.status_code == 201
+    assert "Server-Timing" not in r.headers
+
+    r = client.get("/orders", headers={"X-API-KEY": "test-secret"})
+    assert r.status_code == 200
+    assert "Server-Timing" not in r.headers
+
+
+def test_heavy_work_keeps_request_timing():
+    policy = ExecutionPolicy(max_workers=1)
+    work = timed("service")(lambda: sum(range(1000)))
+
+    async def main():
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            await policy.run(work, heavy=True)
+        finally:
+            _current.reset(token)
+        return timing
+
+    assert "service" in asyncio.run(main()).phases
+    policy.shutdown()
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.singleflight import SingleFlight
+
+
+def _wait_until(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def slow():
+            calls.append(1)
+            await release.wait()
+            return b"result"
+
+        tasks = [asyncio.ensure_future(flight.do("k", slow)) for _ in range(8)]
+        await asyncio.sleep(0)
+        # 先頭以外の7件が待機に入ってから完了させる
+        assert flight.stats()["shared"] == 7
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == [b"result"] * 8
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "shared": 7}
+
+
+def test_error_is_propagated_to_waiters():
+    flight = SingleFlight()
+
+    async def main():
+        release = asyncio.Event()
+
+        async def boom():
+            await release.wait()
+            raise ValueError("boom")
+
+        tasks = [asyncio.ensure_future(flight.do("k", boom)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+    assert flight.in_flight() == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def main():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return 1
+
+        leader = asyncio.ensure_future(flight.do("k", slow))
+        waiter = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0)
+        # 最初の呼び出し元が切断しても、実行は続いて待ち手に結果が届く
+        leader.cancel()
+        release.set()
+        return await waiter
+
+    assert asyncio.run(main()) == 1
+    assert flight.in_flight() == 0
+
+
+def test_sequential_calls_are_not_cached():
+    flight = SingleFlight()
+
+    async def value(v):
+        return v
+
+    assert asyncio.run(flight.do("k", lambda: value(1))) == 1
+    assert asyncio.run(flight.do("k", lambda: value(2))) == 2
+    assert flight.stats()["executions"] == 2
+
+
+def test_concurrent_admin_searches_share_one_execution(client, monkeypatch):
+    from app.deps import (
+        get_execution_policy,
+        get_orders_cache,
+        get_orders_flight,
+        get_store,
+    )
+
+    monkeypatch.setattr(get_orders_cache(), "enabled", False)
+    flight = get_orders_flight()
+    policy = get_execution_policy()
+    before = flight.stats()
+    submitted = policy.stats()["submitted"]
+    orders = get_store().orders
+    search = orders.search
+    release = threading.Event()
+
+    def slow_search(*args, **kwargs):
+        release.wait(2)
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(orders, "search", slow_search)
+
+    def get():
+        return client.get("/orders", headers={"X-API-KEY": "test-secret"})
+
+    # プールのスレッド数(4)より多く同時に来ても、プールに出るのは1件だけ
+    n = 40
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        futures = [ex.submit(get) for _ in range(n)]
+        _wait_until(lambda: flight.stats()["shared"] - before["shared"] == n - 1)
+        release.set()
+        assert all(f.result().status_code == 200 for f in futures)
+    assert flight.stats()["executions"] - before["executions"] == 1
+    assert policy.stats()["submitted"] - submitted == 1
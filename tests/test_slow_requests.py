@@ -0,0 +1,86 @@
+import pytest
+
+from app.core.slowlog import SlowRequestLog
+from tests.helpers import post_json
+
+
+@pytest.fixture
+def slow_log(client):
+    from app.deps import get_slow_request_log
+
+    log = get_slow_request_log()
+    saved = (log.threshold_seconds, log.sample_rate, log.profile_rate)
+    log.clear()
+    # すべてのリクエストを「遅い」とみなす
+    log.threshold_seconds = 0.0
+    yield log
+    log.threshold_seconds, log.sample_rate, log.profile_rate = saved
+    log.clear()
+
+
+def _scope(path="/orders", query=b""):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query,
+        "headers": [],
+    }
+
+
+def test_ring_buffer_keeps_newest_entries():
+    log = SlowRequestLog(capacity=2)
+    for i in range(3):
+        log.record(_scope(f"/orders/{i}"), 200, 1.0, {})
+    assert [e["path"] for e in log.entries()] == ["/orders/2", "/orders/1"]
+
+
+def test_params_are_sanitized():
+    log = SlowRequestLog()
+    log.record(
+        _scope(query=b"page=2&api_key=raw-secret&from=" + b"x" * 500), 200, 1, {}
+    )
+    params = log.entries()[0]["params"]
+    assert params["page"] == "2"
+    assert params["api_key"] == "[redacted]"
+    assert len(params["from"]) == 100
+
+
+def test_slow_request_is_captured_with_key_hash_and_phases(client, slow_log):
+    key = "test-secret"
+    post_json(client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=key)
+    r = client.get("/orders", params={"page": 1}, headers={"X-API-KEY": key})
+    assert r.status_code == 200
+
+    r = client.get("/admin/slow-requests", headers={"X-API-KEY": key})
+    assert r.status_code == 200
+    body = r.json()
+    entry = next(e for e in body["entries"] if e["route"] == "/orders")
+    assert entry["method"] == "GET" and entry["status"] == 200
+    assert entry["params"] == {"page": "1"}
+    assert entry["keyHash"] and key not in str(body)
+    assert "auth" in entry["phasesMs"] and "service" in entry["phasesMs"]
+    assert "profile" not in entry
+
+
+def test_profile_is_attached_when_sampled(client, slow_log):
+    slow_log.profile_rate = 1.0
+    r = client.get("/orders", headers={"X-API-KEY": "test-secret"})
+    assert r.status_code == 200
+    entry = slow_log.entries()[0]
+    assert entry["profile"]
+    assert {"function", "calls", "totalMs", "cumulativeMs"} <= set(entry["profile"][0])
+
+
+def test_unsampled_requests_are_not_watched(client, slow_log):
+    slow_log.sample_rate = 0.0
+    client.get("/health")
+    assert slow_log.entries() == []
+
+
+def test_slow_requests_endpoint_is_admin_only(client):
+    post_json(
+        client, "/customers", {"name": "B", "email": "b@ex.com"}, api_key="new-test-key"
+    )
+    r = client.get("/admin/slow-requests", headers={"X-API-KEY": "new-test-key"})
+    assert r.status_code == 403
@@ -19,7 +19,7 @@ def test_create_customer_ok(client):
     assert response.status_code == 201
     assert "Location" in response.headers
     body = response.json()
-    assert re.fullmatch(r"C_[0-9a-f]{8}", body["custId"])
+    assert re.fullmatch(r"C_[0-9a-f]{16}", body["custId"])
     assert body["name"] == "Alice"
     assert body["email"] == "a@example.com"
 
@@ -31,6 +31,6 @@ def test_create_product_ok(client):
     assert response.status_code == 201
     assert "Location" in response.headers
     body = response.json()
-    assert re.fullmatch(r"P_[0-9a-f]{8}", body["prodId"])
+    assert re.fullmatch(r"P_[0-9a-f]{16}", body["prodId"])
     assert body["name"] == "Pen"
     assert body["unitPrice"] == 100
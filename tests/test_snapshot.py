@@ -0,0 +1,182 @@
+import threading
+from datetime import date
+
+from app.adapters.journal import Journal
+from app.adapters.memory_uow import MemoryStore, MemoryUoW
+from app.adapters.order_partition import month_key
+from app.adapters.snapshot import SnapshotPartition
+from app.schemas import CustomerWithId, ProductWithId
+from tests.helpers import make_order
+
+_DATES = [
+    date(2025, 1, 3),
+    date(2025, 1, 20),
+    date(2025, 2, 14),
+    date(2025, 3, 1),
+    date(2025, 6, 30),
+]
+
+
+def _fill(store):
+    for i in range(2):
+        store.customers.save(
+            CustomerWithId(cust_id=f"C_{i}", name=f"U{i}", email=f"u{i}@ex.com")
+        )
+    store.products.save(ProductWithId(prod_id="P_1", name="Pen", unit_price=100))
+    for i, d in enumerate(_DATES):
+        store.orders.save(make_order(i, d, amount=100 + i), f"C_{i % 2}")
+
+
+def _view(orders):
+    return [
+        orders.search(cust_id, frm, to, 0, 10)
+        for cust_id in (None, "C_0", "C_1")
+        for frm, to in ((None, None), (date(2025, 1, 10), date(2025, 2, 28)))
+    ]
+
+
+def test_snapshot_restores_state(tmp_path):
+    path = str(tmp_path / "state.snap")
+    store = MemoryStore()
+    _fill(store)
+    store.version = 5
+    store.save_snapshot(path)
+
+    restored = MemoryStore(snapshot_path=path)
+    assert restored.version == 5
+    assert restored.customers.exists_email("U1@ex.com")
+    assert restored.customers.by_id("C_0").name == "U0"
+    assert restored.products.by_name_norm_exists("pen")
+    assert restored.products.by_id("P_1").unit_price == 100
+    assert restored.orders.exists_id(make_order(2, _DATES[2]).order_id)
+    assert restored.orders.by_id(make_order(3, _DATES[3]).order_id).total_amount == 103
+    assert _view(restored.orders) == _view(store.orders)
+    assert restored.orders.pop_line_no() == store.orders.pop_line_no()
+
+
+def test_snapshot_hydrates_lazily(tmp_path):
+    path = str(tmp_path / "state.snap")
+    store = MemoryStore()
+    _fill(store)
+    store.save_snapshot(path)
+
+    restored = MemoryStore(snapshot_path=path)
+    orders = restored.orders
+    # 読み込み直後は何も展開していない
+    assert not restored.customers._by_id and not orders._by_id
+    assert not orders._counts
+    assert all(isinstance(p, SnapshotPartition) for p in orders._partitions.values())
+
+    items, total = orders.search("C_0", None, None, 0, 10)
+    assert total == 3 and len(items) == 3
+    # 読まれた顧客の件数だけが展開される
+    assert list(orders._counts) == ["C_0"]
+
+
+def test_snapshot_then_journal_tail(tmp_path):
+    snap = str(tmp_path / "state.snap")
+    journal_path = str(tmp_path / "journal.bin")
+    store = MemoryStore(journal=Journal(journal_path))
+    tx = MemoryUoW(store)
+    tx.customers.insert_if_absent(
+        CustomerWithId(cust_id="C_0", name="U0", email="u0@ex.com")
+    )
+    tx.orders.save(make_order(0, date(2025, 1, 3)), "C_0")
+    tx.commit()
+    store.save_snapshot(snap)
+    tx = MemoryUoW(store)
+    tx.orders.save(make_order(1, date(2025, 1, 5)), "C_0")
+    tx.commit()
+    store.journal.close()
+
+    restored = MemoryStore(journal=Journal(journal_path), snapshot_path=snap)
+    # スナップショット以降の1件だけが再生され、重複しない
+    items, total = restored.orders.search("C_0", None, None, 0, 10)
+    assert total == 2
+    assert [o.order_date for o in items] == [date(2025, 1, 5), date(2025, 1, 3)]
+    assert restored.version == 2
+    restored.journal.close()
+
+
+def test_resnapshot_after_writes_to_snapshot_month(tmp_path):
+    first = str(tmp_path / "first.snap")
+    second = str(tmp_path / "second.snap")
+    store = MemoryStore()
+    _fill(store)
+    store.save_snapshot(first)
+
+    restored = MemoryStore(snapshot_path=first)
+    restored.orders.save(make_order(99, date(2025, 1, 25)), "C_1")
+    restored.customers.save(CustomerWithId(cust_id="C_9", name="U9", email="u9@ex.com"))
+    restored.save_snapshot(second)
+    store.orders.save(make_order(99, date(2025, 1, 25)), "C_1")
+
+    again = MemoryStore(snapshot_path=second)
+    assert _view(again.orders) == _view(store.orders)
+    assert again.customers.exists_id("C_0") and again.customers.exists_id("C_9")
+
+
+def test_snapshot_includes_archived_months(tmp_path):
+    path = str(tmp_path / "state.snap")
+    store = MemoryStore(archive_dir=str(tmp_path / "archive"))
+    _fill(store)
+    before = _view(store.orders)
+    store.orders.archive_before(month_key(date(2025, 4, 1)))
+    store.save_snapshot(path)
+
+    restored = MemoryStore(snapshot_path=path)
+    assert _view(restored.orders) == before
+
+
+def test_write_to_snapshot_month_does_not_hydrate_it(tmp_path):
+    path = str(tmp_path / "state.snap")
+    store = MemoryStore()
+    _fill(store)
+    store.save_snapshot(path)
+
+    restored = MemoryStore(snapshot_path=path, archive_dir=str(tmp_path / "archive"))
+    orders = restored.orders
+    restored.orders.save(make_order(99, date(2025, 1, 25)), "C_1")
+    store.orders.save(make_order(99, date(2025, 1, 25)), "C_1")
+    # 書き込みは差分に足すだけで、スナップショット側は展開しない
+    part = orders._partitions[month_key(date(2025, 1, 1))]
+    assert isinstance(part, SnapshotPartition) and len(part) == 3
+    assert not part.loaded(None) and not part.loaded("C_1")
+    assert _view(orders) == _view(store.orders)
+
+    # 退避しても差分の注文は残る
+    before = _view(store.orders)
+    assert orders.archive_before(month_key(date(2025, 4, 1))) == 3
+    assert _view(orders) == before
+    assert orders.by_id(make_order(99, date(2025, 1, 25)).order_id) is not None
+
+
+def test_snapshot_month_is_hydrated_outside_the_lock(tmp_path, monkeypatch):
+    path = str(tmp_path / "state.snap")
+    store = MemoryStore()
+    _fill(store)
+    store.save_snapshot(path)
+
+    restored = MemoryStore(snapshot_path=path)
+    orders = restored.orders
+    snapshot = orders._snapshot
+    held = []
+    month_summaries = snapshot.month_summaries
+
+    def try_lock(free):
+        if orders._lock.acquire(blocking=False):
+            orders._lock.release()
+            free.append(True)
+
+    def probe(month, cust_id):
+        # 別スレッドからロックを取れるなら、このスレッドはロックを持っていない
+        free = []
+        t = threading.Thread(target=try_lock, args=(free,))
+        t.start()
+        t.join()
+        held.append(not free)
+        return month_summaries(month, cust_id)
+
+    monkeypatch.setattr(snapshot, "month_summaries", probe)
+    assert _view(orders) == _view(store.orders)
+    assert held and not any(held)
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from app.core.tracing import SpanExporter, Tracer, span, traced
+from tests.helpers import post_json
+
+
+@pytest.fixture
+def tracer(client, tmp_path):
+    from app.deps import get_tracer
+
+    tracer = get_tracer()
+    saved = (tracer.exporter.path, tracer.sample_rate)
+    tracer.exporter.path = str(tmp_path / "traces.jsonl")
+    tracer.sample_rate = 1.0
+    yield tracer
+    tracer.exporter.path, tracer.sample_rate = saved
+
+
+def _spans(path):
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            request = json.loads(line)
+            for rs in request["resourceSpans"]:
+                attrs = rs["resource"]["attributes"]
+                assert {
+                    "key": "service.name",
+                    "value": {"stringValue": "order-api"},
+                } in attrs
+                for ss in rs["scopeSpans"]:
+                    spans.extend(ss["spans"])
+    return spans
+
+
+def test_sampled_request_exports_span_tree(client, tracer):
+    key = "test-secret"
+    r = post_json(client, "/customers", {"name": "A", "email": "a@ex.com"}, api_key=key)
+    cust_id = r.json()["custId"]
+    r = post_json(client, "/products", {"name": "P", "unitPrice": 100}, api_key=key)
+    prod_id = r.json()["prodId"]
+    r = post_json(
+        client,
+        "/orders",
+        {"custId": cust_id, "items": [{"prodId": prod_id, "qty": 1}]},
+        api_key=key,
+    )
+    assert r.status_code == 201
+    assert tracer.exporter.flush()
+
+    spans = _spans(tracer.exporter.path)
+    root = next(s for s in spans if s["name"] == "POST /orders")
+    assert root["kind"] == 2 and "parentSpanId" not in root
+    attrs = {a["key"]: a["value"] for a in root["attributes"]}
+    assert attrs["http.route"] == {"stringValue": "/orders"}
+    assert attrs["http.response.status_code"] == {"intValue": "201"}
+
+    in_trace = [s for s in spans if s["traceId"] == root["traceId"]]
+    by_id = {s["spanId"]: s for s in in_trace}
+    names = {s["name"] for s in in_trace}
+    assert {
+        "require_api_key",
+        "rate_limit",
+        "create_order",
+        "customers.exists_id",
+        "products.by_id",
+        "orders.save",
+        "uow.commit",
+    } <= names
+    # リポジトリの呼び出しは create_order の子
+    save = next(s for s in in_trace if s["name"] == "orders.save")
+    assert by_id[save["parentSpanId"]]["name"] == "create_order"
+    for s in in_trace:
+        assert int(s["startTimeUnixNano"]) <= int(s["endTimeUnixNano"])
+
+
+def test_unsampled_requests_export_nothing(client, tracer):
+    tracer.sample_rate = 0.0
+    r = client.get("/orders", headers={"X-API-KEY": "test-secret"})
+    assert r.status_code == 200
+    assert tracer.exporter.flush()
+    with pytest.raises(FileNotFoundError):
+        open(tracer.exporter.path)
+
+
+def test_hooks_are_noops_outside_a_trace():
+    @traced("f")
+    def f():
+        return 1
+
+    assert f() == 1
+    with span("x") as s:
+        assert s is None
+
+
+def test_full_queue_drops_spans(tmp_path):
+    exporter = SpanExporter(str(tmp_path / "t.jsonl"), max_queue=1)
+    root = Tracer(exporter, sample_rate=1.0).start_root("root")
+    # 書き出しスレッドが動く前に満杯にする
+    exporter._start = lambda: None
+    root.child("a").end()
+    root.child("b").end()
+    assert exporter.dropped == 1
+    del exporter._start
+
+    root.end()
+    assert exporter.flush()
+    exporter.shutdown()
+    assert exporter.exported == 2
+    assert [s["name"] for s in _spans(exporter.path)] == ["a", "root"]